@@ -0,0 +1,85 @@
+#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Time to first API call of the plain zipapp, the cached bundle and the
+installed package.
+
+A local TCP listener plays the cluster, the time from starting a check to
+the listener accepting its connection is the start up cost. The first run of
+the bundle extracts it and is reported as cold.
+
+    make check_ontap_bundle check_ontap_fast
+    python bench/bundle.py --zipapp ./check_ontap_bundle --bundle ./check_ontap_fast
+"""
+
+import os
+import sys
+import time
+import socket
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+def first_call(argv, listener, env):
+    """ Seconds from starting argv until it connects to listener """
+    started = time.perf_counter()
+    process = subprocess.Popen(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
+    try:
+        conn, _ = listener.accept()
+        took = time.perf_counter() - started
+        conn.close()
+    finally:
+        process.kill()
+        process.wait()
+    return took
+
+def measure(name, argv, listener, env, runs):
+    times = [first_call(argv, listener, env) * 1000 for _ in range(runs)]
+    print(f"{name:24} median {statistics.median(times):7.1f} ms  min {min(times):7.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="compare the time to first API call of the check_ontap builds")
+    parser.add_argument('--zipapp', help='plain zipapp (make check_ontap_bundle)')
+    parser.add_argument('--bundle', help='bundle with bytecode (make check_ontap_fast)')
+    parser.add_argument('--python', default=sys.executable, help='python with checkontap installed')
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(16)
+    listener.settimeout(60)
+    port = listener.getsockname()[1]
+    check = ["about", "-H", "127.0.0.1", "-P", str(port), "-u", "bench", "-p", "bench"]
+
+    cache = tempfile.mkdtemp(prefix="check_ontap-bench-")
+    env = dict(os.environ, CHECK_ONTAP_BUNDLE_CACHE=cache, TIMEOUT="60")
+    try:
+        if args.zipapp:
+            measure("zipapp", [args.python, args.zipapp] + check, listener, env, args.runs)
+        if args.bundle:
+            measure("bundle (cold)", [args.python, args.bundle] + check, listener, env, 1)
+            measure("bundle (cached)", [args.python, args.bundle] + check, listener, env, args.runs)
+        measure("installed package", [args.python, "-c", "from checkontap.cli import main; main()"] + check,
+                listener, env, args.runs)
+    finally:
+        shutil.rmtree(cache, ignore_errors=True)
+        listener.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Field projection gate of all commands.
+
+Runs every command in every mode of checkontap.tools.fields against an
+adapter answering with complete records which it cuts down to the fields of
+the query like ONTAP does. The records of the transport are strict
+(CHECK_ONTAP_STRICT_FIELDS=1), reading a field the query didn't request
+fails the command. Fails (exit 1) if a command reads such a field, requests
+other fields than the registry or "*".
+
+The batch case runs one mode of every command in a memo scope widened to
+the union of their fields like check_ontap_batch, every request has to ask
+for the union of its own endpoint (sub-collections like the plexes of an
+aggregate included).
+
+    python bench/fields.py
+"""
+
+import os
+os.environ["CHECK_ONTAP_STRICT_FIELDS"] = "1"
+
+import re
+import sys
+import json
+import copy
+from urllib.parse import urlparse, parse_qs
+from requests.adapters import BaseAdapter
+from netapp_ontap import HostConnection
+from checkontap import api
+from checkontap.tools import helper, fields, memo
+from checkontap.tools.adapter import build_response
+from checkontap.tools.transport import FieldNotProjected
+
+HOST = "gate"
+LOGIN = ["-H", HOST, "-u", "monitor", "-p", "secret"]
+
+# argv per command and mode, the modes of the registry are given with --mode
+ARGUMENTS = {
+    "aggregate-usage": ["-w", "80", "-c", "90"],
+    "lun-usage": ["-w", "80", "-c", "90"],
+    "volume-usage": ["-w", "80", "-c", "90"],
+}
+
+# (command, mode): further argv the command is run with besides the plain one
+VARIANTS = {
+    ("aggregate-usage", None): [["--alerts-only"]],
+    ("disk-health", "diskhealth"): [["--summary"]],
+    ("lun-usage", None): [["--alerts-only"], ["--top", "5"]],
+    ("snapmirror-health", None): [["--summary"]],
+    ("volume-health", None): [["--summary"]],
+    ("volume-usage", None): [["--alerts-only"], ["--top", "5"]],
+}
+
+def metrocluster(configured):
+    state = "configured" if configured else "not_configured"
+    return {
+        "local": {"configuration_state": state, "mode": "normal", "partner_cluster_reachable": True,
+                  "cluster": {"name": "site_a", "uuid": "c-a"}, "periodic_check_enabled": True},
+        "remote": {"configuration_state": state, "mode": "normal",
+                   "cluster": {"name": "site_b", "uuid": "c-b"}, "periodic_check_enabled": True},
+        "dr_groups": [{"id": 1}],
+    }
+
+VOLUME = {
+    "uuid": "v-1", "name": "vol1", "state": "online", "style": "flexvol", "type": "rw", "comment": "",
+    "snapshot_count": 1, "create_time": "2023-01-01T00:00:00+00:00",
+    "svm": {"name": "svm1", "uuid": "s-1"}, "aggregates": [{"name": "aggr1", "uuid": "a-1"}],
+    "files": {"maximum": 31122, "used": 102},
+    "space": {"size": 1073741824, "used": 2080768, "available": 1017974784, "afs_total": 1020055552,
+              "percent_used": 0, "footprint": 6590464, "metadata": 11005952,
+              "logical_space": {"used": 2080768, "reporting": False},
+              "snapshot": {"used": 4509696, "reserve_available": 49176576, "reserve_percent": 5, "reserve_size": 53686272}},
+    "nas": {"export_policy": {"name": "default"}},
+}
+
+NODE = {
+    "uuid": "n-1", "name": "node1", "state": "up", "membership": "member", "model": "AFF-A400",
+    "serial_number": "123", "uptime": 1000, "version": {"full": "9.13.1"},
+    "ha": {"enabled": True, "partners": [{"name": "node2"}],
+           "giveback": {"state": "nothing_to_giveback"}, "takeover": {"state": "not_attempted"}},
+    "cluster_interfaces": [{"uuid": "i-1", "name": "clus1", "ip": {"address": "169.254.0.1"}}],
+    "controller": {"over_temperature": "normal",
+                   "failed_fan": {"count": 0, "message": {"code": "111411207", "message": "There are no failed fans."}},
+                   "failed_power_supply": {"count": 0, "message": {"code": "111411208",
+                                                                  "message": "There are no failed power supplies."}},
+                   "frus": [{"id": "PSU1", "state": "ok", "type": "psu"}], "cpu": {"count": 8}},
+    "nvram": {"battery_state": "battery_ok", "id": 1},
+}
+
+INTERFACE = {
+    "uuid": "i-1", "name": "lif1", "enabled": True, "state": "up", "scope": "svm",
+    "svm": {"name": "svm1", "uuid": "s-1"}, "ip": {"address": "10.0.0.1", "netmask": "24", "family": "ipv4"},
+    "location": {"is_home": True, "auto_revert": False, "node": {"name": "node1"}, "home_node": {"name": "node1"},
+                 "port": {"name": "e0a"}, "home_port": {"name": "e0a"}},
+    "services": ["data_core"],
+}
+
+FC_INTERFACE = {
+    "uuid": "f-1", "name": "fc1", "enabled": True, "state": "up", "data_protocol": "fcp", "wwpn": "20:00",
+    "svm": {"name": "svm1", "uuid": "s-1"},
+    "location": {"node": {"name": "node1"}, "home_node": {"name": "node1"}, "port": {"name": "0e"}, "home_port": {"name": "0e"}},
+}
+
+ETHERNET_PORT = {
+    "uuid": "p-1", "name": "e0a", "enabled": True, "type": "physical", "state": "up", "mtu": 1500,
+    "node": {"name": "node1", "uuid": "n-1"}, "speed": 10000, "mac_address": "00:00:00:00:00:01",
+    "lag": {"active_ports": [{"name": "e0c"}], "member_ports": [{"name": "e0c"}, {"name": "e0d"}]},
+    "broadcast_domain": {"name": "Default"},
+}
+
+FC_PORT = {
+    "uuid": "p-2", "name": "0e", "enabled": True, "state": "online", "physical_protocol": "fibre_channel",
+    "node": {"name": "node1", "uuid": "n-1"}, "speed": {"configured": "auto"}, "wwpn": "50:00",
+}
+
+DISK = {
+    "name": "1.0.0", "uid": "d-1", "bay": 0, "shelf": {"uid": "sh-1"}, "type": "ssd", "class": "solid_state",
+    "container_type": "aggregate", "state": "present", "model": "X", "serial_number": "S1",
+    "node": {"name": "node1", "uuid": "n-1"}, "home_node": {"name": "node1", "uuid": "n-1"},
+    "paths": [{"initiator": "0a", "port_name": "A", "port_type": "sas", "node": {"name": "node1"}}],
+    "aggregates": [{"name": "aggr1"}],
+}
+
+SENSOR = {"node": "node1", "fru": "PSU1", "state": "normal", "name": "PSU1 Temp", "type": "thermal",
+          "value": 30, "units": "C", "discrete-state": "normal", "warn-hi": 80, "crit-hi": 90}
+
+AGGREGATE = {
+    "uuid": "a-1", "name": "aggr1", "state": "online", "node": {"name": "node1"},
+    "space": {"block_storage": {"size": 1000000000, "used": 500000000, "available": 500000000,
+                                "full_threshold_percent": 98}, "efficiency": {"ratio": 1.5}},
+    "block_storage": {"primary": {"disk_count": 8, "raid_type": "raid_dp"}},
+}
+
+PLEX = {
+    "name": "plex0", "online": True, "state": "normal", "pool": "pool0",
+    "aggregate": {"name": "aggr1", "uuid": "a-1"},
+    "raid_groups": [{"name": "rg0", "degraded": False, "recomputing_parity": {"active": False},
+                     "reconstruct": {"active": False, "percent": 0}, "disks": [{"disk": {"name": "1.0.0"}}]}],
+}
+
+def cluster(configured):
+    """ {path regex: record or collection} of a cluster, a metrocluster if configured """
+    collection = lambda *records: {"records": list(records), "num_records": len(records)}
+    return {
+        r"/api/cluster/software": {"version": "9.13.1", "nodes": [{"name": "node1", "version": "9.13.1"}]},
+        r"/api/cluster": {"name": "cluster1", "uuid": "c-1", "metric": {"status": "ok", "duration": "PT15S"},
+                          "version": {"full": "9.13.1"}},
+        r"/api/cluster/metrocluster": metrocluster(configured),
+        r"/api/cluster/metrocluster/nodes": collection(
+            {"node": {"name": "node1"}, "cluster": {"name": "site_a"}, "dr_operation_state": "normal",
+             "dr_group_id": 1, "configuration_state": "configured"}),
+        r"/api/cluster/nodes": collection(NODE),
+        r"/api/network/ip/interfaces": collection(INTERFACE),
+        r"/api/network/ip/interfaces/[^/]+": INTERFACE,
+        r"/api/network/fc/interfaces": collection(FC_INTERFACE),
+        r"/api/network/ethernet/ports": collection(ETHERNET_PORT),
+        r"/api/network/fc/ports": collection(FC_PORT),
+        r"/api/svm/svms": collection({"uuid": "s-1", "name": "svm1", "state": "running", "subtype": "default",
+                                      "ip_interfaces": [{"name": "lif1", "uuid": "i-1"}],
+                                      "fc_interfaces": [{"name": "fc1", "uuid": "f-1"}]}),
+        r"/api/storage/disks": collection(DISK),
+        r"/api/snapmirror/relationships": collection(
+            {"uuid": "r-1", "state": "snapmirrored", "healthy": False, "lag_time": "PT1H", "policy": {"name": "p"},
+             "source": {"path": "svm1:vol1", "svm": {"name": "svm1"}},
+             "destination": {"path": "svm2:vol1_dst", "svm": {"name": "svm2"}},
+             "unhealthy_reason": [{"code": "6637629", "message": "Transfer failed."}]}),
+        r"/api/storage/luns": collection({"uuid": "l-1", "name": "/vol/vol1/lun1", "svm": {"name": "svm1"},
+                                          "os_type": "linux", "space": {"size": 1000, "used": 100,
+                                                                        "guarantee": {"requested": False}}}),
+        r"/api/storage/volumes": collection(VOLUME),
+        r"/api/storage/volumes/[^/]+/snapshots": collection(
+            {"uuid": "sn-1", "name": "daily.0", "create_time": "2023-01-01T00:00:00+00:00", "size": 1000,
+             "volume": {"name": "vol1"}}),
+        r"/api/storage/aggregates/[^/]+": AGGREGATE,
+        r"/api/storage/aggregates/[^/]+/plexes": collection(PLEX),
+        r"/api/private/cli/storage/aggregate": collection({"aggregate": "aggr1", "uuid": "a-1", "state": "online"}),
+        r"/api/private/cli/system/node/environment/sensors": collection(SENSOR),
+    }
+
+def project(value, tree):
+    """ value cut down to tree like ONTAP answers a fields query """
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [project(v, tree) for v in value]
+    if not isinstance(value, dict):
+        return value
+    return {k: project(v, tree[k]) for (k, v) in value.items() if k in tree}
+
+def tree_of(fields_param):
+    tree = {}
+    for field in fields_param.split(","):
+        node = tree
+        (*parents, last) = field.split(".")
+        for parent in parents:
+            if node.get(parent, {}) is None:
+                break
+            node = node.setdefault(parent, {})
+        else:
+            node[last] = None
+    return tree
+
+class Cluster(BaseAdapter):
+    """ Answers like a cluster, notes every request which doesn't ask for the fields of the registry """
+
+    def __init__(self, command, mode, configured, union=None):
+        super().__init__()
+        self.command = command
+        self.mode = mode
+        # {endpoint: set of fields} of a batch instead of command and mode
+        self.union = union
+        self.answers = cluster(configured)
+        self.problems = []
+
+    def expected(self, path):
+        if self.union is not None:
+            for (endpoint, f) in self.union.items():
+                if fields.matches(endpoint, path):
+                    return ",".join(sorted(f))
+            return None
+        modes = fields.FIELDS[self.command]
+        for (endpoint, f) in (modes.get(self.mode) or modes[None]).items():
+            if fields.matches(endpoint, path):
+                return f
+        return None
+
+    def differs(self, requested, expected):
+        """ A batch widens to the union in any order, a single command asks exactly like the registry """
+        if self.union is not None and expected is not None:
+            return set(requested.split(",")) != set(expected.split(","))
+        return requested != expected
+
+    def send(self, request, **kwargs):
+        url = urlparse(request.url)
+        query = parse_qs(url.query)
+        answer = next((a for (p, a) in self.answers.items() if re.match(f"^{p}$", url.path)), None)
+        if answer is None:
+            return build_response(request, 404, {"Content-Type": "application/json"},
+                                  json.dumps({"error": {"message": f"no fixture for {url.path}"}}).encode())
+        if query.get("return_records") == ["false"]:
+            body = {"num_records": answer.get("num_records", 1)}
+        else:
+            requested = query.get("fields", [None])[0]
+            expected = self.expected(url.path)
+            if requested is None or "*" in requested.split(","):
+                self.problems.append(f"GET {url.path} requests {requested or 'no fields'}, registry: {expected}")
+            elif self.differs(requested, expected):
+                self.problems.append(f"GET {url.path} requests {requested}, registry: {expected}")
+            answer = copy.deepcopy(answer)
+            tree = None if requested is None else tree_of(requested)
+            if "records" in answer:
+                body = {**answer, "records": project(answer["records"], tree)}
+            else:
+                body = project(answer, tree)
+        return build_response(request, 200, {"Content-Type": "application/json"}, json.dumps(body).encode())
+
+    def close(self):
+        pass
+
+def connect(adapter):
+    connection = HostConnection(HOST, username="monitor", password="secret", verify=False)
+    connection.session.mount(connection.origin, adapter)
+    helper._connections.clear()
+    helper._connections[(HOST, "monitor", 443, None, None)] = connection
+
+def run(adapter, command, mode, variant=(), prefix=""):
+    """ Run command in mode with the variant argv, its problems are added to adapter """
+    argv = ARGUMENTS.get(command, []) + (["--mode", mode] if mode else []) + list(variant) + LOGIN
+    try:
+        result = api.check(command, argv)
+    except FieldNotProjected as error:
+        adapter.problems.append(f"{prefix}reads a field it didn't request: {error}")
+    except Exception as error:
+        adapter.problems.append(f"{prefix}failed: {error!r}")
+    else:
+        print(f"    {prefix}{result.status.name} {result.message.splitlines()[0] if result.message else ''}")
+        if "error" in result.message.lower().split("=>")[0]:
+            adapter.problems.append(f"{prefix}failed: {result.message}")
+
+def check(command, mode, configured, variant=()):
+    """ Problems of running command in mode with the variant argv against the fixture cluster """
+    adapter = Cluster(command, mode, configured)
+    connect(adapter)
+    run(adapter, command, mode, variant)
+    return adapter.problems
+
+def batch():
+    """ Problems of running the first mode of every command in one batch scope """
+    union = fields.union(fields.FIELDS)
+    adapter = Cluster(None, None, False, union=union)
+    connect(adapter)
+    with memo.scope(widen=union):
+        for (command, modes) in fields.FIELDS.items():
+            mode = next(iter(modes))
+            run(adapter, command, mode, prefix=f"{command}: ")
+    return adapter.problems
+
+def main():
+    failed = False
+    for (command, modes) in fields.FIELDS.items():
+        for mode in modes:
+            for configured in ((False, True) if command == "cluster-health" else (False,)):
+                for variant in [[]] + VARIANTS.get((command, mode), []):
+                    name = " ".join([command] + (["--mode", mode] if mode else []) + variant)
+                    name += " (metrocluster)" if configured else ""
+                    print(name)
+                    for problem in check(command, mode, configured, variant):
+                        print(f"FAIL: {name} {problem}")
+                        failed = True
+    print("batch of all commands")
+    for problem in batch():
+        print(f"FAIL: batch {problem}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Start up budget of check_ontap.
+
+Measures the import time of checkontap.cli (python -X importtime) and the
+wall time of listing the commands in fresh interpreters. Fails (exit 1) if
+the median import time exceeds the budget or if importing the command line
+already pulls in netapp_ontap, requests or urllib3.
+
+    python bench/startup.py [--budget-ms 40] [--runs 10]
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+HEAVY = ("netapp_ontap", "requests", "urllib3", "marshmallow")
+
+def import_time(python, module):
+    """ Cumulative import time of module in microseconds in a fresh interpreter """
+    result = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+    for line in result.stderr.splitlines():
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1])
+    raise RuntimeError(f"no import time of {module} found")
+
+def loaded_heavy(python):
+    code = ("import sys, checkontap.cli; "
+            f"print(' '.join(m for m in sys.modules if m.split('.')[0] in {HEAVY!r}))")
+    return subprocess.run([python, "-c", code], capture_output=True, text=True, check=True).stdout.split()
+
+def wall_time(argv):
+    started = time.perf_counter()
+    subprocess.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description="check the start up budget of check_ontap")
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get("STARTUP_BUDGET_MS", 40)),
+                        help='maximum median import time of checkontap.cli in ms, env STARTUP_BUDGET_MS (default: 40)')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--python', default=sys.executable)
+    args = parser.parse_args()
+
+    imports = [import_time(args.python, "checkontap.cli") / 1000 for _ in range(args.runs)]
+    listing = [wall_time([args.python, "-c", "from checkontap.cli import main; main()"]) * 1000 for _ in range(args.runs)]
+    baseline = [wall_time([args.python, "-c", "pass"]) * 1000 for _ in range(args.runs)]
+    heavy = loaded_heavy(args.python)
+
+    print(f"import checkontap.cli   median {statistics.median(imports):7.1f} ms (budget {args.budget_ms} ms)")
+    print(f"check_ontap (list)      median {statistics.median(listing):7.1f} ms")
+    print(f"python -c pass          median {statistics.median(baseline):7.1f} ms")
+
+    failed = False
+    if heavy:
+        print(f"FAIL: importing checkontap.cli loads {', '.join(sorted(heavy))}")
+        failed = True
+    if statistics.median(imports) > args.budget_ms:
+        print("FAIL: import time above budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
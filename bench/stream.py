@@ -0,0 +1,107 @@
+#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Time to the first record of a collection sent slowly by the cluster.
+
+A local HTTP server plays the cluster and sends the volumes of one page in
+chunks spread over --seconds. The check reads them through the adapter stack
+setup_connection() builds on a real HostConnection (netapp_ontap's
+LoggingAdapter and all wrappers), once as a plain check and once with -v.
+Fails (exit 1) if the first record of the plain check only arrives with the
+end of the body, then something in the stack reads responses completely.
+
+    python bench/stream.py [--records 200] [--seconds 2]
+"""
+
+import sys
+import json
+import time
+import argparse
+import threading
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def serve(records, seconds):
+    """ Start the server in the background, return its port """
+
+    class Volumes(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def chunk(self, data):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            self.chunk(b'{"records": [')
+            for i in range(records):
+                record = {"uuid": f"{i:08d}", "name": f"vol{i}", "space": {"used": i}}
+                self.chunk((", " if i else "").encode() + json.dumps(record).encode())
+                time.sleep(seconds / records)
+            self.chunk(f'], "num_records": {records}}}'.encode())
+            self.chunk(b"")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Volumes)
+    # the check closing its keep-alive connection isn't an error
+    server.handle_error = lambda request, address: None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_address[1]
+
+def measure(port, verbose):
+    """ (seconds to the first record, seconds to all records) """
+    from netapp_ontap import HostConnection
+    from checkontap.cli import setup_api
+    from checkontap.tools import helper, transport
+
+    setup_api()
+    # the real stack on plain HTTP, setup_connection() reuses the connection
+    key = ("127.0.0.1", "u", port, None, None)
+    if key not in helper._connections:
+        helper._connections[key] = HostConnection("127.0.0.1", username="u", password="p",
+                                                  verify=False, port=port, scheme="http")
+    helper.setup_connection("127.0.0.1", "u", "p", port, SimpleNamespace(verbose=verbose))
+
+    started = time.perf_counter()
+    first = None
+    for volume in transport.get_collection("/api/storage/volumes", fields="name,space.used"):
+        if first is None:
+            first = time.perf_counter() - started
+    return (first, time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description="time to the first streamed record through the adapter stack")
+    parser.add_argument('--records', type=int, default=200)
+    parser.add_argument('--seconds', type=float, default=2.0)
+    args = parser.parse_args()
+
+    port = serve(args.records, args.seconds)
+    failed = False
+    for (name, verbose) in (("check", None), ("check -v", 1)):
+        (first, total) = measure(port, verbose)
+        print(f"{name:10} first record after {first:6.3f}s, all {args.records} after {total:6.3f}s")
+        if not verbose and first > total / 2:
+            print(f"FAIL: {name} only gets its first record with the end of the body")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Records per second and peak memory of the netapp_ontap Resources against
+the raw transport (checkontap.tools.transport).
+
+All read the same volume collection, as volume-usage requests it, from an
+adapter answering with prepared pages, so only decoding and building the
+records is measured. Each path runs in its own interpreter to get its own
+peak RSS. "resource" and "transport" keep all volumes in a list, "stream"
+evaluates each volume as it's decoded like volume-usage does.
+
+    python bench/transport.py [--records 20000] [--page-size 1000]
+"""
+
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+
+FIELDS = "svm,space,files,space.snapshot"
+
+def volume(i):
+    return {
+        "uuid": f"00000000-0000-0000-0000-{i:012d}",
+        "name": f"vol{i}",
+        "svm": {"name": f"svm{i % 10}", "uuid": f"10000000-0000-0000-0000-{i % 10:012d}",
+                "_links": {"self": {"href": f"/api/svm/svms/10000000-0000-0000-0000-{i % 10:012d}"}}},
+        "files": {"maximum": 31122, "used": 102 + i},
+        "space": {
+            "size": 1073741824, "used": 2080768 + i, "available": 1017974784, "afs_total": 1020055552,
+            "footprint": 6590464, "percent_used": 0, "physical_used": 6590464, "metadata": 11005952,
+            "logical_space": {"used": 2080768, "used_by_afs": 2080768, "reporting": False, "enforcement": False},
+            "snapshot": {"used": 4509696, "reserve_available": 49176576, "reserve_percent": 5, "reserve_size": 53686272},
+        },
+        "_links": {"self": {"href": f"/api/storage/volumes/00000000-0000-0000-0000-{i:012d}"}},
+    }
+
+def pages(records, page_size):
+    """ {path with query: encoded page} like the cluster pages a collection """
+    result = {}
+    for start in range(0, records, page_size):
+        body = {"records": [volume(i) for i in range(start, min(records, start + page_size))],
+                "num_records": min(page_size, records - start)}
+        if start + page_size < records:
+            body["_links"] = {"next": {"href": f"/api/storage/volumes?start={start + page_size}"}}
+        result[start] = json.dumps(body).encode()
+    return result
+
+def measure(path, records, page_size):
+    """ Runs in the child: fetch all volumes by path, return the figures """
+    from urllib.parse import urlparse, parse_qs
+    from requests.adapters import BaseAdapter
+    from netapp_ontap import config, HostConnection
+    from netapp_ontap.resources import Volume
+    from checkontap.tools import transport
+    from checkontap.tools.adapter import build_response
+
+    prepared = pages(records, page_size)
+
+    class Pages(BaseAdapter):
+        def send(self, request, **kwargs):
+            start = int(parse_qs(urlparse(request.url).query).get("start", ["0"])[0])
+            return build_response(request, 200, {"Content-Type": "application/json"}, prepared[start])
+
+        def close(self):
+            pass
+
+    connection = HostConnection("bench", username="u", password="p", verify=False)
+    connection.session.mount(connection.origin, Pages())
+    config.CONNECTION = connection
+
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    if path == "resource":
+        volumes = list(Volume.get_collection(fields=FIELDS))
+    elif path == "transport":
+        volumes = list(transport.get_collection("/api/storage/volumes", fields=FIELDS))
+    else:
+        volumes = transport.get_collection("/api/storage/volumes", fields=FIELDS)
+    # read every volume like check_volume does
+    (count, used) = (0, 0)
+    for v in volumes:
+        count += 1
+        used += v.space.used
+    seconds = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"path": path, "records": count, "used": used, "seconds": seconds,
+            "peak_rss_kb": peak, "grown_rss_kb": peak - before}
+
+def main():
+    parser = argparse.ArgumentParser(description="compare the Resource and the raw transport path")
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--python', default=sys.executable)
+    parser.add_argument('--child', choices=['resource', 'transport', 'stream'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.records, args.page_size)))
+        return
+
+    for path in ("resource", "transport", "stream"):
+        result = json.loads(subprocess.run(
+            [args.python, __file__, "--child", path, "--records", str(args.records), "--page-size", str(args.page_size)],
+            capture_output=True, text=True, check=True).stdout)
+        print(f"{path:10} {result['records']:7} records {result['records'] / result['seconds']:10.0f} records/s "
+              f"peak RSS {result['peak_rss_kb'] / 1024:7.1f} MiB (+{result['grown_rss_kb'] / 1024:.1f} MiB while fetching)")
+
+if __name__ == "__main__":
+    main()
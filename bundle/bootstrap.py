@@ -0,0 +1,91 @@
+#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+__main__ of the check_ontap_fast bundle (make check_ontap_fast).
+
+The bundle is a zipapp with check_ontap, its dependencies and their
+precompiled bytecode. On the first run it's extracted to a cache directory
+named after the build and the Python version, every following run imports
+from there: plain files with valid .pyc instead of compressed modules in a
+zip without bytecode.
+
+The cache directory is $CHECK_ONTAP_BUNDLE_CACHE or
+$XDG_CACHE_HOME/check_ontap/bundle (default ~/.cache/check_ontap/bundle).
+The bytecode isn't checked against the sources, so the extracted bundle and
+the directory it's in are only used if they belong to this user, aren't
+symlinks and nobody else can write to them. Otherwise the bundle runs from
+the archive itself.
+"""
+
+import os
+import sys
+import stat
+
+# replaced by the content hash of the bundle at build time
+BUILD_ID = "@BUILD_ID@"
+
+def cache_dir():
+    base = os.environ.get("CHECK_ONTAP_BUNDLE_CACHE") or \
+        os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "check_ontap", "bundle")
+    return os.path.join(base, f"{BUILD_ID}-{sys.implementation.cache_tag}")
+
+def private(path):
+    """ True if path is a directory of this user nobody else can write to """
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISDIR(st.st_mode) and st.st_uid == os.getuid() and not st.st_mode & 0o022
+
+def extract(archive, target):
+    """ Extract archive to target, concurrent first runs race on the final rename """
+    import shutil
+    import zipfile
+    import tempfile
+
+    parent = os.path.dirname(target)
+    os.makedirs(parent, mode=0o700, exist_ok=True)
+    if not private(parent):
+        raise PermissionError(f"{parent} is writable by others")
+    tmp = tempfile.mkdtemp(dir=parent, prefix=".extract-")
+    try:
+        with zipfile.ZipFile(archive) as z:
+            z.extractall(tmp)
+        os.rename(tmp, target)
+    except OSError:
+        # another run was faster
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.isdir(target):
+            raise
+
+def main():
+    archive = os.path.dirname(os.path.abspath(__file__))
+    target = cache_dir()
+    try:
+        if not os.path.lexists(target):
+            extract(archive, target)
+        if not (private(os.path.dirname(target)) and private(target)):
+            raise PermissionError(f"{target} is writable by others")
+    except OSError:
+        # no private cache, import from the archive itself
+        target = archive
+    sys.path[0] = target
+
+    from checkontap.cli import main as check_ontap
+    check_ontap()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Run checks from a long running Python process.
+
+    from checkontap import api
+    result = api.check("volume-usage", ["-H", "cluster01", "-u", "monitor", "-w", "80", "-c", "90"])
+    print(result.status, result.message, result.perfdata)
+
+Every command module is split into parse_args(argv), fetch(args) and a pure
+evaluate(args, data) returning a Result, run() is the command line wrapper
+around them. Nothing here reads sys.argv or leaves the interpreter: invalid
+arguments raise CheckOntapException, API errors become an UNKNOWN Result.
+
+netapp_ontap works on one global connection, so checks of one process run
+one at a time. Connections are kept per cluster and stay warm between checks.
+fetch() may hand out records which are still read while they are evaluated,
+so evaluating is part of the check holding the connection.
+
+The libraries are set up like on the command line (setup_api()): no urllib3
+warnings about the unverified certificate, API calls are only logged with -v.
+The logging configuration of the caller is left alone.
+"""
+
+import threading
+import importlib
+from monplugin import Status
+from netapp_ontap.error import NetAppRestError
+from checkontap import CheckOntapException
+from checkontap.cli import setup_api
+from checkontap.tools import memo, passive, ratelimit
+from checkontap.tools.helper import setup_connection
+from checkontap.tools.registry import module_name
+from checkontap.tools.result import Result
+
+_lock = threading.Lock()
+
+def command(name):
+    """ The ontapcmd module of a command like volume-usage """
+    try:
+        return importlib.import_module(module_name(name))
+    except ModuleNotFoundError as e:
+        if not e.name.startswith("checkontap.ontapcmd."):
+            raise
+        raise CheckOntapException(f"command not found: {name}")
+
+def parse_args(name, argv):
+    """ Parsed arguments of command name, argv are the arguments without the command """
+    return command(name).parse_args(list(argv))
+
+def run(name, args) -> Result:
+    """ Fetch the data for args of command name and evaluate it """
+    module = command(name)
+    evaluate = module.evaluate
+    if passive.enabled(args) and hasattr(module, 'evaluate_passive'):
+        evaluate = module.evaluate_passive
+    with _lock, memo.run_scope():
+        setup_api()
+        setup_connection(args.host, args.api_user, args.api_pass, args.port, args)
+        try:
+            result = evaluate(args, module.fetch(args))
+        except NetAppRestError as error:
+            result = Result(Status.UNKNOWN, f"Error => {error}")
+        ratelimit.perfdata(result.check)
+        return result
+
+def check(name, argv) -> Result:
+    """ Run command name with the command line arguments argv """
+    return run(name, parse_args(name, argv))
@@ -18,17 +18,21 @@
 
 import sys
 import os 
+import io
 import signal
 import logging
 import importlib
-import pkgutil
-import checkontap.ontapcmd
-from checkontap.tools import cli
+import traceback
+import shlex
+import json
+import argparse
+from contextlib import redirect_stdout, redirect_stderr
 from checkontap import CheckOntapTimeout
-from netapp_ontap import utils
-import urllib3.exceptions
-import requests
-requests.packages.urllib3.disable_warnings()
+from checkontap.commands import COMMANDS
+from checkontap.tools.registry import module_name
+
+# netapp_ontap, requests and urllib3 take most of the start up time, they are
+# only imported by the command modules and setup_api() once a command runs
 
 def timeout_handler(signum, frame):
     raise CheckOntapTimeout("Timeout reached")
@@ -51,6 +55,22 @@ def dependencies():
             print(f" - {p}")
         sys.exit(3)
 
+def setup_api():
+    """
+    Settings of the libraries a command uses, called before it runs.
+    Logging every API call is switched on by setup_connection() with -v only,
+    it reads each response body at once and streamed collections with it.
+    """
+    from netapp_ontap import utils
+    import requests
+    requests.packages.urllib3.disable_warnings()
+    utils.DEBUG = 1
+
+def connection_error(e):
+    # if urllib3 isn't imported yet it can't have raised the exception
+    exceptions = sys.modules.get("urllib3.exceptions")
+    return exceptions is not None and isinstance(e, exceptions.NewConnectionError)
+
 def run():
     module = None
     try:
@@ -61,62 +81,109 @@ def run():
     set_timeout()
     
     if module:
-        mod = "".join(c for c in module if c.isalnum())
         try:
-            runner = importlib.import_module(f"checkontap.ontapcmd.{mod}")
+            runner = importlib.import_module(module_name(module))
         except ModuleNotFoundError as e:
-            if not e.name.startswith("ontapcmd."):
+            if not e.name.startswith("checkontap.ontapcmd."):
                 raise e
             print(f"command not found: {module}")
             sys.exit(3)
+        setup_api()
         try:
             sys.argv[0] = f"{sys.argv[0]} {runner.__cmd__}"
         except:
             sys.argv[0] = f"{sys.argv[0]} {module}"
-        runner.run()
+        from checkontap.tools import memo
+        with memo.run_scope():
+            runner.run()
     else:
-        p = {}
-        modules = set()
-        for loader, name, is_pkg in pkgutil.walk_packages(checkontap.ontapcmd.__path__):
-            if not is_pkg:
-                full_name = checkontap.ontapcmd.__name__ + '.' + name
-                p[name] = importlib.import_module(full_name)
-                if hasattr(p[name], '__cmd__') and p[name].__cmd__:
-                    modules.add(p[name].__cmd__)
         print("Specify cmd, one of:\n")
-        for mod in sorted(modules):
+        for mod in sorted(COMMANDS):
             print(f" {mod}")
         print()
 
-def main():
-    import traceback
-    
-    dependencies()
-    
+def setup_logging():
     logging.basicConfig(format='%(asctime)s %(levelname)s %(module)s %(funcName)s %(lineno)d %(message)s', stream=sys.stdout)
     logging.getLogger().disabled = True
     logging.getLogger("urllib3").propagate = False
-    utils.DEBUG = 1
-    utils.LOG_ALL_API_CALLS = 1
 
+def execute(argv):
+    """
+    Run a check in this process as if check_ontap was called with argv
+    and return the plugin exit code instead of leaving the interpreter
+    """
+    sys.argv = list(argv)
     try:
         run()
     except SystemExit as e:
         if not isinstance(e.code, int) or e.code > 3:
-            sys.exit(3)
+            return 3
         else:
-            sys.exit(e.code)
-    except urllib3.exceptions.NewConnectionError as e:
-        print(f"UNKNOWN - connection issue {e}")
-        sys.exit(3)
+            return e.code
     except CheckOntapTimeout as e:
         print("UNKNOWN - Timeout reached")
         #traceback.print_exc(file=sys.stdout)
-        sys.exit(3)
+        return 3
     except Exception as e:
+        if connection_error(e):
+            print(f"UNKNOWN - connection issue {e}")
+            return 3
         print(f"UNKNOWN - Unhandled exception: {e}")
         traceback.print_exc()
-        sys.exit(3)
+        return 3
+    finally:
+        signal.alarm(0)
+    return 0
+
+def capture(argv):
+    """ Like execute() but returns (code, stdout, stderr) of the check """
+    out = io.StringIO()
+    err = io.StringIO()
+    with redirect_stdout(out), redirect_stderr(err):
+        code = execute(argv)
+    return (code, out.getvalue(), err.getvalue())
+
+def main():
+    dependencies()
+    setup_logging()
+    sys.exit(execute(sys.argv))
+
+def batch():
+    """
+    Run many commands against one host in one process.
+
+    Commands are read from stdin, one per line with its specific arguments,
+    the arguments given to check_ontap_batch (host, user, ...) are added to
+    each of them. All commands share one connection and every endpoint is
+    fetched once with the union of the fields the commands need.
+    One JSON line per command is printed: {"command", "code", "output"}
+    """
+    parser = argparse.ArgumentParser(description="run check_ontap commands read from stdin against one host",
+                                     epilog="example: echo 'volume-usage -w 80 -c 90' | check_ontap_batch -H cluster -u monitor")
+    parser.add_argument('-f', '--file',
+                        type=argparse.FileType('r'),
+                        default=sys.stdin,
+                        help='read the commands from this file instead of stdin')
+    (args, common) = parser.parse_known_args()
+    from checkontap.tools import memo, fields
+
+    dependencies()
+    setup_logging()
+
+    commands = []
+    for line in args.file:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            commands.append(shlex.split(line))
+
+    worst = 0
+    with memo.scope(widen=fields.union(c[0] for c in commands)) as scope:
+        for command in commands:
+            (code, out, err) = capture(["check_ontap"] + command + common)
+            worst = max(worst, code)
+            print(json.dumps({"command": shlex.join(command), "code": code, "output": out + err}), flush=True)
+        logging.getLogger(__name__).info(f"{scope.hits} requests answered from memory")
+    sys.exit(worst)
 
 if __name__ == "__main__":
     main()
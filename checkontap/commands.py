@@ -0,0 +1,31 @@
+#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# generated by checkontap.tools.registry, do not edit
+
+COMMANDS = {
+    'about': 'checkontap.ontapcmd.about',
+    'aggregate-usage': 'checkontap.ontapcmd.aggregateusage',
+    'cluster-health': 'checkontap.ontapcmd.clusterhealth',
+    'disk-health': 'checkontap.ontapcmd.diskhealth',
+    'hardware-health': 'checkontap.ontapcmd.hardwarehealth',
+    'interface-health': 'checkontap.ontapcmd.interfacehealth',
+    'lun-usage': 'checkontap.ontapcmd.lunusage',
+    'port-health': 'checkontap.ontapcmd.porthealth',
+    'snapmirror-health': 'checkontap.ontapcmd.snapmirrorhealth',
+    'snapshot-health': 'checkontap.ontapcmd.snapshothealth',
+    'volume-health': 'checkontap.ontapcmd.volumehealth',
+    'volume-usage': 'checkontap.ontapcmd.volumeusage',
+}
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+
+#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Long running check_ontap daemon and its thin client.
+
+The daemon (check_ontapd) imports netapp_ontap once and keeps one
+HostConnection per (host, user, port), so checks reuse warm keep-alive
+sessions instead of paying TCP, TLS and authentication on every run.
+
+The client (check_ontapc) takes the same arguments as check_ontap, forwards
+them over a unix socket and prints the plugin output and exit code of the
+check. If no daemon is listening the check is run locally.
+
+The daemon serves checks with --workers processes forked once at start,
+each keeps its own connections and runs one check at a time (netapp_ontap
+works on a global connection and the timeout relies on SIGALRM). In zygote
+mode (check_ontapd --fork) it forks a child per request instead, the child
+starts with everything imported and only does the check itself.
+
+The default socket is in the private state directory of the user
+($XDG_RUNTIME_DIR/check_ontap or <tmp>/check_ontap-<uid>, mode 0700). The
+client only sends the arguments (passwords included) to a daemon running as
+the same user, checked by the credentials of the peer of the socket.
+
+Protocol: one JSON line per direction
+    request  {"argv": [...], "env": {...}}
+    response {"code": 0, "stdout": "...", "stderr": "..."}
+"""
+
+import os
+import sys
+import gc
+import stat
+import json
+import struct
+import socket
+import signal
+import argparse
+import tempfile
+
+SOCKET_NAME = "check_ontapd.sock"
+DEFAULT_WORKERS = 8
+# environment settings a check reads, they are passed on to the daemon
+FORWARD_ENV = ("NETAPP_API_PASS", "NETAPP_API_CERT", "NETAPP_API_KEY", "TIMEOUT")
+FORWARD_ENV_PREFIX = "CHECK_ONTAP_"
+
+def forwarded(name):
+    return name in FORWARD_ENV or (name.startswith(FORWARD_ENV_PREFIX) and name != "CHECK_ONTAP_SOCKET")
+
+def default_socket():
+    """ Socket in the default state directory, like helper.state_dir() """
+    if os.environ.get("XDG_RUNTIME_DIR"):
+        base = os.path.join(os.environ["XDG_RUNTIME_DIR"], "check_ontap")
+    else:
+        base = os.path.join(tempfile.gettempdir(), f"check_ontap-{os.getuid()}")
+    return os.path.join(base, SOCKET_NAME)
+
+def socket_path():
+    return os.environ.get("CHECK_ONTAP_SOCKET") or default_socket()
+
+def peer_uid(conn, path):
+    """ uid of the process listening on path, the owner of the socket file without SO_PEERCRED """
+    if hasattr(socket, "SO_PEERCRED"):
+        creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+        return struct.unpack("3i", creds)[1]
+    st = os.lstat(path)
+    return st.st_uid if stat.S_ISSOCK(st.st_mode) else None
+
+def read_message(stream):
+    line = stream.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+def write_message(stream, message):
+    stream.write(json.dumps(message).encode() + b"\n")
+    stream.flush()
+
+def handle_request(request):
+    """ Run one check request inside the daemon and return the response """
+    from checkontap import cli
+
+    saved = {k: v for (k, v) in os.environ.items() if forwarded(k)}
+    try:
+        for k in saved:
+            del os.environ[k]
+        os.environ.update({k: v for (k, v) in request.get("env", {}).items() if forwarded(k)})
+        (code, out, err) = cli.capture(request["argv"])
+    finally:
+        for k in [k for k in os.environ if forwarded(k)]:
+            del os.environ[k]
+        os.environ.update(saved)
+    return {"code": code, "stdout": out, "stderr": err}
+
+def preload():
+    """ Import all commands and what they import, forked children inherit it """
+    import importlib
+    from checkontap import cli
+    from checkontap.commands import COMMANDS
+
+    for module in COMMANDS.values():
+        importlib.import_module(module)
+    cli.setup_api()
+    # keep the imported objects out of the collector, otherwise its runs in
+    # the children touch them and copy the shared memory pages
+    gc.freeze()
+
+def handle_connection(conn):
+    with conn, conn.makefile("rwb") as stream:
+        try:
+            request = read_message(stream)
+            if request is None:
+                return
+            write_message(stream, handle_request(request))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"check_ontapd: dropped request: {e}", file=sys.stderr)
+
+def worker(server):
+    """ Serve requests one after another until terminated, in a worker process """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    while True:
+        conn, _ = server.accept()
+        handle_connection(conn)
+
+def spawn(server):
+    """ Fork a worker process, return its pid """
+    pid = os.fork()
+    if pid != 0:
+        return pid
+    status = 0
+    try:
+        worker(server)
+    except BaseException as e:
+        print(f"check_ontapd: worker failed: {e}", file=sys.stderr)
+        status = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
+
+def supervise(server, workers):
+    """ Keep workers processes serving server, a worker that died is replaced """
+    children = set()
+    try:
+        for _ in range(workers):
+            children.add(spawn(server))
+        while True:
+            (pid, status) = os.wait()
+            if pid in children:
+                children.discard(pid)
+                print(f"check_ontapd: worker {pid} exited ({status}), starting a new one", file=sys.stderr)
+                children.add(spawn(server))
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+def fork_connection(server, conn):
+    """ Handle the request of conn in a child process """
+    pid = os.fork()
+    if pid != 0:
+        conn.close()
+        return
+    status = 0
+    try:
+        server.close()
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        handle_connection(conn)
+    except BaseException as e:
+        print(f"check_ontapd: child failed: {e}", file=sys.stderr)
+        status = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
+
+def serve(path, fork=False, workers=DEFAULT_WORKERS):
+    """
+    Serve check requests on a unix socket. netapp_ontap works on a global
+    connection and the check timeout relies on SIGALRM, both only allow one
+    running check per process: workers processes serve requests at the same
+    time, or with fork every request is handled by a child of this process.
+    """
+    from checkontap import cli
+    from checkontap.tools.helper import private_dir
+
+    cli.dependencies()
+    cli.setup_logging()
+    if path == default_socket() and not private_dir(os.path.dirname(path)):
+        sys.exit(f"check_ontapd: {os.path.dirname(path)} is not a private directory")
+    preload()
+    if fork:
+        # children are reaped by the kernel
+        signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o077)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(umask)
+    server.listen(128)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    try:
+        if not fork:
+            supervise(server, workers)
+        while True:
+            conn, _ = server.accept()
+            fork_connection(server, conn)
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+def forward(path, argv, timeout):
+    """ Send argv to the daemon and return its response or None if unreachable """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(path)
+    except OSError:
+        client.close()
+        return None
+    if peer_uid(client, path) != os.getuid():
+        client.close()
+        print(f"check_ontapc: {path} isn't served by this user, running the check locally", file=sys.stderr)
+        return None
+    with client, client.makefile("rwb") as stream:
+        env = {k: v for (k, v) in os.environ.items() if forwarded(k)}
+        write_message(stream, {"argv": argv, "env": env})
+        return read_message(stream)
+
+def server():
+    parser = argparse.ArgumentParser(description="check_ontap daemon keeping connections to the clusters")
+    parser.add_argument('-S', '--socket',
+                        default=socket_path(),
+                        help='unix socket to listen on, can also be set by env CHECK_ONTAP_SOCKET')
+    parser.add_argument('--fork',
+                        action='store_true',
+                        help='zygote mode: import all commands once and fork a child per request')
+    parser.add_argument('-w', '--workers',
+                        type=int,
+                        default=DEFAULT_WORKERS,
+                        help=f'worker processes serving checks at the same time, each with its own connections (default: {DEFAULT_WORKERS})')
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers needs at least one worker")
+    try:
+        serve(args.socket, fork=args.fork, workers=args.workers)
+    except KeyboardInterrupt:
+        pass
+
+def client():
+    argv = ["check_ontap"] + sys.argv[1:]
+    # a little longer than the checks own timeout, the daemon reports that one
+    timeout = int(os.environ.get("TIMEOUT", "60")) + 10
+    try:
+        response = forward(socket_path(), argv, timeout)
+    except socket.timeout:
+        print("UNKNOWN - Timeout reached")
+        sys.exit(3)
+    except (OSError, ValueError) as e:
+        print(f"UNKNOWN - daemon communication failed: {e}")
+        sys.exit(3)
+
+    if response is None:
+        # no daemon running, do the check on our own
+        from checkontap import cli
+        sys.argv = argv
+        cli.main()
+
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    sys.exit(response["code"])
+
+if __name__ == "__main__":
+    server()
@@ -0,0 +1,142 @@
+#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Run one check_ontap command against many clusters in parallel.
+
+netapp_ontap works on one global connection, so every cluster is checked in
+its own worker process. Workers are forked from a parent which has already
+imported the command, at most --jobs run at the same time. Each cluster has
+a deadline, the check inside the worker times out on it like a single
+check_ontap run and a worker still running shortly after it is killed.
+One JSON line per cluster is printed as soon as its check finished:
+    {"cluster": "...", "code": 0, "output": "...", "seconds": 1.2}
+
+The inventory has one cluster per line, optionally followed by arguments
+for this cluster only (e.g. another --api_user), '#' starts a comment.
+"""
+
+import os
+import sys
+import json
+import time
+import shlex
+import argparse
+import importlib
+import multiprocessing
+from multiprocessing.connection import wait
+from collections import deque
+
+DEFAULT_JOBS = 8
+DEFAULT_DEADLINE = 60
+# time a worker gets after its deadline to report the timeout itself
+GRACE = 5
+
+def read_inventory(stream):
+    """ [(cluster, [arguments])] of the inventory file """
+    clusters = []
+    for line in stream:
+        line = line.split('#', 1)[0].strip()
+        if line:
+            (cluster, *arguments) = shlex.split(line)
+            clusters.append((cluster, arguments))
+    return clusters
+
+def work(conn, argv, deadline):
+    """ Worker process: run the check and send (code, output) to the parent """
+    from checkontap import cli
+
+    os.environ["TIMEOUT"] = str(deadline)
+    (code, out, err) = cli.capture(argv)
+    conn.send((code, out + err))
+    conn.close()
+
+def fan_out(clusters, command, common, jobs, deadline):
+    """ Run command against all clusters, yield (cluster, code, output, seconds) as they finish """
+    context = multiprocessing.get_context("fork")
+    pending = deque(clusters)
+    running = {}
+
+    while pending or running:
+        while pending and len(running) < jobs:
+            (cluster, arguments) = pending.popleft()
+            argv = ["check_ontap"] + command + ["--host", cluster] + common + arguments
+            (receiver, sender) = context.Pipe(duplex=False)
+            process = context.Process(target=work, args=(sender, argv, deadline), daemon=True)
+            process.start()
+            sender.close()
+            running[receiver] = (cluster, process, time.monotonic())
+
+        now = time.monotonic()
+        timeout = max(0, min(started + deadline + GRACE for (_, _, started) in running.values()) - now)
+        for receiver in wait(list(running), timeout=timeout):
+            (cluster, process, started) = running.pop(receiver)
+            try:
+                (code, output) = receiver.recv()
+            except EOFError:
+                (code, output) = (3, f"UNKNOWN - worker died with exit code {process.exitcode}\n")
+            receiver.close()
+            process.join()
+            yield (cluster, code, output, time.monotonic() - started)
+
+        now = time.monotonic()
+        for receiver in [r for (r, (_, _, started)) in running.items() if now - started > deadline + GRACE]:
+            (cluster, process, started) = running.pop(receiver)
+            process.kill()
+            process.join()
+            receiver.close()
+            yield (cluster, 3, f"UNKNOWN - deadline of {deadline}s exceeded\n", now - started)
+
+def main():
+    parser = argparse.ArgumentParser(description="run one check_ontap command against all clusters of an inventory",
+                                     epilog="example: check_ontap_fanout -i clusters.txt aggregate-usage -w 80 -c 90 -u monitor")
+    parser.add_argument('-i', '--inventory',
+                        type=argparse.FileType('r'),
+                        required=True,
+                        help='file with one cluster per line, optionally followed by arguments for this cluster')
+    parser.add_argument('-j', '--jobs',
+                        type=int,
+                        default=DEFAULT_JOBS,
+                        help=f'number of clusters checked at the same time (default: {DEFAULT_JOBS})')
+    parser.add_argument('-d', '--deadline',
+                        type=int,
+                        default=int(os.environ.get("TIMEOUT", DEFAULT_DEADLINE)),
+                        help=f'seconds a single cluster may take, can also be set by env TIMEOUT (default: {DEFAULT_DEADLINE})')
+    (args, command) = parser.parse_known_args()
+    if not command or command[0].startswith('-'):
+        parser.error("the command has to follow the fan-out arguments")
+
+    from checkontap import cli
+    from checkontap.tools.registry import module_name
+
+    cli.dependencies()
+    cli.setup_logging()
+    clusters = read_inventory(args.inventory)
+
+    # import the command once in the parent, the forked workers inherit it
+    try:
+        importlib.import_module(module_name(command[0]))
+    except ModuleNotFoundError:
+        print(f"command not found: {command[0]}")
+        sys.exit(3)
+
+    worst = 0
+    for (cluster, code, output, seconds) in fan_out(clusters, command[:1], command[1:], max(1, args.jobs), args.deadline):
+        worst = max(worst, code)
+        print(json.dumps({"cluster": cluster, "code": code, "output": output, "seconds": round(seconds, 3)}), flush=True)
+    sys.exit(worst)
+
+if __name__ == "__main__":
+    main()
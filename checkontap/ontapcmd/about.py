@@ -23,38 +23,47 @@ from netapp_ontap.resources import Software
 from netapp_ontap.error import NetAppRestError
 from ..tools import cli
 from ..tools.helper import setup_connection,severity
+from ..tools.result import Result
 
 __cmd__ = "about"
 description = f"{__cmd__} need just connection settings and show up the ontap version"
+logger = logging.getLogger(__name__)
 
-def run():
+def parse_args(argv=None):
     parser = cli.Parser()
     parser.set_epilog("Connect to ONTAP API and check Software version")
     parser.set_description(description)
-    args = parser.get_args()
+    return parser.get_args(argv)
+
+def fetch(args):
+    software = Software()
+    software.get(fields='version')
+    logger.debug(f"Software info \n{software.__dict__}")
+    return software
+
+def evaluate(args, software) -> Result:
+    check = Check()
+    # About overview module
+    check.add_message(Status.OK,f"current version id {software['version']}")
+    return Result.of(check, separator="\n")
+
+def run():
+    args = parse_args()
 
     # Setup module logging 
-    logger = logging.getLogger(__name__)
     logger.disabled=True
     if args.verbose:
         for log_name, log_obj in logging.Logger.manager.loggerDict.items():
             log_obj.disabled = False
             logging.getLogger(log_name).setLevel(severity(args.verbose))
 
-    setup_connection(args.host, args.api_user, args.api_pass, args.port)
+    setup_connection(args.host, args.api_user, args.api_pass, args.port, args)
     
-    check = Check()
-    # About overview module
     try:
-        software = Software()
-        software.get(fields='version')
-        logger.debug(f"Software info \n{software.__dict__}")
-        check.add_message(Status.OK,f"current version id {software['version']}")
+        result = evaluate(args, fetch(args))
     except NetAppRestError as error:
-        check.exit(Status.UNKNOWN, "Error => {}".format(error))
-
-    (code, message) = check.check_messages(separator="\n")
-    check.exit(code=code,message=message)
+        result = Result(Status.UNKNOWN, "Error => {}".format(error))
+    result.exit()
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    run()
@@ -17,13 +17,16 @@
 
 from monplugin import Check,Threshold,Status
 import logging
-from netapp_ontap.resources import Aggregate,Plex,CLI
 from netapp_ontap.error import NetAppRestError
-from ..tools import cli
+from ..tools import alerts, cli, fields, passive, pushdown, transport
 from ..tools.helper import setup_connection,item_filter,severity,bytes_to_uom,uom_to_bytes
+from ..tools.result import Result
 
 __cmd__ = "aggregate-usage"
 description = f"Mode {__cmd__} with -m / --metric % or size description like used_GB "
+logger = logging.getLogger(__name__)
+# field of the CLI for the metric of -m --alerts-only queries
+METRIC_FIELDS = {'usage': 'percent-used', 'used': 'usedsize', 'free': 'availsize'}
 """
 https://kb.netapp.com/onprem/ontap/dm/REST_API/Why_do_root_aggregates_not_show_up_in_REST_API_calls
 
@@ -33,109 +36,187 @@ Answer
 
 """
 
-def run():
+def check_aggregate(check, args, aggr, plexes):
+    """ Add messages and perfdata of aggr to check, return its short summary """
+    for plex in plexes:
+        logging.debug(f"Plex {plex.name}\n{plex}")
+        for rg in plex.raid_groups:
+            if rg.reconstruct.active:
+                check.add_message(Status.CRITICAL, f"RaidGroup {rg.name} on Plex {plex.name} is reconstructing")
+
+    value = {
+        'usage': bytes_to_uom(aggr.space.block_storage.used,'%',aggr.space.block_storage.size),
+        'used': aggr.space.block_storage.used,
+        'free': aggr.space.block_storage.size - aggr.space.block_storage.used,
+        'max': aggr.space.block_storage.size
+        }
+    for metric in ['usage','used','free']:
+        opts = {}
+        puom = '%' if metric == 'usage' else 'B'
+        if metric in args.metric:
+            typ, uom, *_ = (args.metric.split('_') + ['%' if 'usage' in args.metric else 'B'])
+            threshold = {}
+            opts['threshold'] = {}
+            if '%' in uom:
+                s = check.threshold.get_status(value['usage'])
+                out = f"{value[typ] :.2f}%"
+                if args.warning:
+                    threshold['warning'] = args.warning
+                if args.critical:
+                    threshold['critical'] = args.critical
+            else:
+                s = check.threshold.get_status(bytes_to_uom(value[typ],uom))
+                if 'free' in typ:
+                    pct = 100 - value['usage']
+                else:
+                    pct = value['usage']
+
+                out = f"{bytes_to_uom(value[metric],uom)}{uom} ({pct :.2f} %) "
+                if args.warning:
+                    threshold['warning'] = str(uom_to_bytes(args.warning,uom))
+                if args.critical:
+                    threshold['critical'] = str(uom_to_bytes(args.critical,uom))
+            opts['threshold'] = Threshold(**threshold)
+            if s != Status.OK:
+                check.add_message(s, f"{args.metric} on {aggr.name} is: {out}")
+            check.add_perfdata(label=f"{aggr.name} {metric}", value=value['usage'], uom=puom, **opts)
+        else:
+            check.add_perfdata(label=f"{aggr.name} {metric}", value=value[metric], uom=puom)
+
+    check.add_perfdata(label=f"{aggr.name} total", value=value['max'], uom='B')
+    return f"{aggr.name} ({value['usage']}% - {bytes_to_uom(value['max'],'TB')}TB)"
+
+def parse_args(argv=None):
     parser = cli.Parser()
     parser.set_description(description)
     parser.add_required_arguments(cli.Argument.WARNING,cli.Argument.CRITICAL)
     parser.add_optional_arguments(cli.Argument.EXCLUDE,
                                   cli.Argument.INCLUDE,
-                                  cli.Argument.METRIC)
-    
-    args = parser.get_args()
+                                  cli.Argument.METRIC,
+                                  cli.Argument.ALERTS_ONLY,
+                                  cli.Argument.PASSIVE_SPOOL, cli.Argument.PASSIVE_PIPE,
+                                  cli.Argument.PASSIVE_HOST, cli.Argument.SERVICE_TEMPLATE)
+    args = parser.get_args(argv)
+    if args.alerts_only and passive.enabled(args):
+        parser.error("--alerts-only would leave the passive results of the fine aggregates stale")
+    return args
+
+def fetch_aggregates(args, query):
+    """ [(aggregate, its plexes with raid groups)] of the aggregates matching query """
+    AGGREGATES = []
+    uuids = [a["uuid"] for a in transport.records("/api/private/cli/storage/aggregate",
+                                                fields=fields.fields(__cmd__, "/api/private/cli/storage/aggregate"),
+                                                **query)]
+
+    for uuid in uuids:
+        AGG = transport.get_record(f"/api/storage/aggregates/{uuid}",
+                                   fields=fields.fields(__cmd__, "/api/storage/aggregates/*"))
+        plexes = []
+        if (args.exclude or args.include) and item_filter(args,AGG.name):
+            # filtered out anyway, don't ask for its plexes
+            AGGREGATES.append((AGG, plexes))
+            continue
+        # one request for all plexes with their raid groups
+        plexes = list(transport.get_collection(f"/api/storage/aggregates/{uuid}/plexes",
+                                               fields=fields.fields(__cmd__, "/api/storage/aggregates/*/plexes")))
+        AGGREGATES.append((AGG, plexes))
+    return AGGREGATES
+
+def fetch_alerts(args):
+    """
+    (count of all aggregates, [(aggregate, plexes)] -w / -c may alert on),
+    raid groups of the others aren't read, disk-health tells reconstructing disks
+    """
+    query = pushdown.query(args, "aggregate")
+    unsupported = None
+    if (args.include or args.exclude) and "aggregate" not in query:
+        unsupported = "the aggregates --include / --exclude drop on the client have to be read to be counted"
+    AGGREGATES = fetch_aggregates(args, {**query, **alerts.query(args, METRIC_FIELDS, unsupported)})
+    # without a range the aggregates were all read and are counted already
+    return (transport.count_collection("/api/private/cli/storage/aggregate", **query), AGGREGATES)
+
+def fetch(args):
+    """ [(aggregate, its plexes with raid groups)] """
+    if args.alerts_only:
+        return fetch_alerts(args)
+    # the CLI calls the name of an aggregate aggregate
+    return fetch_aggregates(args, pushdown.query(args, "aggregate"))
+
+def select(args, AGGREGATES):
+    """ (count, [(aggregate, plexes)]) left after the item filter """
+    aggr_count = len(AGGREGATES)
+    logger.info(f"found {aggr_count} Aggregates")
+    aggregates = []
+    for (aggr, plexes) in AGGREGATES:
+        if (args.exclude or args.include) and item_filter(args,aggr.name):
+            logger.info(f"{aggr.name} filtered out and removed from check")
+            aggr_count -= 1
+            continue
+        logger.info(f"Aggregate {aggr.name}")
+        logger.debug(f"{aggr}")
+        aggregates.append((aggr, plexes))
+    return (aggr_count, aggregates)
+
+def new_check(args):
+    return Check(threshold = Threshold(args.warning or None, args.critical or None))
+
+def evaluate_alerts(args, data) -> Result:
+    """ Only the aggregates -w / -c alert on, the others are counted by the cluster """
+    (aggr_count, AGGREGATES) = data
+    (selected_count, aggregates) = select(args, AGGREGATES)
+    aggr_count -= len(AGGREGATES) - selected_count
+    if aggr_count == 0:
+        return Result(Status.UNKNOWN, "no aggregates found")
+    check = new_check(args)
+    alerting = 0
+    for (aggr, plexes) in aggregates:
+        c = new_check(args)
+        check_aggregate(c, args, aggr, plexes)
+        alerting += alerts.alerting(check, c)
+    return Result.of(check, allok=f"all {aggr_count} aggregates are fine",
+                     short=f"{alerting} of {aggr_count} aggregates alert" if alerting else None)
+
+def evaluate(args, data) -> Result:
+    if args.alerts_only:
+        return evaluate_alerts(args, data)
+    if len(data) == 0:
+        return Result(Status.UNKNOWN, "no aggregates found")
+    (aggr_count, aggregates) = select(args, data)
+    check = new_check(args)
+    OKOut = [check_aggregate(check, args, aggr, plexes) for (aggr, plexes) in aggregates]
+    return Result.of(check, allok=f"all {aggr_count} aggregates are fine. { '  '.join(OKOut) }")
+
+def evaluate_passive(args, data) -> Result:
+    """ Submit one passive result per aggregate, the Result tells how many """
+    if len(data) == 0:
+        return Result(Status.UNKNOWN, "no aggregates found")
+    (aggr_count, aggregates) = select(args, data)
+    results = passive.PassiveResults(args, __cmd__)
+    for (aggr, plexes) in aggregates:
+        c = new_check(args)
+        check_aggregate(c, args, aggr, plexes)
+        results.add(c, aggr.name, aggregate=aggr.name)
+    return results.submit_result()
+
+def run():
+    args = parse_args()
     # Setup module logging
-    logger = logging.getLogger(__name__)
     logger.disabled = True
     if args.verbose:
         for log_name, log_obj in logging.Logger.manager.loggerDict.items():
             log_obj.disabled = False
             logging.getLogger(log_name).setLevel(severity(args.verbose))
 
-    check = Check(threshold = Threshold(args.warning or None, args.critical or None))
-    setup_connection(args.host, args.api_user, args.api_pass, args.port)
+    setup_connection(args.host, args.api_user, args.api_pass, args.port, args)
 
-    AGGREGATES = []
-        
     try:
-        response = CLI().execute("storage aggregate show", fields='uuid')
-        
-        for a in response.http_response.json()["records"]:
-            AGG = Aggregate(uuid=a['uuid'])
-            AGG.get(fields="*")
-            AGGREGATES.append(AGG) 
-            
-        aggr_count = len(AGGREGATES)
-        logger.info(f"found {aggr_count} Aggregates")
-        
-        if aggr_count == 0:
-            check.exit(Status.UNKNOWN, "no aggregates found")
-
-        OKOut = []
-        for aggr in AGGREGATES:
-            if (args.exclude or args.include) and item_filter(args,aggr.name):
-                logger.info(f"{aggr.name} filtered out and removed from check")
-                aggr_count -= 1
-                continue
-            logger.info(f"Aggregate {aggr.name}")
-            logger.debug(f"{aggr.__dict__}")
-            
-            plex_count = Plex.count_collection(aggr.uuid)
-            if plex_count != 0:
-                for plex in Plex.get_collection(aggr.uuid):
-                    plex.get(fields="raid_groups")
-                    logging.debug(f"Plex {plex.name}\n{plex.__dict__}")
-                    for rg in plex.raid_groups:
-                        if rg.reconstruct.active:
-                            check.add_message(Status.CRITICAL, f"RaidGroup {rg.name} on Plex {plex.name} is reconstructing")
-    
-            value = {
-                'usage': bytes_to_uom(aggr.space.block_storage.used,'%',aggr.space.block_storage.size),
-                'used': aggr.space.block_storage.used,
-                'free': aggr.space.block_storage.size - aggr.space.block_storage.used,
-                'max': aggr.space.block_storage.size
-                }
-            OKOut.append(f"{aggr.name} ({value['usage']}% - {bytes_to_uom(value['max'],'TB')}TB)")
-            for metric in ['usage','used','free']:
-                opts = {}
-                puom = '%' if metric == 'usage' else 'B'
-                if metric in args.metric:
-                    typ, uom, *_ = (args.metric.split('_') + ['%' if 'usage' in args.metric else 'B'])
-                    threshold = {}
-                    opts['threshold'] = {}
-                    if '%' in uom:
-                        s = check.threshold.get_status(value['usage'])
-                        out = f"{value[typ] :.2f}%"
-                        if args.warning:
-                            threshold['warning'] = args.warning
-                        if args.critical:
-                            threshold['critical'] = args.critical
-                    else:
-                        s = check.threshold.get_status(bytes_to_uom(value[typ],uom))
-                        if 'free' in typ:
-                            pct = 100 - value['usage']
-                        else:
-                            pct = value['usage']
-
-                        out = f"{bytes_to_uom(value[metric],uom)}{uom} ({pct :.2f} %) "
-                        if args.warning:
-                            threshold['warning'] = str(uom_to_bytes(args.warning,uom))
-                        if args.critical:
-                            threshold['critical'] = str(uom_to_bytes(args.critical,uom))
-                    opts['threshold'] = Threshold(**threshold)
-                    if s != Status.OK:
-                        check.add_message(s, f"{args.metric} on {aggr.name} is: {out}")
-                    check.add_perfdata(label=f"{aggr.name} {metric}", value=value['usage'], uom=puom, **opts)
-                else:
-                    check.add_perfdata(label=f"{aggr.name} {metric}", value=value[metric], uom=puom)
-
-            check.add_perfdata(label=f"{aggr.name} total", value=value['max'], uom='B')
-            
-        (code, message) = check.check_messages(separator='\n',allok=f"all {aggr_count} aggregates are fine. { '  '.join(OKOut) }")
-        check.exit(code=code,message=message)
-
+        result = (evaluate_passive if passive.enabled(args) else evaluate)(args, fetch(args))
     except NetAppRestError as error:
-        check.exit(Status.UNKNOWN, "Error => {}".format(error))
+        result = Result(Status.UNKNOWN, "Error => {}".format(error))
     except Exception as error:
         logger.exception(error)
+        return
+    result.exit()
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    run()
@@ -17,17 +17,17 @@
 
 import logging
 from monplugin import Check,Status
-from netapp_ontap.resources import Cluster, Node, IpInterface
-from netapp_ontap.resources import Metrocluster, MetroclusterNode
 from netapp_ontap.error import NetAppRestError
-from ..tools import cli
+from ..tools import cli, fields, transport
 from ..tools.helper import setup_connection,severity,item_filter
+from ..tools.result import Result
 
 __cmd__ = "cluster-health"
+logger = logging.getLogger(__name__)
 
 """
 """
-def run():
+def parse_args(argv=None):
     parser = cli.Parser()
     parser.add_optional_arguments(cli.Argument.EXCLUDE,cli.Argument.INCLUDE)
     parser.add_optional_arguments({
@@ -39,47 +39,52 @@ def run():
         'help': "check health state or interconnect of a (metro)cluster. Mode connect isn't supported for metroclusters",
         }
     })
-    args = parser.get_args()
-    # Setup module logging
-    logger = logging.getLogger(__name__)
-    logger.disabled=True
-    if args.verbose:
-        for log_name, log_obj in logging.Logger.manager.loggerDict.items():
-            log_obj.disabled = False
-            logging.getLogger(log_name).setLevel(severity(args.verbose))
+    return parser.get_args(argv)
 
-    setup_connection(args.host, args.api_user, args.api_pass, args.port)
-
-    check = Check()
- 
+def fetch(args):
+    """ (cluster, metrocluster or None if unknown, nodes, nodes_count, cluster interfaces) """
     # Get data and check for cluster type
-    try:
-        cluster = Metrocluster()
-        cluster.get(fields="*")
-        if cluster.local.configuration_state == "configured":
-            metrocluster = True
-            nodes_count = MetroclusterNode.count_collection()
-            nodes = list(MetroclusterNode.get_collection(fields="*"))
-            logger.info(f"this is a Metro Cluster with {nodes_count} nodes")
-        elif cluster.local.configuration_state == "not_configured": 
-            metrocluster = False
-            nodes_count = Node.count_collection()
-            #nodes = list(Node.get_collection(fields="*"))
-            nodes = list(Node.get_collection(fields="name,state,membership,ha,cluster_interfaces"))
-            logger.info(f"this is a local Cluster with {nodes_count} nodes")
-            cluster = Cluster()
-            cluster.get(fields="*")
-        else: 
-            metrocluster = False
-            logger.warning(f"not sure what kind of cluster, we try a local one")
-            logger.debug(f"Cluster details : {cluster}")
-            check.exit(Status.UNKNOWN,f"not sure what kind of cluster this is")
-            
-        logger.debug(f"Cluster info \n{cluster.__dict__}")
-        
-    except NetAppRestError as error:
-        check.exit(Status.UNKNOWN, "Error => {}".format(error))
+    cluster = transport.get_record("/api/cluster/metrocluster",
+                                   fields=fields.fields(__cmd__, "/api/cluster/metrocluster", args.mode))
+    nodes = []
+    nodes_count = 0
+    if cluster.local.configuration_state == "configured":
+        metrocluster = True
+        if args.mode == "health":
+            nodes = list(transport.get_collection("/api/cluster/metrocluster/nodes",
+                                                  fields=fields.fields(__cmd__, "/api/cluster/metrocluster/nodes", args.mode)))
+            nodes_count = len(nodes)
+        logger.info(f"this is a Metro Cluster with {nodes_count} nodes")
+    elif cluster.local.configuration_state == "not_configured": 
+        metrocluster = False
+        nodes = list(transport.get_collection("/api/cluster/nodes",
+                                              fields=fields.fields(__cmd__, "/api/cluster/nodes", args.mode)))
+        nodes_count = len(nodes)
+        logger.info(f"this is a local Cluster with {nodes_count} nodes")
+        if args.mode == "health":
+            cluster = transport.get_record("/api/cluster", fields=fields.fields(__cmd__, "/api/cluster", args.mode))
+    else: 
+        metrocluster = None
+        logger.warning(f"not sure what kind of cluster, we try a local one")
+        logger.debug(f"Cluster details : {cluster}")
         
+    logger.debug(f"Cluster info \n{cluster}")
+
+    interfaces = []
+    if args.mode == "connect" and metrocluster is False:
+        for node in nodes:
+            # fetch cluster interfaces
+            for ipint in node.cluster_interfaces:
+                interfaces.append(transport.get_record(f"/api/network/ip/interfaces/{ipint.uuid}",
+                                                       fields=fields.fields(__cmd__, "/api/network/ip/interfaces/*", args.mode)))
+    return (cluster, metrocluster, nodes, nodes_count, interfaces)
+
+def evaluate(args, data) -> Result:
+    (cluster, metrocluster, nodes, nodes_count, interfaces) = data
+    if metrocluster is None:
+        return Result(Status.UNKNOWN,f"not sure what kind of cluster this is")
+
+    check = Check()
     #
     # Cluster health check
     #
@@ -111,7 +116,7 @@ def run():
             check.add_message(Status.CRITICAL,"Cluster global status is {}".format(cluster.metric.status))
         # Cluster node states
         for node in nodes:
-            logger.debug(f"Node info \n{node.__dict__}")
+            logger.debug(f"Node info \n{node}")
             membership = getattr(node, 'membership', "not set")
             m = f"{node.name} state {node.state} membership {membership:9}; giveback: {node.ha.giveback.state}; takeover: {node.ha.takeover.state}"
             if 'up' in node.state:
@@ -127,16 +132,8 @@ def run():
     #
     count = 0
     if args.mode == "connect" and not metrocluster:
-        interfaces = []
-        for node in nodes:
-            # fetch cluster interfaces
-            for ipint in node.cluster_interfaces:
-                Interface = IpInterface(uuid=ipint.uuid)
-                Interface.get()
-                interfaces.append(Interface)
-                
         for IpInt in interfaces:
-            logger.debug(f"Interface info {IpInt.name}\n{IpInt.__dict__}")
+            logger.debug(f"Interface info {IpInt.name}\n{IpInt}")
             if (args.exclude or args.include) and item_filter(args,IpInt.name):
                 logger.debug(f"ex-/include interface {IpInt.name}")
                 continue
@@ -152,8 +149,24 @@ def run():
         check.add_message(Status.OK, f"mode connect' isn't supported for Metrocluster")
         short = f"mode not supported by this version"
 
-    (code, message) = check.check_messages(separator="\n")
-    check.exit(code=code,message=f"{short}\n{message}")
+    return Result.of(check, separator="\n", short=short)
+
+def run():
+    args = parse_args()
+    # Setup module logging
+    logger.disabled=True
+    if args.verbose:
+        for log_name, log_obj in logging.Logger.manager.loggerDict.items():
+            log_obj.disabled = False
+            logging.getLogger(log_name).setLevel(severity(args.verbose))
+
+    setup_connection(args.host, args.api_user, args.api_pass, args.port, args)
+
+    try:
+        result = evaluate(args, fetch(args))
+    except NetAppRestError as error:
+        result = Result(Status.UNKNOWN, "Error => {}".format(error))
+    result.exit()
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    run()
@@ -17,13 +17,20 @@
 
 import logging
 from monplugin import Check,Status
-from netapp_ontap.resources import Disk,Software
+from netapp_ontap.resources import Software
 from netapp_ontap.error import NetAppRestError
-from ..tools import cli
+from ..tools import cli, fields, pushdown, transport
 from ..tools.helper import setup_connection,item_filter,severity,compareVersion
+from ..tools.result import Result
 import re
 
 __cmd__ = "disk-health"
+logger = logging.getLogger(__name__)
+# disks --summary counts and fetches, one query per field as ONTAP ands the fields of a query
+SUMMARY_FILTERS = (
+    {"container_type": "broken|unassigned|unsupported|unknown"},
+    {"state": "broken|offline|reconstructing|zeroing"},
+)
 """
 Disk({
     'rpm': 7200,
@@ -64,10 +71,12 @@ Disk({
     'pool': 'pool0'})
 """
 
-def run():
+def parse_args(argv=None):
     parser = cli.Parser()
     parser.add_optional_arguments(cli.Argument.EXCLUDE,
-                                  cli.Argument.INCLUDE)
+                                  cli.Argument.INCLUDE,
+                                  cli.Argument.PAGE_SIZE,
+                                  cli.Argument.SUMMARY)
     parser.add_optional_arguments( {
         'name_or_flags': ['--mode'],
         'options': {
@@ -80,50 +89,85 @@ def run():
             'help': 'which diskhealth mode to check',
         }
     })
-    args = parser.get_args()
+    args = parser.get_args(argv)
+    if args.summary and args.mode == "multipath":
+        parser.error("--summary counts disk states, it isn't supported by --mode multipath")
+    if args.summary and (args.include or args.exclude) and "name" not in pushdown.query(args):
+        parser.error("--summary counts on the cluster, it needs an --include/--exclude ONTAP can filter")
+    return args
+
+def fetch_summary(args):
+    """ (None, disk count, disks in a problem state), the disks are only fetched if there are any """
+    names = pushdown.query(args)
+    disk_count = transport.count_collection("/api/storage/disks", **names)
+    disks = {}
+    for query in SUMMARY_FILTERS:
+        query = {**names, **query}
+        problem_count = transport.count_collection("/api/storage/disks", **query)
+        logger.info(f"{problem_count} of {disk_count} disks with {query}")
+        if problem_count == 0:
+            continue
+        for disk in transport.get_collection("/api/storage/disks", fields=fields.fields(__cmd__, "/api/storage/disks", args.mode),
+                                             page_size=args.page_size, **query):
+            disks[disk.name] = disk
+    return (None, disk_count, list(disks.values()))
+
+def fetch(args):
+    """ (software, disk count, disks) """
+    if args.summary:
+        return fetch_summary(args)
+    software = Software()
+    software.get(fields='version')
+    disks = list(transport.get_collection("/api/storage/disks", fields=fields.fields(__cmd__, "/api/storage/disks", args.mode),
+                                          page_size=args.page_size, **pushdown.query(args)))
+    logger.debug(f"Found {len(disks)} disks")
+    return (software, len(disks), disks)
+
+def evaluate(args, data) -> Result:
+    (software, disk_count, Disks) = data
+    if disk_count == 0:
+        logger.debug(f"found {disk_count} disks")
+        return Result(Status.UNKNOWN, "no disks found")
+
+    check = Check()
+    if args.summary and not Disks:
+        check.add_perfdata(label=f"total",value=int(disk_count))
+        return Result.of(check, allok=f"all {disk_count} disks are fine")
+    if args.mode == "multipath":
+        minimumVersion = "9.9"
+        if compareVersion(minimumVersion,software["version"]):
+            check_multipath(check,args,Disks)
+        else:
+            return Result(Status.UNKNOWN,f"at least ONTAP v{minimumVersion} is required. Currently v{software['version']}  is installed")
+    elif args.mode == "diskstate":
+        check_diskstate(check,args,disk_count,Disks)
+    else:
+        check_diskstate(check,args,disk_count,Disks)
+
+    return Result.of(check, separator='\n  ')
+
+def run():
+    args = parse_args()
     # Setup module logging
-    logger = logging.getLogger(__name__)
     logger.disabled = True
     if args.verbose:
         for log_name, log_obj in logging.Logger.manager.loggerDict.items():
             log_obj.disabled = False
             logging.getLogger(log_name).setLevel(severity(args.verbose))
 
-    check = Check()
-
-    setup_connection(args.host, args.api_user, args.api_pass, args.port)
+    setup_connection(args.host, args.api_user, args.api_pass, args.port, args)
     
     # Query API    
     try:
-        software = Software()
-        software.get(fields='version')
-        disk_count = Disk.count_collection()
-        logger.debug(f"Found {disk_count} disks")
-        if disk_count == 0:
-            logger.debug(f"found {disk_count} disks")
-            check.exit(Status.UNKNOWN, "no disks found")
-        Disks = Disk.get_collection(fields="*")
+        result = evaluate(args, fetch(args))
     except NetAppRestError as error:
-        check.exit(Status.UNKNOWN, f"ERROR => {error}")
-
-    if args.mode == "multipath":
-        minimumVersion = "9.9"
-        if compareVersion(minimumVersion,software["version"]):
-            check_multipath(check,logger,args,Disks)
-        else:
-            check.exit(Status.UNKNOWN,f"at least ONTAP v{minimumVersion} is required. Currently v{software['version']}  is installed")
-    elif args.mode == "diskstate":
-        check_diskstate(check,logger,args,Disks)
-    else:
-        check_diskstate(check,logger,args,Disks)
-
-    (code,message) = check.check_messages(separator='\n  ')
-    check.exit(code=code,message=message)
+        result = Result(Status.UNKNOWN, f"ERROR => {error}")
+    result.exit()
 
 ##
 ## MODE MULTIPATH
 ##
-def check_multipath(check,logger,args,Disks):
+def check_multipath(check,args,Disks):
     """
     Minimum ONTAP v9.9 is required
     Disk({
@@ -154,17 +198,10 @@ def check_multipath(check,logger,args,Disks):
 ##
 ## MODE MULTIPATH
 ##
-def check_diskstate(check,logger,args,Disks):
+def check_diskstate(check,args,disk_count,Disks):
     out = {}
     cType = {}
 
-    try:
-        disk_count = Disk.count_collection()
-        #Disks = Disk.get_collection(fields="name,bay,type,container_type,state,outage,node,home_node")
-        Disks = Disk.get_collection(fields="*")
-    except NetAppRestError as error:
-        check.exit(Status.UNKNOWN, f"ERROR => {error}")
-
     for disk in Disks:
         if (args.exclude or args.include) and item_filter(args,disk.name):
             disk_count -= 1
@@ -16,13 +16,15 @@
 #    along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import logging
+from functools import partial
 from monplugin import Check,Status
-from netapp_ontap.resources import CLI,Node
 from netapp_ontap.error import NetAppRestError
-from ..tools import cli
+from ..tools import cli, fields, parallel, transport
 from ..tools.helper import setup_connection,severity,item_filter
+from ..tools.result import Result
 
 __cmd__ = "hardware-health"
+logger = logging.getLogger(__name__)
 
 """
 [-type {fan|thermal|voltage|current|battery-life|discrete|fru|nvmem|counter|minutes|percent|agent|unknown}]
@@ -30,10 +32,7 @@ curl -X GET -kv 'https://user:pass@ip/api/private/cli/system/chassis/fru?fields=
 curl -X GET -kv 'https://user:pass@ip/api/private/cli/system/health/subsystem?subsystem=environment'
 """
 
-def run():
-    """
-    List Hardware sensors
-    """
+def parse_args(argv=None):
     parser = cli.Parser()
     parser.add_optional_arguments(cli.Argument.EXCLUDE,
                                   cli.Argument.INCLUDE,
@@ -54,29 +53,41 @@ def run():
         }
     })
     
-    args = parser.get_args()
-    # Setup module logging
-    logger = logging.getLogger(__name__)
-    logger.disabled=True
-    if args.verbose:
-        for log_name, log_obj in logging.Logger.manager.loggerDict.items():
-            log_obj.disabled = False
-            logging.getLogger(log_name).setLevel(severity(args.verbose))
-
-    setup_connection(args.host, args.api_user, args.api_pass, args.port)
+    args = parser.get_args(argv)
+    if args.perfdata:
+        args.sensor_details = True
+    return args
 
-    check = Check()
+def sensor_types(args):
     """
     [-type {fan|thermal|voltage|current|battery-life|discrete|fru|nvmem|counter|minutes|percent|agent|unknown}] - Sensor Type
     [-state {normal|warn-low|warn-high|crit-low|crit-high|disabled|uninitialized|init-failed|not-available|invalid|retry|bad|not-present|failed|ignored|fault|unknown}]
     """
     if not args.type:
-        sType = ['fan','thermal','voltage','current','battery-life','discrete','fru','nvmem','counter','minutes','percent','agent']
-    else:
-        sType = args.type
-        
-    if args.perfdata:
-        args.sensor_details = True
+        return ['fan','thermal','voltage','current','battery-life','discrete','fru','nvmem','counter','minutes','percent','agent']
+    return args.type
+
+def fetch_sensors(args):
+    """ Sensors as they are read, the request is sent right away """
+    # "system node environment sensors show" of the CLI passthrough
+    return parallel.started(transport.records("/api/private/cli/system/node/environment/sensors",
+                                              fields=fields.fields(__cmd__, "/api/private/cli/system/node/environment/sensors"),
+                                              type=f"{','.join(str(x) for x in sensor_types(args))}"))
+
+def fetch(args):
+    """ (nodes, sensors as they are read or None without --sensor-details) """
+    logger.info(f"checking sensors: {sensor_types(args)}")
+    fetches = {'nodes': partial(list, transport.get_collection("/api/cluster/nodes", fields=fields.fields(__cmd__, "/api/cluster/nodes")))}
+    # Sensor environment
+    if args.sensor_details:
+        fetches['sensors'] = partial(fetch_sensors, args)
+    found = parallel.fetch_all(fetches)
+    return (found['nodes'], found.get('sensors'))
+
+def evaluate(args, data) -> Result:
+    (nodes, sensors) = data
+    sType = sensor_types(args)
+    check = Check()
 
     mapWarn = ['warn-low','warn-high','ok-with-suppressed']
     mapCrit = ['crit-low','crit-high','bad','failed','fault','degraded','unreachable']
@@ -86,98 +97,110 @@ def run():
     nvramCrit = ['battery_full_discharged','battery_not_present','battery_at_end_of_life']
     nvramUnknown = ['battery_unknown']
 
-    logger.info(f"checking sensors: {sType}")
-    try:
-        # Node info
-        nodes = Node.get_collection(fields="*")
-        for node in nodes:
-            logger.info(f"{node.name}")
-            logger.debug(f"{node}")
-            if 'thermal' in sType:
-                logger.info(f"Thermal {node.controller.over_temperature}")
-                msg = f"Temperature on {node.name} is {node.controller.over_temperature}"
-                if node.controller.over_temperature != "normal":
-                    check.add_message(Status.WARNING, msg)
-                else:
-                    check.add_message(Status.OK, msg)
-            if 'fan' in sType and hasattr(node.controller, 'failed_fan'):
-                logger.info(f"FAN {node.controller.failed_fan}")
-                msg = f"Fan on {node.name}: {node.controller.failed_fan.message.message}"
-                if node.controller.failed_fan.count > 0:
-                    check.add_message(Status.WARNING, msg)
-                else:
-                    check.add_message(Status.OK, msg)
-            if ('voltage' in sType or 'current' in sType) and hasattr(node.controller, 'failed_power_supply'):
-                logger.info(f"PSU {node.controller.failed_power_supply}")
-                msg = f"PSU on {node.name}: {node.controller.failed_power_supply.message.message}"
-                if node.controller.failed_power_supply.count > 0:
-                    check.add_message(Status.WARNING, msg)
-                else:
-                    check.add_message(Status.OK, msg)
-            if 'battery-life' in sType and hasattr(node, 'nvram'):
-                logger.info(f"NVRAM {node.nvram}")
-                msg = f"NVRAM on {node.name}: '{node.nvram.battery_state}'"
-                if node.nvram.battery_state in nvramWarn:
+    for node in nodes:
+        logger.info(f"{node.name}")
+        logger.debug(f"{node}")
+        if 'thermal' in sType:
+            logger.info(f"Thermal {node.controller.over_temperature}")
+            msg = f"Temperature on {node.name} is {node.controller.over_temperature}"
+            if node.controller.over_temperature != "normal":
+                check.add_message(Status.WARNING, msg)
+            else:
+                check.add_message(Status.OK, msg)
+        if 'fan' in sType and hasattr(node.controller, 'failed_fan'):
+            logger.info(f"FAN {node.controller.failed_fan}")
+            msg = f"Fan on {node.name}: {node.controller.failed_fan.message.message}"
+            if node.controller.failed_fan.count > 0:
+                check.add_message(Status.WARNING, msg)
+            else:
+                check.add_message(Status.OK, msg)
+        if ('voltage' in sType or 'current' in sType) and hasattr(node.controller, 'failed_power_supply'):
+            logger.info(f"PSU {node.controller.failed_power_supply}")
+            msg = f"PSU on {node.name}: {node.controller.failed_power_supply.message.message}"
+            if node.controller.failed_power_supply.count > 0:
+                check.add_message(Status.WARNING, msg)
+            else:
+                check.add_message(Status.OK, msg)
+        if 'battery-life' in sType and hasattr(node, 'nvram'):
+            logger.info(f"NVRAM {node.nvram}")
+            msg = f"NVRAM on {node.name}: '{node.nvram.battery_state}'"
+            if node.nvram.battery_state in nvramWarn:
+                check.add_message(Status.WARNING, msg)
+            elif node.nvram.battery_state in nvramCrit:
+                check.add_message(Status.CRITICAL, msg)
+            elif node.nvram.battery_state in nvramUnknown:
+                check.add_message(Status.UNKNOWN, msg)
+            else:
+                check.add_message(Status.OK, msg)
+        if 'fru' in sType and hasattr(node.controller, 'frus'):
+            logger.info(f"FRUs for node {node.name}")
+            for fru in node.controller.frus:
+                msg = f"FRU {fru.id} on {node.name} is {fru.state}"
+                if fru.state in mapWarn:
                     check.add_message(Status.WARNING, msg)
-                elif node.nvram.battery_state in nvramCrit:
+                elif fru.state in mapCrit:
                     check.add_message(Status.CRITICAL, msg)
-                elif node.nvram.battery_state in nvramUnknown:
+                elif fru.state in mapUnknown:
                     check.add_message(Status.UNKNOWN, msg)
                 else:
                     check.add_message(Status.OK, msg)
-            if 'fru' in sType and hasattr(node.controller, 'frus'):
-                logger.info(f"FRUs for node {node.name}")
-                for fru in node.controller.frus:
-                    msg = f"FRU {fru.id} on {node.name} is {fru.state}"
-                    if fru.state in mapWarn:
-                        check.add_message(Status.WARNING, msg)
-                    elif fru.state in mapCrit:
-                        check.add_message(Status.CRITICAL, msg)
-                    elif fru.state in mapUnknown:
-                        check.add_message(Status.UNKNOWN, msg)
-                    else:
-                        check.add_message(Status.OK, msg)
-
-        # Sensor environment
+
+    if args.sensor_details:
+        sensorCount = 0
+        for sensor in sensors:
+            sensorCount += 1
+            logger.debug(f"{sensor}")
+            if (args.exclude or args.include) and item_filter(args,sensor['name']):
+                continue
+
+            msg = f"{sensor['type']} {sensor['name']} on node {sensor['node']} is {sensor['state']}"
+
+            if args.perfdata:
+                if 'value' in sensor and 'units' in sensor:
+                    perfData = {'label': f"{sensor['node']}_{sensor['name']}",
+                                'value': f"{sensor['value']}",
+                                'uom': f"{sensor['units'].replace('mA*hr','mAh')}"}
+                    check.add_perfdata(**perfData)
+
+            if sensor['state'] in mapCrit:
+                check.add_message(Status.CRITICAL,msg)
+            elif sensor['state'] in mapWarn:
+                check.add_message(Status.WARNING,msg)
+            elif sensor['state'] in mapUnknown:
+                check.add_message(Status.UNKNOWN,msg)
+        if sensorCount == 0:
+            return Result(Status.UNKNOWN,f"no sensors found")
+
+    result = Result.of(check, separator="\n")
+    if result.status == Status.OK:
         if args.sensor_details:
-            response = CLI().execute("system node environment sensors show",fields="fru,state,name,type,value,units,discrete-state",type=f"{','.join(str(x) for x in sType)}")
-            sensorCount = response.http_response.json()['num_records']
-            if sensorCount == 0:
-                check.exit(Status.UNKNOWN,f"no sensors found")
-            for sensor in response.http_response.json()['records']:
-                logger.debug(f"{sensor}")
-                if (args.exclude or args.include) and item_filter(args,sensor['name']):
-                    continue
-    
-                msg = f"{sensor['type']} {sensor['name']} on node {sensor['node']} is {sensor['state']}"
-    
-                if args.perfdata:
-                    if 'value' in sensor and 'units' in sensor:
-                        perfData = {'label': f"{sensor['node']}_{sensor['name']}",
-                                    'value': f"{sensor['value']}",
-                                    'uom': f"{sensor['units'].replace('mA*hr','mAh')}"}
-                        check.add_perfdata(**perfData)
-    
-                if sensor['state'] in mapCrit:
-                    check.add_message(Status.CRITICAL,msg)
-                elif sensor['state'] in mapWarn:
-                    check.add_message(Status.WARNING,msg)
-                elif sensor['state'] in mapUnknown:
-                    check.add_message(Status.UNKNOWN,msg)
-    
-        (code, message) = check.check_messages(separator="\n")
-        if code != Status.OK:
-            check.exit(code=code,message=message)
+            result.message = f"all {sensorCount} checked sensors are fine\n{result.message}"
         else:
-            if args.sensor_details:
-                check.exit(code=code,message=f"all {sensorCount} checked sensors are fine\n{message}")
-            else:
-                check.exit(code=code,message=f"all checked sensors are fine\n{message}")
+            result.message = f"all checked sensors are fine\n{result.message}"
+    return result
+
+def run():
+    """
+    List Hardware sensors
+    """
+    args = parse_args()
+    # Setup module logging
+    logger.disabled=True
+    if args.verbose:
+        for log_name, log_obj in logging.Logger.manager.loggerDict.items():
+            log_obj.disabled = False
+            logging.getLogger(log_name).setLevel(severity(args.verbose))
+
+    setup_connection(args.host, args.api_user, args.api_pass, args.port, args)
 
+    try:
+        result = evaluate(args, fetch(args))
     except NetAppRestError as error:
-        check.exit(Status.UNKNOWN, f"Error => {error}")
+        result = Result(Status.UNKNOWN, f"Error => {error}")
     except Exception as error:
         logger.exception(error)
+        return
+    result.exit()
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    run()
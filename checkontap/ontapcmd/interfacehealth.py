@@ -17,23 +17,26 @@
 
 import logging
 from monplugin import Check,Status
-from netapp_ontap.resources import IpInterface,FcInterface,Svm
 from netapp_ontap.error import NetAppRestError
-from ..tools import cli
+from ..tools import cli, fields, parallel, pushdown, transport
 from ..tools.helper import setup_connection,item_filter,severity
+from ..tools.result import Result
 import re
+from functools import partial
 
 __cmd__ = "interface-health"
 description = f"check interface status and home location"
+logger = logging.getLogger(__name__)
 
 """
 """
 
-def run():
+def parse_args(argv=None):
     parser = cli.Parser()
     parser.set_description(description)
     parser.add_optional_arguments(cli.Argument.EXCLUDE,
-                                  cli.Argument.INCLUDE)
+                                  cli.Argument.INCLUDE,
+                                  cli.Argument.PAGE_SIZE)
     parser.add_optional_arguments( {
         'name_or_flags': ['--exclude-svm'],
         'options': {
@@ -41,84 +44,62 @@ def run():
             'help': 'regexp to exclude interfaces from svm',
         }
     })
-    args = parser.get_args()
-    
-    # Setup module logging
-    logger = logging.getLogger(__name__)
-    logger.disabled = True
-    if args.verbose:
-        for log_name, log_obj in logging.Logger.manager.loggerDict.items():
-            log_obj.disabled = False
-            logging.getLogger(log_name).setLevel(severity(args.verbose))
+    return parser.get_args(argv)
 
-    check = Check()
+def fetch_svms(args):
+    return list(transport.get_collection("/api/svm/svms", fields=fields.fields(__cmd__, "/api/svm/svms")))
+
+def fetch_ip(args):
+    """ (count, ip interfaces) """
+    interfaces = list(transport.get_collection("/api/network/ip/interfaces", fields=fields.fields(__cmd__, "/api/network/ip/interfaces"),
+                                               page_size=args.page_size, **pushdown.query(args)))
+    logger.info(f"found {len(interfaces)} ip interfaces")
+    return (len(interfaces), interfaces)
 
-    setup_connection(args.host, args.api_user, args.api_pass, args.port)
+def fetch_fc(args):
+    """ (count, fc interfaces) """
+    interfaces = list(transport.get_collection("/api/network/fc/interfaces", fields=fields.fields(__cmd__, "/api/network/fc/interfaces"),
+                                               page_size=args.page_size, **pushdown.query(args)))
+    logger.info(f"found {len(interfaces)} fc interfaces")
+    return (len(interfaces), interfaces)
 
+def fetch(args):
+    """ (svms, ip interface count, ip interfaces, fc interface count, fc interfaces) """
+    found = parallel.fetch_all({
+        'svms': partial(fetch_svms, args),
+        'ip interfaces': partial(fetch_ip, args),
+        'fc interfaces': partial(fetch_fc, args),
+    })
+    return (found['svms'], *found['ip interfaces'], *found['fc interfaces'])
+
+def selected(args, Int):
+    if (args.exclude or args.include) and item_filter(args, Int.name):
+        logger.info(f"exclude interface {Int.name} due to include / exclude")
+        return False
+    if args.exclude_svm and hasattr(Int, 'svm'):
+        if re.search(args.exclude_svm, Int.svm.name):
+            logger.info(f"exclude interface {Int.name} due to SVM exclude. SVM {Int.svm.name}")
+            return False
+    logger.debug(f"INTERFACE {Int.name}\n{Int}")
+    return True
+
+def evaluate(args, data) -> Result:
+    (svms, interface_count, ip_interfaces, fcinterface_count, fc_interfaces) = data
+    check = Check()
+
+    # interfaces of stopped svm's
     SvmInt = []
-    # check for running svm's
-    try:
-        svm = Svm.get_collection(fields="name,state,ip_interfaces,fc_interfaces")
-        for s in svm:
-            if hasattr(s, 'ip_interfaces') and 'stopped' in s.state:
-                for int in s.ip_interfaces:
-                    logger.info(f"found int {int.name} on stopped svm {s.name}")
-                    SvmInt.append(int.name)
-            elif hasattr(s, 'fc_interfaces') and 'stopped' in s.state:
-                for int in s.fc_interfaces:
-                    logger.info(f"found int {int.name} on stopped svm {s.name}")
-                    SvmInt.append(int.name)
-                
-            
-    except NetAppRestError as error:
-        check.exit(Status.UNKNOWN, f"Error => {error}")
-    except Exception as error:
-        check.exit(Status.UNKNOWN, f"{error}")
-    
-    Ints = []
-    
-    try:
-        ##
-        ## IP Interfaces
-        ##
-        interface_count = IpInterface.count_collection()
-        logger.info(f"found {interface_count} ip interfaces")
-        if interface_count >= 1:
-            for IpInt in IpInterface.get_collection(fields="*"):
-                if (args.exclude or args.include) and item_filter(args,IpInt.name):
-                    logger.info(f"exclude interface {IpInt.name} due to include / exclude")
-                    continue
-                if args.exclude_svm and hasattr(IpInt, 'svm'):
-                    if re.search(args.exclude_svm, IpInt.svm.name):
-                        logger.info(f"exclude interface {IpInt.name} due to SVM exclude. SVM {IpInt.svm.name}")
-                        continue
-                logger.debug(f"INTERFACE {IpInt.name}\n{IpInt}")
-                Ints.append(IpInt)
-
-        ##
-        ## FC Interfaces
-        ##
-        
-        fcinterface_count = FcInterface.count_collection()
-        logger.info(f"found {fcinterface_count} fc interfaces")
-        if fcinterface_count >= 1:
-            for FcInt in FcInterface.get_collection(fields="*"):
-                if (args.exclude or args.include) and item_filter(args, FcInt.name):
-                    logger.info(f"exclude interface {FcInt.name} due to include / exclude")
-                    continue
-                if args.exclude_svm and hasattr(FcInt, 'svm'):
-                    if re.search(args.exclude_svm, FcInt.svm.name):
-                        logger.info(f"exclude interface {FcInt.name} due to SVM exclude. SVM {FcInt.svm.name}")
-                        continue
-                    
-                logger.debug(f"INTERFACE {FcInt.name}\n{FcInt}")
-                Ints.append(FcInt)
-
-            
-    except NetAppRestError as error:
-        check.exit(Status.UNKNOWN, f"Error => {error}")
-    except Exception as error:
-        check.exit(Status.UNKNOWN, f"{error}")
+    for s in svms:
+        if hasattr(s, 'ip_interfaces') and 'stopped' in s.state:
+            for int in s.ip_interfaces:
+                logger.info(f"found int {int.name} on stopped svm {s.name}")
+                SvmInt.append(int.name)
+        elif hasattr(s, 'fc_interfaces') and 'stopped' in s.state:
+            for int in s.fc_interfaces:
+                logger.info(f"found int {int.name} on stopped svm {s.name}")
+                SvmInt.append(int.name)
+
+    Ints = [Int for Int in ip_interfaces + fc_interfaces if selected(args, Int)]
 
     count = 0
 
@@ -135,13 +116,16 @@ def run():
             continue
         
         count += 1
-        if not Int.location.is_home:
+        # fc interfaces have no home state
+        if hasattr(Int.location, 'is_home') and not Int.location.is_home:
             check.add_message(Status.CRITICAL, f"Int {Int.name} is on {Int.location.node.name} but should be on {Int.location.home_node.name}")
 
     check.add_message(Status.OK, f"{count} up / {len(Ints) - count} down - {len(Ints)} Total ({interface_count} ip / {fcinterface_count} fc at all)")
     
+    # fc interfaces have no ip address
+    fc = set(map(id, fc_interfaces))
     for Int in Ints:
-        if hasattr(Int, 'ip'):
+        if id(Int) not in fc:
             ipaddress = Int.ip.address
             ipnetmask = Int.ip.netmask
         else:
@@ -156,8 +140,28 @@ def run():
         else:
             check.add_message(Status.OK, f"Int {Int.name:40}{Int.state:5}{ipaddress:16}/{ipnetmask:3} is homed {ishome}")
         
-    (code, message) = check.check_messages(separator='\n  ')
-    check.exit(code=code,message=message)
+    return Result.of(check, separator='\n  ')
+
+def run():
+    args = parse_args()
+    
+    # Setup module logging
+    logger.disabled = True
+    if args.verbose:
+        for log_name, log_obj in logging.Logger.manager.loggerDict.items():
+            log_obj.disabled = False
+            logging.getLogger(log_name).setLevel(severity(args.verbose))
+
+    setup_connection(args.host, args.api_user, args.api_pass, args.port, args)
+
+    try:
+        data = fetch(args)
+    except NetAppRestError as error:
+        Result(Status.UNKNOWN, f"Error => {error}").exit()
+    except Exception as error:
+        Result(Status.UNKNOWN, f"{error}").exit()
+
+    evaluate(args, data).exit()
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    run()
@@ -17,98 +17,211 @@
 
 import logging
 from monplugin import Check,Status,Threshold,Range
-from netapp_ontap.resources import Lun
 from netapp_ontap.error import NetAppRestError
-from ..tools import cli
+from ..tools import alerts, cli, fields, passive, pushdown, transport
 from ..tools.helper import setup_connection,item_filter,severity,bytes_to_uom,range_in_bytes
+from ..tools.result import Result
 
 __cmd__ = "lun-usage"
 description = f"Mode {__cmd__} with -m / --metric usage (%) or size desciption like used_GB"
+logger = logging.getLogger(__name__)
+# field of the metric of -m --alerts-only and --top query, luns have no percent used or available space
+METRIC_FIELDS = {'used': 'space.used'}
+# how full a lun is by the metric of -m, --top sorts by it on the client if the metric has no field
+FULLNESS = {
+    'usage': lambda lun: lun.space.used / lun.space.size if lun.space.size else 0,
+    'free': lambda lun: lun.space.used - lun.space.size,
+}
 
 """
 """
-def run():
-    """
-    Wenn alles passt steht hier die Hilfe
-    """
+def check_lun(check, args, lun):
+    """ Add messages and perfdata of lun to check """
+    value = {
+        'usage': bytes_to_uom(lun.space.used, '%', lun.space.size),
+        'used': lun.space.used,
+        'free': lun.space.size - lun.space.used,
+        'max': lun.space.size
+    }
+   
+    for metric in ['usage', 'used', 'free']:
+        opts = {}
+        puom = '%' if metric == 'usage' else 'B'
+        if metric in args.metric:
+            typ, uom, *_ = (args.metric.split('_') + ['%' if 'usage' in args.metric else 'B'])
+            threshold = {}
+            opts['threshold'] = {}
+            if '%' in uom:
+                s = check.threshold.get_status(value['usage'])
+                out = f"{value[typ] :.2f}%"
+                if args.warning:
+                    threshold['warning'] = args.warning
+                if args.critical:
+                    threshold['critical'] = args.critical
+            else:
+                s = check.threshold.get_status(bytes_to_uom(value[typ],uom))
+                if 'free' in typ:
+                    pct = 100 - value['usage']
+                else:
+                    pct = value['usage']
+
+                out = f"{bytes_to_uom(value[metric],uom)}{uom} ({pct :.2f} %) "
+                if args.warning:
+                    threshold['warning'] = range_in_bytes(Range(args.warning),uom)
+                if args.critical:
+                    threshold['critical'] = range_in_bytes(Range(args.critical),uom)
+            opts['threshold'] = Threshold(**threshold)
+            if s != Status.OK:
+                check.add_message(s, f"{args.metric} on {lun.name} is: {out}")
+                
+            check.add_perfdata(label=f"{lun.name} {metric}", value=value[metric], uom=puom, **opts)
+        else:
+            check.add_perfdata(label=f"{lun.name} {metric}", value=value[metric], uom=puom)
+    check.add_perfdata(label=f"{lun.name} total", value=value['max'], uom=puom)
+
+def parse_args(argv=None):
     parser = cli.Parser()
     parser.set_description(description)
     parser.add_required_arguments(cli.Argument.WARNING,cli.Argument.CRITICAL)
     parser.add_optional_arguments(cli.Argument.EXCLUDE,
                                   cli.Argument.INCLUDE,
-                                  cli.Argument.METRIC)
-    args = parser.get_args()
+                                  cli.Argument.METRIC,
+                                  cli.Argument.ALERTS_ONLY,
+                                  cli.Argument.TOP,
+                                  cli.Argument.PASSIVE_SPOOL, cli.Argument.PASSIVE_PIPE,
+                                  cli.Argument.PASSIVE_HOST, cli.Argument.SERVICE_TEMPLATE)
+    args = parser.get_args(argv)
+    if args.alerts_only and passive.enabled(args):
+        parser.error("--alerts-only would leave the passive results of the fine luns stale")
+    if args.top is not None and args.top < 1:
+        parser.error("--top needs at least one lun")
+    if args.top and passive.enabled(args):
+        parser.error("--top would leave the passive results of the other luns stale")
+    if args.top and (args.include or args.exclude) and "name" not in pushdown.query(args):
+        # the total is counted by the cluster, it would count the luns dropped on the client
+        parser.error("--top needs an --include / --exclude ONTAP can filter (literal names, .* and |)")
+    return args
+
+def read(args, query):
+    """ luns of query, with --top the fullest first """
+    order = pushdown.order_by(args, METRIC_FIELDS) if args.top else None
+    if order:
+        # select() stops after --top luns, the next page is only requested if the filter drops some
+        return transport.get_collection("/api/storage/luns", fields=fields.fields(__cmd__, "/api/storage/luns"),
+                                        order_by=order, max_records=args.top, **query)
+    luns = list(transport.get_collection("/api/storage/luns", fields=fields.fields(__cmd__, "/api/storage/luns"),
+                                         **query))
+    if args.top:
+        luns.sort(key=FULLNESS[args.metric.split('_')[0]], reverse=True)
+    return luns
+
+def fetch_alerts(args):
+    """ (count of all luns, luns -w / -c may alert on) """
+    query = pushdown.query(args)
+    unsupported = None
+    if (args.include or args.exclude) and "name" not in query:
+        unsupported = "the luns --include / --exclude drop on the client have to be read to be counted"
+    luns = read(args, {**query, **alerts.query(args, METRIC_FIELDS, unsupported)})
+    # without a range the luns were all read and are counted already
+    return (transport.count_collection("/api/storage/luns", **query), luns)
+
+def fetch(args):
+    """ (count of all luns, luns with space info) """
+    if args.alerts_only:
+        return fetch_alerts(args)
+    query = pushdown.query(args)
+    luns = read(args, query)
+    if args.top:
+        # the count of the luns not read
+        return (transport.count_collection("/api/storage/luns", **query), luns)
+    # one collection query instead of a GET per lun, it tells the count too
+    return (len(luns), luns)
+
+def select(args, data):
+    """ (count, luns) left after the item filter """
+    (luns_count, luns) = data
+    selected = []
+    for lun in luns:
+        if args.top and len(selected) == args.top:
+            break
+        if (args.exclude or args.include) and item_filter(args,lun.name):
+            logger.info(f"LUN {lun.name} filtered out and removed from check")
+            luns_count -= 1
+            continue
+        logger.debug(f"lun info for {lun.name}\n{lun}")
+        selected.append(lun)
+    return (luns_count, selected)
+
+def new_check(args):
+    return Check(threshold = Threshold(args.warning or None, args.critical or None))
+
+def summary(args, check, luns_count, checked, alerting=None) -> dict:
+    """ allok or short of the Result, with --top they tell how many luns were checked """
+    luns = f"the {checked} fullest of {luns_count} luns by {args.metric}" if args.top else f"{luns_count} luns"
+    if check.check_messages()[0] == Status.OK:
+        return {"allok": f"{luns} are fine" if args.top else f"all {luns} are fine"}
+    if alerting is not None:
+        return {"short": f"{alerting} of {luns} alert"}
+    return {"short": luns if args.top else None}
+
+def evaluate_alerts(args, data) -> Result:
+    """ Only the luns -w / -c alert on, the others are counted by the cluster """
+    (luns_count, luns) = select(args, data)
+    if luns_count == 0:
+        return Result(Status.UNKNOWN, "no luns found")
+    check = new_check(args)
+    alerting = 0
+    for lun in luns:
+        c = new_check(args)
+        check_lun(c, args, lun)
+        alerting += alerts.alerting(check, c)
+    return Result.of(check, **summary(args, check, luns_count, len(luns), alerting))
+
+def evaluate(args, data) -> Result:
+    if args.alerts_only:
+        return evaluate_alerts(args, data)
+    if data[0] == 0:
+        return Result(Status.UNKNOWN, "no luns found")
+    (luns_count, luns) = select(args, data)
+    check = new_check(args)
+    for lun in luns:
+        check_lun(check, args, lun)
+    return Result.of(check, **summary(args, check, luns_count, len(luns)))
+
+def evaluate_passive(args, data) -> Result:
+    """ Submit one passive result per lun, the Result tells how many """
+    if data[0] == 0:
+        return Result(Status.UNKNOWN, "no luns found")
+    (luns_count, luns) = select(args, data)
+    results = passive.PassiveResults(args, __cmd__)
+    for lun in luns:
+        c = new_check(args)
+        check_lun(c, args, lun)
+        results.add(c, lun.name, svm=lun.svm.name if hasattr(lun, 'svm') else '', lun=lun.name)
+    return results.submit_result()
+
+def run():
+    """
+    Wenn alles passt steht hier die Hilfe
+    """
+    args = parse_args()
     # Setup module logging
-    logger = logging.getLogger(__name__)
     logger.disabled = True
     if args.verbose:
         for log_name, log_obj in logging.Logger.manager.loggerDict.items():
             log_obj.disabled = False
             logging.getLogger(log_name).setLevel(severity(args.verbose))
 
-    check = Check(threshold = Threshold(args.warning or None, args.critical or None))
-    setup_connection(args.host, args.api_user, args.api_pass, args.port)
+    setup_connection(args.host, args.api_user, args.api_pass, args.port, args)
 
     try:
-        luns_count = Lun.count_collection()
-        if luns_count == 0:
-            check.exit(Status.UNKNOWN, "no luns found")
-        for lun in Lun.get_collection():
-            lun.get(fields="space")
-            if (args.exclude or args.include) and item_filter(args,lun.name):
-                logger.info(f"LUN {lun.name} filtered out and removed from check")
-                luns_count -= 1
-                continue
-            logger.debug(f"lun info for {lun.name}\n{lun.__dict__}")
-
-            value = {
-                'usage': bytes_to_uom(lun.space.used, '%', lun.space.size),
-                'used': lun.space.used,
-                'free': lun.space.size - lun.space.used,
-                'max': lun.space.size
-            }
-           
-            for metric in ['usage', 'used', 'free']:
-                opts = {}
-                puom = '%' if metric == 'usage' else 'B'
-                if metric in args.metric:
-                    typ, uom, *_ = (args.metric.split('_') + ['%' if 'usage' in args.metric else 'B'])
-                    threshold = {}
-                    opts['threshold'] = {}
-                    if '%' in uom:
-                        s = check.threshold.get_status(value['usage'])
-                        out = f"{value[typ] :.2f}%"
-                        if args.warning:
-                            threshold['warning'] = args.warning
-                        if args.critical:
-                            threshold['critical'] = args.critical
-                    else:
-                        s = check.threshold.get_status(bytes_to_uom(value[typ],uom))
-                        if 'free' in typ:
-                            pct = 100 - value['usage']
-                        else:
-                            pct = value['usage']
-
-                        out = f"{bytes_to_uom(value[metric],uom)}{uom} ({pct :.2f} %) "
-                        if args.warning:
-                            threshold['warning'] = range_in_bytes(Range(args.warning),uom)
-                        if args.critical:
-                            threshold['critical'] = range_in_bytes(Range(args.critical),uom)
-                    opts['threshold'] = Threshold(**threshold)
-                    if s != Status.OK:
-                        check.add_message(s, f"{args.metric} on {lun.name} is: {out}")
-                        
-                    check.add_perfdata(label=f"{lun.name} {metric}", value=value[metric], uom=puom, **opts)
-                else:
-                    check.add_perfdata(label=f"{lun.name} {metric}", value=value[metric], uom=puom)
-            check.add_perfdata(label=f"{lun.name} total", value=value['max'], uom=puom)
-        (code, message) = check.check_messages(separator='\n',allok=f"all {luns_count} luns are fine")
-        check.exit(code=code,message=message)
-
+        result = (evaluate_passive if passive.enabled(args) else evaluate)(args, fetch(args))
     except NetAppRestError as error:
-        check.exit(Status.UNKNOWN, "Error => {}".format(error))
+        result = Result(Status.UNKNOWN, "Error => {}".format(error))
     except Exception as error:
         logger.exception(error)
+        return
+    result.exit()
     
 if __name__ == "__main__":
     run()
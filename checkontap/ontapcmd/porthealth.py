@@ -17,14 +17,16 @@
 
 
 import logging
+from functools import partial
 from monplugin import Check, Status
-from netapp_ontap.resources import Port, FcPort
 from netapp_ontap.error import NetAppRestError
-from ..tools import cli
+from ..tools import cli, fields, parallel, pushdown, transport
 from ..tools.helper import setup_connection, item_filter, severity
+from ..tools.result import Result
 
 __cmd__ = "port-health"
 description = "check port status"
+logger = logging.getLogger(__name__)
 
 """
 Check Port and FcPort endpoints. Disabled interfaces are ignored.
@@ -36,7 +38,43 @@ def is_enabled(port):
 def is_filtered(args, name):
     return (args.exclude or args.include) and item_filter(args, name)
 
-def fibrechannel(check, logger, args):
+def fetch_fcports(args):
+    """ (count, fc ports) """
+    fcports = list(transport.get_collection("/api/network/fc/ports", fields=fields.fields(__cmd__, "/api/network/fc/ports"),
+                                            page_size=args.page_size, **pushdown.query(args)))
+    return (len(fcports), fcports)
+
+def fetch_ports(args):
+    """ (count, ports) """
+    ports = list(transport.get_collection("/api/network/ethernet/ports", fields=fields.fields(__cmd__, "/api/network/ethernet/ports"),
+                                          page_size=args.page_size, **pushdown.query(args)))
+    return (len(ports), ports)
+
+def fetch_kind(fetcher, args):
+    """ Result of fetcher, the error instead if it failed """
+    try:
+        return fetcher(args)
+    except NetAppRestError as error:
+        logger.error(f"NetApp REST Error: {error}")
+        return error
+    except Exception as error:
+        logger.exception(error)
+        return error
+
+def fetch(args):
+    """ {'fc': (count, fc ports), 'ports': (count, ports)}, the error instead if a fetch failed """
+    return parallel.fetch_all({
+        'fc': partial(fetch_kind, fetch_fcports, args),
+        'ports': partial(fetch_kind, fetch_ports, args),
+    })
+
+def fetch_error(check, error, what):
+    if isinstance(error, NetAppRestError):
+        check.add_message(Status.UNKNOWN, f"Error retrieving {what}: {error}")
+    else:
+        check.add_message(Status.UNKNOWN, f"Unexpected error: {error}")
+
+def fibrechannel(check, args, fcports):
     """
     The operational state of the FC port. - startup - The port is booting up. - link_not_connected - The port has finished initialization, but a link with the fabric is not established. - online - The port is initialized and a link with the fabric has been established. - link_disconnected - The link was present at one point on this port but is currently not established. - offlined_by_user - The port is administratively disabled. - offlined_by_system - The port is set to offline by the system. This happens when the port encounters too many errors. - node_offline - The state information for the port cannot be retrieved. The node is offline or inaccessible.
 
@@ -58,20 +96,13 @@ def fibrechannel(check, logger, args):
     FcPortUnknown = ['unknown']
     disabled = 0
 
-    try:
-        fcport_count = FcPort.count_collection()
-        if fcport_count == 0:
-            logger.info("no fc-ports found")
-            check.add_message(Status.OK, "no fc-ports found on device")
-            return 0, 0
-        FcPorts = FcPort.fast_get_collection(fields="*")
-    except NetAppRestError as error:
-        logger.error(f"NetApp REST Error: {error}")
-        check.add_message(Status.UNKNOWN, f"Error retrieving FC ports: {error}")
+    if isinstance(fcports, Exception):
+        fetch_error(check, fcports, "FC ports")
         return 0, 0
-    except Exception as error:
-        logger.exception(error)
-        check.add_message(Status.UNKNOWN, f"Unexpected error: {error}")
+    (fcport_count, FcPorts) = fcports
+    if fcport_count == 0:
+        logger.info("no fc-ports found")
+        check.add_message(Status.OK, "no fc-ports found on device")
         return 0, 0
 
     for fc in FcPorts:
@@ -106,21 +137,14 @@ def fibrechannel(check, logger, args):
 
     return fcport_count, disabled
 
-def physports(check, logger, args):
+def physports(check, args, ports):
     disabled = 0
-    try:
-        port_count = Port.count_collection()
-        if port_count == 0:
-            check.add_message(Status.OK, "no ports found on device")
-            return 0, 0
-        Ports = Port.get_collection(fields="*")
-    except NetAppRestError as error:
-        logger.error(f"NetApp REST Error: {error}")
-        check.add_message(Status.UNKNOWN, f"Error retrieving ports: {error}")
+    if isinstance(ports, Exception):
+        fetch_error(check, ports, "ports")
         return 0, 0
-    except Exception as error:
-        logger.exception(error)
-        check.add_message(Status.UNKNOWN, f"Unexpected error: {error}")
+    (port_count, Ports) = ports
+    if port_count == 0:
+        check.add_message(Status.OK, "no ports found on device")
         return 0, 0
 
     for p in Ports:
@@ -154,32 +178,36 @@ def physports(check, logger, args):
 
     return port_count, disabled
 
-def run():
+def parse_args(argv=None):
     parser = cli.Parser()
     parser.set_description(description)
-    parser.add_optional_arguments(cli.Argument.EXCLUDE, cli.Argument.INCLUDE)
-    args = parser.get_args()
-
-    logger = logging.getLogger(__name__)
-    logger.disabled = True
-    if args.verbose:
-        for log_name, log_obj in logging.Logger.manager.loggerDict.items():
-            log_obj.disabled = False
-            logging.getLogger(log_name).setLevel(severity(args.verbose))
+    parser.add_optional_arguments(cli.Argument.EXCLUDE, cli.Argument.INCLUDE, cli.Argument.PAGE_SIZE)
+    return parser.get_args(argv)
 
+def evaluate(args, data) -> Result:
     check = Check()
 
-    setup_connection(args.host, args.api_user, args.api_pass, args.port)
-    
-    fctotal, fcdisable = fibrechannel(check, logger, args)
-    phytotal, phydisabled = physports(check, logger, args)
+    fctotal, fcdisable = fibrechannel(check, args, data['fc'])
+    phytotal, phydisabled = physports(check, args, data['ports'])
 
     port_count = fctotal + phytotal
     all_disabled = fcdisable + phydisabled
 
     short = f"checked {port_count} Ports; ({port_count - all_disabled} enabled, {all_disabled} disabled)"
-    code, message = check.check_messages(separator='\n')
-    check.exit(code=code, message=f"{short}\n{message}")
+    return Result.of(check, short=short)
+
+def run():
+    args = parse_args()
+
+    logger.disabled = True
+    if args.verbose:
+        for log_name, log_obj in logging.Logger.manager.loggerDict.items():
+            log_obj.disabled = False
+            logging.getLogger(log_name).setLevel(severity(args.verbose))
+
+    setup_connection(args.host, args.api_user, args.api_pass, args.port, args)
+    
+    evaluate(args, fetch(args)).exit()
 
 if __name__ == "__main__":
     run()
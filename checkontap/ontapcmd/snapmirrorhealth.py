@@ -19,12 +19,16 @@ import logging
 import re
 import datetime
 from monplugin import Check,Status,Threshold
-from netapp_ontap.resources import Software,SnapmirrorRelationship
+from netapp_ontap.resources import Software
 from netapp_ontap.error import NetAppRestError
-from ..tools import cli
+from ..tools import cli, fields, transport
 from ..tools.helper import setup_connection,severity
+from ..tools.result import Result
 
 __cmd__ = "snapmirror-health"
+logger = logging.getLogger(__name__)
+# relationships --summary counts and fetches
+SUMMARY_FILTER = {"healthy": "false"}
 """
 Valid state choices:
 
@@ -43,88 +47,127 @@ def TimeParser(netapptimeperiod):
         t += int(i[0]) * {"S": 1, "M": 60, "H": 60*60, "D": 60*60*24}[i[1]]
     return t
 
-def run():
+def parse_args(argv=None):
     parser = cli.Parser()
     parser.add_optional_arguments(cli.Argument.WARNING,
                                   cli.Argument.CRITICAL,
                                   cli.Argument.EXCLUDE,
-                                  cli.Argument.INCLUDE)
-    args = parser.get_args()
+                                  cli.Argument.INCLUDE,
+                                  cli.Argument.SUMMARY)
+    args = parser.get_args(argv)
+    if args.summary and (args.warning or args.critical):
+        parser.error("--summary only counts unhealthy relationships, the lag time thresholds -w/-c need all of them")
+    return args
+
+def fetch_summary(args):
+    """ (count of all relationships, unhealthy relationships), these are only fetched if there are any """
+    relationships_count = transport.count_collection("/api/snapmirror/relationships")
+    problem_count = transport.count_collection("/api/snapmirror/relationships", **SUMMARY_FILTER)
+    logger.info(f"{problem_count} of {relationships_count} relationships are unhealthy")
+    if problem_count == 0:
+        return (relationships_count, [])
+    return (relationships_count, list(transport.get_collection("/api/snapmirror/relationships",
+                                                               fields=fields.fields(__cmd__, "/api/snapmirror/relationships"),
+                                                               **SUMMARY_FILTER)))
+
+def fetch(args):
+    """ (software, relationships) """
+    if args.summary:
+        return fetch_summary(args)
+    software = Software()
+    software.get(fields='version')
+    return (software, list(transport.get_collection("/api/snapmirror/relationships",
+                                                    fields=fields.fields(__cmd__, "/api/snapmirror/relationships"))))
+
+def evaluate_summary(args, data) -> Result:
+    (relationships_count, relationships) = data
+    if not relationships:
+        return Result(Status.OK, f"No problems found ( {relationships_count} checked )")
+    return check_relationships(args, relationships)
+
+def evaluate(args, data) -> Result:
+    if args.summary:
+        return evaluate_summary(args, data)
+    (software, relationships) = data
+    return check_relationships(args, relationships)
+
+def check_relationships(args, relationships) -> Result:
+    check = Check()
+
+    relCount = 0
+    relProblemCount = 0
+    lagThreshold = Threshold(args.warning or None, args.critical or None)
+    unInit =  []
+    for rel in relationships:
+        relCount += 1
+        if not hasattr(rel, 'state') or not hasattr(rel, 'healthy'):
+            logger.info(f"couldn't found state or health flag")
+        if hasattr(rel, 'lag_time'):
+            lagTime = TimeParser(rel.lag_time)
+        else: 
+            lagTime = 0
+        HRTime = str(datetime.timedelta(seconds=lagTime))
+       
+        if hasattr(rel, 'state') :
+            state = rel.state
+        else:
+            state = "unknown"
+        if hasattr(rel, 'healthy'):
+            healthy = rel.healthy
+        else:
+            healthy = False
+            
+        msg = f"Relationship {state} for {rel.source.path}"
+        logger.info(f"Health: {healthy} state: {state} lag: {HRTime} {rel.source.path}")
+       
+        # check lag_time  
+        lagCheck = lagThreshold.get_status(lagTime) 
+        check.add_message(lagCheck, f"lag time for {rel.source.path} is {HRTime}")
+        if lagCheck != Status.OK:
+            relProblemCount +=1
+       
+        # check health status 
+        if healthy:
+            continue
+        elif not healthy and hasattr(rel, 'unhealthy_reason'):
+            relProblemCount += 1
+            for msg in rel.unhealthy_reason:
+                check.add_message(Status.CRITICAL,f"{msg['message']}")
+        elif not healthy and 'unknown' in state:
+            continue
+        elif not healthy:
+            relProblemCount += 1
+            check.add_message(Status.CRITICAL,msg)
+        elif 'uninitialized' in state:
+            unInit.apped(msg)
+            
+
+    result = Result.of(check, separator='\n  ')
+    if result.status != Status.OK:
+        result.message = f"{relProblemCount} Problems found\n  {result.message}"
+    elif len(unInit) >= 1:
+        msg = "\n".join(unInit)
+        result.message = f"No problems found ( {relCount} checked ) but {len(unInit)} are uninitialized \n{msg}"
+    else:
+        result.message = f"No problems found ( {relCount} checked )"
+    return result
+
+def run():
+    args = parse_args()
     # Setup module logging
-    logger = logging.getLogger(__name__)
     logger.disabled = True
     if args.verbose:
         for log_name, log_obj in logging.Logger.manager.loggerDict.items():
             log_obj.disabled = False
             logging.getLogger(log_name).setLevel(severity(args.verbose))
 
-    check = Check()
-
-    setup_connection(args.host, args.api_user, args.api_pass, args.port)
+    setup_connection(args.host, args.api_user, args.api_pass, args.port, args)
 
     try:
-        software = Software()
-        software.get(fields='version')
-        relationship = SnapmirrorRelationship()
-        relship = relationship.get_collection(fields="*")
-        relCount = 0
-        relProblemCount = 0
-        lagThreshold = Threshold(args.warning or None, args.critical or None)
-        unInit =  []
-        for rel in relship:
-            relCount += 1
-            if not hasattr(rel, 'state') or not hasattr(rel, 'healthy'):
-                logger.info(f"couldn't found state or health flag")
-            if hasattr(rel, 'lag_time'):
-                lagTime = TimeParser(rel.lag_time)
-            else: 
-                lagTime = 0
-            HRTime = str(datetime.timedelta(seconds=lagTime))
-           
-            if hasattr(rel, 'state') :
-                state = rel.state
-            else:
-                state = "unknown"
-            if hasattr(rel, 'healthy'):
-                healthy = rel.healthy
-            else:
-                healthy = False
-                
-            msg = f"Relationship {state} for {rel.source.path}"
-            logger.info(f"Health: {healthy} state: {state} lag: {HRTime} {rel.source.path}")
-           
-            # check lag_time  
-            lagCheck = lagThreshold.get_status(lagTime) 
-            check.add_message(lagCheck, f"lag time for {rel.source.path} is {HRTime}")
-            if lagCheck != Status.OK:
-                relProblemCount +=1
-           
-            # check health status 
-            if healthy:
-                continue
-            elif not healthy and hasattr(rel, 'unhealthy_reason'):
-                relProblemCount += 1
-                for msg in rel.unhealthy_reason:
-                    check.add_message(Status.CRITICAL,f"{msg['message']}")
-            elif not healthy and 'unknown' in state:
-                continue
-            elif not healthy:
-                relProblemCount += 1
-                check.add_message(Status.CRITICAL,msg)
-            elif 'uninitialized' in state:
-                unInit.apped(msg)
-                
+        result = evaluate(args, fetch(args))
     except NetAppRestError as error:
-        check.exit(Status.UNKNOWN, f"ERROR => {error}")
-
-    (code,message) = check.check_messages(separator='\n  ')
-    if code != Status.OK:
-        check.exit(code=code,message=f"{relProblemCount} Problems found\n  {message}")
-    elif len(unInit) >= 1:
-        msg = "\n".join(unInit)
-        check.exit(code=code,message=f"No problems found ( {relCount} checked ) but {len(unInit)} are uninitialized \n{msg}")
-    else:
-        check.exit(code=code,message=f"No problems found ( {relCount} checked )")
+        result = Result(Status.UNKNOWN, f"ERROR => {error}")
+    result.exit()
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    run()
@@ -18,16 +18,20 @@
 
 import logging
 from monplugin import Check,Status,Threshold
-from netapp_ontap.resources import Snapshot,Volume,Software
+from netapp_ontap.resources import Software
 from netapp_ontap.error import NetAppRestError
-from ..tools import cli
+from ..tools import cli, fields, parallel, pushdown, transport
 from ..tools.helper import setup_connection,severity,to_seconds,item_filter,compareVersion
+from ..tools.result import Result
 from datetime import datetime,timedelta
+from functools import partial
 
 __cmd__ = "snapshot-health"
 description = f"{__cmd__} need just age settings and show up outdated snapshots. Warning and critical can be in plain sec or with timee identifiert (1d, 1.5h, 2w)"
+MINIMUM_VERSION = "9.10.1"
+logger = logging.getLogger(__name__)
 
-def run():
+def parse_args(argv=None):
     parser = cli.Parser()
     parser.set_epilog("Connect to ONTAP API and check snapshot age")
     parser.set_description(description)
@@ -50,17 +54,46 @@ def run():
             'help': 'include / exclude volume- or snapshotnames',
         }
     })
-    args = parser.get_args()
+    return parser.get_args(argv)
 
-    # Setup module logging
-    logger = logging.getLogger(__name__)
-    logger.disabled=True
-    if args.verbose:
-        for log_name, log_obj in logging.Logger.manager.loggerDict.items():
-            log_obj.disabled = False
-            logging.getLogger(log_name).setLevel(severity(args.verbose))
+def volume_filtered(args, v):
+    return (args.exclude or args.include) and args.mode == "volume" and item_filter(args,v.name)
 
-    setup_connection(args.host, args.api_user, args.api_pass, args.port)
+def fetch_software():
+    software = Software()
+    software.get(fields='version')
+    return software
+
+def fetch_volumes(args):
+    """ Volumes, the error instead if it failed, older versions don't know snapshot_count """
+    query = pushdown.query(args) if args.mode == "volume" else {}
+    try:
+        return list(transport.get_collection("/api/storage/volumes", fields=fields.fields(__cmd__, "/api/storage/volumes"), **query))
+    except NetAppRestError as error:
+        return error
+
+def fetch_snapshots(uuid, query):
+    return list(transport.get_collection(f"/api/storage/volumes/{uuid}/snapshots",
+                                     fields=fields.fields(__cmd__, "/api/storage/volumes/*/snapshots"), **query))
+
+def fetch(args):
+    """ (software, volumes, {volume uuid: snapshots}) """
+    logger.debug(f"Start")
+    found = parallel.fetch_all({'software': fetch_software, 'volumes': partial(fetch_volumes, args)})
+    (software, Volumes) = (found['software'], found['volumes'])
+    if not compareVersion(MINIMUM_VERSION,software["version"]):
+        return (software, [], {})
+    if isinstance(Volumes, NetAppRestError):
+        raise Volumes
+    query = pushdown.query(args) if args.mode == "snapshot" else {}
+    Snapshots = {v.uuid: fetch_snapshots(v.uuid, query) for v in Volumes
+                 if not volume_filtered(args, v) and getattr(v, 'snapshot_count', 0)}
+    return (software, Volumes, Snapshots)
+
+def evaluate(args, data) -> Result:
+    (software, Volumes, Snapshots) = data
+    if not compareVersion(MINIMUM_VERSION,software["version"]):
+        return Result(Status.UNKNOWN, f"at least ONTAP v{MINIMUM_VERSION} is required. Currently v{software['version']} is installed")
 
     check = Check()
 
@@ -68,59 +101,46 @@ def run():
     time_err = 0
     vol_with_snap = 0
 
-    # snapshots module
-    try:
-        logger.debug(f"Start")
-        software = Software()
-        software.get(fields='version')
-        minimumVersion = "9.10.1"
-        if not compareVersion(minimumVersion,software["version"]):
-            check.exit(Status.UNKNOWN, f"at least ONTAP v{minimumVersion} is required. Currently v{software['version']} is installed")
-        Volumes = list(Volume.fast_get_collection(fields="snapshot_count"))
-        # capture infos
-        Snaps = []
-        for v in Volumes:
-            if (args.exclude or args.include) and args.mode == "volume" and item_filter(args,v.name):
-                logger.info(f"But item filter exclude: '{args.exclude}' or include: '{args.include}' has matched {v.name}")
-                continue
-            if not hasattr(v, 'snapshot_count'):
-                logger.debug(f"{v.name} has no snapshots")
-                continue
-            vol = {}
-            vol['vname'] = v.name
-            vol['count'] = v.snapshot_count
-            vol['sname'] = None
-            vol['oldest'] = None
-            vol['seconds'] = 0
-
-            if v.snapshot_count == 0:
-                logger.debug(f"no snapshots found for {v.name}")
-                Snaps.append(vol)
-                continue
-            else:
-                Snapshots = list(Snapshot.fast_get_collection(f"{v.uuid}",fields="name,create_time"))
-                logger.info(f"{v.name} has {v.snapshot_count} snapshots")
-                Ages = []
-                for s in Snapshots:
-                    if (args.exclude or args.include) and args.mode == "snapshot" and item_filter(args,s.name):
-                        continue
-                    Ages.append((s.name,datetime.fromisoformat(s.create_time).timestamp()))
-
-            if len(Ages) == 0:
-                continue
-            else:
-                vol_with_snap += 1
-
-            Ages = sorted(Ages, key=lambda tup: tup[1])
-            logger.info(f"oldest snapshot => from {Ages[0][1]} name {Ages[0][0]} ")
-            vol['sname'] = Ages[0][0]
-            vol['rawdate'] = Ages[0][1]
-            vol['date'] = timedelta(seconds = datetime.now().timestamp() - Ages[0][1])
-            vol['seconds'] = timedelta(seconds = datetime.now().timestamp() - Ages[0][1]).total_seconds()
+    # capture infos
+    Snaps = []
+    for v in Volumes:
+        if volume_filtered(args, v):
+            logger.info(f"But item filter exclude: '{args.exclude}' or include: '{args.include}' has matched {v.name}")
+            continue
+        if not hasattr(v, 'snapshot_count'):
+            logger.debug(f"{v.name} has no snapshots")
+            continue
+        vol = {}
+        vol['vname'] = v.name
+        vol['count'] = v.snapshot_count
+        vol['sname'] = None
+        vol['oldest'] = None
+        vol['seconds'] = 0
+
+        if v.snapshot_count == 0:
+            logger.debug(f"no snapshots found for {v.name}")
             Snaps.append(vol)
-
-    except NetAppRestError as error:
-        check.exit(Status.UNKNOWN, "Error => {}".format(error))
+            continue
+        else:
+            logger.info(f"{v.name} has {v.snapshot_count} snapshots")
+            Ages = []
+            for s in Snapshots[v.uuid]:
+                if (args.exclude or args.include) and args.mode == "snapshot" and item_filter(args,s.name):
+                    continue
+                Ages.append((s.name,datetime.fromisoformat(s.create_time).timestamp()))
+
+        if len(Ages) == 0:
+            continue
+        else:
+            vol_with_snap += 1
+
+        Ages = sorted(Ages, key=lambda tup: tup[1])
+        logger.info(f"oldest snapshot => from {Ages[0][1]} name {Ages[0][0]} ")
+        vol['sname'] = Ages[0][0]
+        vol['rawdate'] = Ages[0][1]
+        vol['date'] = timedelta(seconds = datetime.now().timestamp() - Ages[0][1])
+        vol['seconds'] = timedelta(seconds = datetime.now().timestamp() - Ages[0][1]).total_seconds()
+        Snaps.append(vol)
 
     for snap in Snaps:
         if args.count:
@@ -154,11 +174,29 @@ def run():
     check.add_perfdata(label="total_volumes",value=len(Volumes))
     check.add_perfdata(label="snapshoted_volumes",value=vol_with_snap)
     short = f"found {time_err} volumes with outdated snapshots"
-    (code, message) = check.check_messages(separator="\n",allok=f"{vol_with_snap} of total {len(Volumes)} volumes with snapshots are fine")
-    if code != Status.OK:
-        check.exit(code=code,message=f"{short}\n{message}")
-    else:
-        check.exit(code=code,message=f"{message}")
+    result = Result.of(check, separator="\n", allok=f"{vol_with_snap} of total {len(Volumes)} volumes with snapshots are fine")
+    if result.status != Status.OK:
+        result.message = f"{short}\n{result.message}"
+    return result
+
+def run():
+    args = parse_args()
+
+    # Setup module logging
+    logger.disabled=True
+    if args.verbose:
+        for log_name, log_obj in logging.Logger.manager.loggerDict.items():
+            log_obj.disabled = False
+            logging.getLogger(log_name).setLevel(severity(args.verbose))
+
+    setup_connection(args.host, args.api_user, args.api_pass, args.port, args)
+
+    # snapshots module
+    try:
+        result = evaluate(args, fetch(args))
+    except NetAppRestError as error:
+        result = Result(Status.UNKNOWN, "Error => {}".format(error))
+    result.exit()
 
 if __name__ == "__main__":
     run()
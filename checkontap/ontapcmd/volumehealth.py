@@ -17,13 +17,16 @@
 
 import logging
 from monplugin import Check,Status
-from netapp_ontap.resources import Volume
 from netapp_ontap.error import NetAppRestError
-from ..tools import cli
+from ..tools import cli, fields, pushdown, transport
 from ..tools.helper import setup_connection,severity,item_filter
+from ..tools.result import Result
 
 __cmd__ = "volume-health"
 description = "Check state of volumes online,offline,error or mixed"
+logger = logging.getLogger(__name__)
+# volumes --summary counts and fetches, all others are online
+SUMMARY_FILTER = {"state": "!online"}
 """
 Volume({
     'snapshot_policy': {'name': 'none'},
@@ -57,7 +60,7 @@ Volume({
     'comment': '',
     'create_time': '2021-04-22T10:10:54+02:00'})
 """
-def run():
+def parse_args(argv=None):
     parser = cli.Parser()
     parser.set_description(description)
     parser.set_epilog("")
@@ -65,63 +68,113 @@ def run():
                                   cli.Argument.CRITICAL,
                                   cli.Argument.EXCLUDE,
                                   cli.Argument.INCLUDE,
-                                  cli.Argument.NAME)
-    args = parser.get_args()
+                                  cli.Argument.NAME,
+                                  cli.Argument.SUMMARY)
+    args = parser.get_args(argv)
+    if args.summary and (args.include or args.exclude) and (args.name or "name" not in pushdown.query(args)):
+        parser.error("--summary counts on the cluster, it needs an --include/--exclude ONTAP can filter and no --name")
+    return args
+
+def fetch_summary(args):
+    """ (count of all volumes, volumes which aren't online), the volumes are only fetched if there are any """
+    query = pushdown.query(args, **({"name": "|".join(args.name[0])} if args.name else {}))
+    volumes_count = transport.count_collection("/api/storage/volumes", **query)
+    problem_count = transport.count_collection("/api/storage/volumes", **query, **SUMMARY_FILTER)
+    logger.info(f"{problem_count} of {volumes_count} volumes aren't online")
+    if problem_count == 0:
+        return (volumes_count, [])
+    return (volumes_count, list(transport.get_collection("/api/storage/volumes", fields=fields.fields(__cmd__, "/api/storage/volumes"),
+                                                         **query, **SUMMARY_FILTER)))
+
+def fetch(args):
+    """ (count of the volumes found, volumes to check) """
+    if args.summary:
+        return fetch_summary(args)
+    if args.name:
+        # all names in one query
+        found = {vol.name: vol for vol in transport.get_collection("/api/storage/volumes", fields=fields.fields(__cmd__, "/api/storage/volumes"),
+                                                                   name="|".join(args.name[0]))}
+        volumes = []
+        for n in args.name[0]:
+            vol = found.get(n)
+            logger.info(f"find volume {n}")
+            logger.debug(f"{vol}")
+            volumes.append(vol)
+        return (len(found), volumes)
+    volumes = list(transport.get_collection("/api/storage/volumes", fields=fields.fields(__cmd__, "/api/storage/volumes"),
+                                            **pushdown.query(args)))
+    logger.info(f"found {len(volumes)} volumes")
+    return (len(volumes), volumes)
+
+def add_state(check, args, vol):
+    if args.warning and vol.state in args.warning:
+        check.add_message(Status.WARNING, f"Vol: {vol.name} has state {vol.state}")
+    elif args.critical and vol.state in args.critical:
+        check.add_message(Status.CRITICAL, f"Vol: {vol.name} has state {vol.state}")
+    else:
+        check.add_message(Status.OK, f"Vol: {vol.name} has state {vol.state}")
+
+def evaluate_summary(args, data) -> Result:
+    (volumes_count, volumes) = data
+    check = Check()
+    if volumes_count == 0:
+        return Result(Status.UNKNOWN, "no vols found")
+    if not volumes:
+        return Result(Status.OK, f"all {volumes_count} volumes are online")
+    for vol in volumes:
+        if (args.exclude or args.include) and item_filter(args,vol.name):
+            continue
+        add_state(check, args, vol)
+    return Result.of(check, short=f"{len(volumes)} of {volumes_count} volumes aren't online")
+
+def evaluate(args, data) -> Result:
+    if args.summary:
+        return evaluate_summary(args, data)
+    (volumes_count, volumes) = data
+    check = Check()
+    if volumes_count == 0:
+        return Result(Status.UNKNOWN, "no vols found")
+
+    if args.name:
+        volumes_count = len(args.name[0])
+        for (n, vol) in zip(args.name[0], volumes):
+            if vol is None:
+                check.add_message(Status.CRITICAL, f"Vol: {n} not found")
+                continue
+            add_state(check, args, vol)
+    else:
+        for vol in volumes:
+            logger.info(f"get volume {vol.name}")
+            logger.debug(f"{vol}")
+            if not hasattr(vol,'state'):
+                volumes_count -= 1
+                continue
+            if (args.exclude or args.include) and item_filter(args,vol.name):
+                volumes_count -= 1
+                continue
+            logger.info(f"state: {vol.state}\tname: {vol.name}\tstyle: {vol.style}\tcomment: {vol.comment}")
+            add_state(check, args, vol)
+    return Result.of(check, short=f"checked {volumes_count} volumes")
+
+def run():
+    args = parse_args()
     # Setup module logging
-    logger = logging.getLogger(__name__)
     logger.disabled = True
     if args.verbose:
         for log_name, log_obj in logging.Logger.manager.loggerDict.items():
             log_obj.disabled = False
             logging.getLogger(log_name).setLevel(severity(args.verbose))
 
-    setup_connection(args.host, args.api_user, args.api_pass, args.port)
-
-    check = Check()
+    setup_connection(args.host, args.api_user, args.api_pass, args.port, args)
 
     try:
-        volumes_count = Volume.count_collection()
-        logger.info(f"found {volumes_count} volumes")
-        if volumes_count == 0:
-            check.exit(Status.UNKNOWN, "no vols found")
-
-        if args.name:
-            volumes_count = len(args.name[0])
-            for n in args.name[0]:
-                vol = Volume.find(name=n)
-                logger.info(f"find volume {n}")
-                logger.debug(f"{vol}")
-                if args.warning and vol.state in args.warning:
-                    check.add_message(Status.WARNING, f"Vol: {vol.name} has state {vol.state}")
-                elif args.critical and vol.state in args.critical:
-                    check.add_message(Status.CRITICAL, f"Vol: {vol.name} has state {vol.state}")
-                else:
-                    check.add_message(Status.OK, f"Vol: {vol.name} has state {vol.state}")
-        else:
-            for vol in Volume.get_collection(fields="name,state,style,comment"):
-                logger.info(f"get volume {vol.name}")
-                logger.debug(f"{vol}")
-                if not hasattr(vol,'state'):
-                    volumes_count -= 1
-                    continue
-                if (args.exclude or args.include) and item_filter(args,vol.name):
-                    volumes_count -= 1
-                    continue
-                logger.info(f"state: {vol.state}\tname: {vol.name}\tstyle: {vol.style}\tcomment: {vol.comment}")
-                if args.warning and vol.state in args.warning:
-                    check.add_message(Status.WARNING, f"Vol: {vol.name} has state {vol.state}")
-                elif args.critical and vol.state in args.critical:
-                    check.add_message(Status.CRITICAL, f"Vol: {vol.name} has state {vol.state}")
-                else:
-                    check.add_message(Status.OK, f"Vol: {vol.name} has state {vol.state}")
-        short = f"checked {volumes_count} volumes"
-        (code, message) = check.check_messages(separator='\n')
-        check.exit(code=code,message=f"{short}\n{message}")
-
+        result = evaluate(args, fetch(args))
     except NetAppRestError as error:
-        check.exit(Status.UNKNOWN, "Error => {}".format(error))
+        result = Result(Status.UNKNOWN, "Error => {}".format(error))
     except Exception as error:
         logger.exception(error)
+        return
+    result.exit()
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    run()
@@ -16,14 +16,18 @@
 #    along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import logging
+from itertools import islice
 from monplugin import Check,Status,Threshold, Range
-from netapp_ontap.resources import Volume
 from netapp_ontap.error import NetAppRestError
-from ..tools import cli
+from ..tools import alerts, cli, fields, passive, pushdown, transport
 from ..tools.helper import setup_connection,item_filter,severity,bytes_to_uom,range_in_bytes,uom_to_bytes
+from ..tools.result import Result
 
 __cmd__ = "volume-usage"
 description = f"Mode {__cmd__} with -m / --metric usage or size description like used_GB. Inodes thresholds are alway given in %"
+logger = logging.getLogger(__name__)
+# field of the metric of -m --alerts-only and --top query
+METRIC_FIELDS = {'usage': 'space.percent_used', 'used': 'space.used', 'free': 'space.available'}
 """
 space.used + space.available + snapshot.reserve_available = space.size
 Volume({
@@ -65,7 +69,138 @@ Volume({
         'snapshot': {'used': 4509696, 'reserve_available': 49176576, 'reserve_percent': 5, 'space_used_percent': 8, 'autodelete_enabled': False, 'autodelete_trigger': 'volume', 'reserve_size': 53686272}}, 'uuid': 'ec5e675c-b124-11ed-8cdc-d039ea94786e'})
 """
 
-def run():
+def check_volume(check, args, vol):
+    """ Add messages and perfdata of one volume to check """
+    v = {
+        'name': f"{vol.svm.name}_{vol.name}",
+        'data_total': vol.space.size,
+        'space': {
+            'max': vol.space.size,
+            'used': vol.space.used,
+            'usage': bytes_to_uom(vol.space.used, '%', vol.space.size),
+            'free': vol.space.available
+        },
+        'inodes': {
+            'max': vol.files.maximum,
+            'used': vol.files.used,
+            'usage': bytes_to_uom(vol.files.used, '%', vol.files.maximum),
+            'free': vol.files.maximum - vol.files.used
+        },
+    }
+    if hasattr(vol.space, 'afs_total'):
+        v['space']['usage'] = bytes_to_uom(vol.space.used, '%', vol.space.afs_total)
+        v['space']['max'] = vol.space.afs_total
+
+    if hasattr(vol.space.snapshot, 'reserve_size') and vol.space.snapshot.reserve_size > 0:
+        v['snapshot'] = {
+            'max': vol.space.snapshot.reserve_size,
+            'used': vol.space.snapshot.used,
+            'usage': bytes_to_uom(vol.space.snapshot.used, '%' ,vol.space.snapshot.reserve_size)
+        }
+        logger.info(f"{v['name']} hast {vol.space.snapshot.reserve_size}B snapshot reserved")
+    elif hasattr(vol.space.snapshot, 'reserve_percent') and vol.space.snapshot.reserve_percent > 0:
+        reserved_size = uom_to_bytes(vol.space.snapshot.reserve_percent, '%', v['space']['max'])
+        v['snapshot'] = {
+            'max': reserved_size,
+            'used': vol.space.snapshot.used,
+            'usage': bytes_to_uom(vol.space.snapshot.used, '%', reserved_size)
+        }
+        logger.info(f"{v['name']} hast {vol.space.snapshot.reserve_percent}% snapshot reserved")
+    elif hasattr(vol.space.snapshot, 'reserve_percent') and vol.space.snapshot.reserve_percent == 0:
+        v['snapshot'] = {
+            'max': vol.space.size,
+            'used': vol.space.snapshot.used,
+            'usage': bytes_to_uom(vol.space.snapshot.used, '%', vol.space.size)
+        }
+        logger.info(f"{v['name']} hast 0% snapshot reserved")
+    else:
+        v['snapshot'] = {
+            'max': 0,
+            'used': vol.space.snapshot.used,
+            'usage': 0
+        }
+        logger.info(f"{v['name']} could'nt find snapshot settings")
+
+    # Space
+    usage = Threshold(args.warning or None, args.critical or None)
+
+    for metric in ['usage', 'used', 'free']:
+        opts = {}
+        typ, uom, *_ = (args.metric.split('_') + ['%' if 'usage' in args.metric else 'B'])
+        if metric in args.metric:
+            threshold = {}
+            opts['threshold'] = {}
+            if '%' in uom:
+                s = usage.get_status(v['space']['usage'])
+                out = f"{v['space'][typ] :.2f}%"
+                if args.warning:
+                    threshold['warning'] = args.warning
+                if args.critical:
+                    threshold['critical'] = args.critical
+            else:
+                s = usage.get_status(bytes_to_uom(v['space'][typ],uom))
+                if 'free' in typ:
+                    pct = 100 - v['space']['usage']
+                else:
+                    pct = v['space']['usage']
+                out = f"{bytes_to_uom(v['space'][typ],uom)}{uom} ({pct :.2f}%)"
+                if args.warning:
+                    threshold['warning'] = range_in_bytes(Range(args.warning), uom)
+                if args.critical:
+                    threshold['critical'] = range_in_bytes(Range(args.critical), uom)
+
+            opts['threshold'] = Threshold(**threshold)
+            puom = '%' if metric == 'usage' else 'B'
+            check.add_perfdata(label=f"{v['name']} {typ}", value=v['space'][typ], uom=puom, **opts)
+
+            if s != Status.OK:
+                check.add_message(s, f"{args.metric} on {v['name']} is: {out}")
+
+        else:
+            puom = '%' if metric == 'usage' else 'B'
+            check.add_perfdata(label=f"{v['name']} {metric}", value=v['space'][metric], uom=puom)
+
+    # data_total as perdate
+    check.add_perfdata(label=f"{v['name']} total",value=v['space']['max'], uom='B')
+
+    # Inode usage
+    if args.inode_warning or args.inode_critical:
+        inodes = Threshold(args.inode_warning or None, args.inode_critical or None)
+        opts = {}
+        opts['threshold'] = {}
+        threshold = {}
+        s = inodes.get_status(v['inodes']['usage'])
+        if args.inode_warning:
+            threshold['warning'] = args.inode_warning
+        if args.inode_critical:
+            threshold['critical'] = args.inode_critical
+        opts['threshold']= Threshold(**threshold)
+
+        if s != Status.OK:
+            check.add_message(s, f"Inodes usage on {v['name']} is {v['inodes']['usage']}%")
+        check.add_perfdata(label=f"{v['name']} inodes usage", value=v['inodes']['usage'], uom="%", **opts)
+    else:
+        check.add_perfdata(label=f"{v['name']} inodes usage", value=v['inodes']['usage'], uom="%")
+
+    # Snapshot usage just as perfdata
+    if args.snapshot_warning or args.snapshot_critical:
+        snapshot = Threshold(args.snapshot_warning or None, args.snapshot_critical or None)
+        opts = {}
+        opts['threshold'] = {}
+        threshold = {}
+        s = snapshot.get_status(v['snapshot']['usage'])
+        if args.snapshot_warning:
+            threshold['warning'] = args.snapshot_warning
+        if args.snapshot_critical:
+            threshold['critical'] = args.snapshot_critical
+        opts['threshold'] = Threshold(**threshold)
+        if s != Status.OK:
+            check.add_message(s,f"Snapshot usage on {v['name']} id {v['snapshot']['usage']}%")
+        check.add_perfdata(label=f"{v['name']} snapshot usage" ,value=v['snapshot']['usage'], uom='%', **opts)
+    else:
+        check.add_perfdata(label=f"{v['name']} snapshot usage" ,value=v['snapshot']['usage'], uom='%')
+
+def parse_args(argv=None):
     parser = cli.Parser()
     parser.set_description(description)
     parser.set_epilog("Name of SVM will be prepended automaticaly to the volume name")
@@ -76,185 +211,154 @@ def run():
                                   cli.Argument.METRIC,
                                   cli.Argument.INODE_WARN, cli.Argument.INODE_CRIT,
                                   cli.Argument.SNAP_WARN, cli.Argument.SNAP_CRIT,
+                                  cli.Argument.PAGE_SIZE,
+                                  cli.Argument.ALERTS_ONLY,
+                                  cli.Argument.TOP,
+                                  cli.Argument.PASSIVE_SPOOL, cli.Argument.PASSIVE_PIPE,
+                                  cli.Argument.PASSIVE_HOST, cli.Argument.SERVICE_TEMPLATE,
                                   )
-    args = parser.get_args()
+    args = parser.get_args(argv)
+    if args.alerts_only and passive.enabled(args):
+        parser.error("--alerts-only would leave the passive results of the fine volumes stale")
+    if args.top is not None and args.top < 1:
+        parser.error("--top needs at least one volume")
+    if args.top and passive.enabled(args):
+        parser.error("--top would leave the passive results of the other volumes stale")
+    if args.top and (args.include or args.exclude) and "name" not in pushdown.query(args):
+        # the total is counted by the cluster, it would count the volumes dropped on the client
+        parser.error("--top needs an --include / --exclude ONTAP can filter (literal names, .* and |)")
+    return args
 
-    # Setup module logging
-    logger = logging.getLogger(__name__)
-    logger.disabled = True
-    if args.verbose:
-        for log_name, log_obj in logging.Logger.manager.loggerDict.items():
-            log_obj.disabled = False
-            logging.getLogger(log_name).setLevel(severity(args.verbose))
-
-    check = Check()
-    setup_connection(args.host, args.api_user, args.api_pass, args.port)
-    vols = []
+def fetch(args):
+    """ (query, volumes as they are read from the cluster) """
+    query = pushdown.query(args)
+    alert = {}
+    if args.alerts_only:
+        if (args.include or args.exclude) and "name" not in query:
+            unsupported = "the volumes --include / --exclude drop on the client have to be read to be counted"
+        elif args.inode_warning or args.inode_critical or args.snapshot_warning or args.snapshot_critical:
+            unsupported = "ONTAP can't or inode or snapshot thresholds with the space thresholds"
+        else:
+            unsupported = None
+        alert = alerts.query(args, METRIC_FIELDS, unsupported)
+    if args.top:
+        # the fullest volumes first, only the next page is requested if the filter drops some
+        return (query, transport.get_collection("/api/storage/volumes",
+                                                fields=fields.fields(__cmd__, "/api/storage/volumes"),
+                                                order_by=pushdown.order_by(args, METRIC_FIELDS), max_records=args.top,
+                                                **query, **alert))
+    return (query, transport.get_collection("/api/storage/volumes",
+                                            fields=fields.fields(__cmd__, "/api/storage/volumes"),
+                                            page_size=args.page_size, **query, **alert))
 
-    try:
-        volumes_count = Volume.count_collection()
-        logger.info(f"found {volumes_count} volumes")
-        if volumes_count == 0:
-            check.exit(Status.UNKNOWN, "no volumes found")
+def count(query):
+    """ Number of all volumes of query, after they were read it's known without asking the cluster again """
+    volumes_count = transport.count_collection("/api/storage/volumes", **query)
+    logger.info(f"found {volumes_count} volumes")
+    return volumes_count
 
-        for vol in Volume.get_collection(fields="svm,space,files,space.snapshot"):
-            if (args.exclude or args.include) and item_filter(args,vol.name):
-                logger.info(f"But item filter exclude: '{args.exclude}' or include: '{args.include}' has matched {vol.name}")
-                volumes_count -= 1
-                continue
-            else:
-                if hasattr(vol,'space'):
-                    if not hasattr(vol.space, 'used'):
-                        logger.info(f"{vol.name} has no 'used' info in space object")
-                        continue
-                else:
-                    logger.info(f"{vol.name} has no space info")
-                    logger.debug(f"{vol.name}\n{vol}")
+def select(args, volumes, filtered):
+    """
+    Volumes left after the item filter and without volumes lacking space info,
+    one by one as they are read. Names of volumes the filter removed are
+    appended to filtered.
+    """
+    for vol in volumes:
+        if (args.exclude or args.include) and item_filter(args,vol.name):
+            logger.info(f"But item filter exclude: '{args.exclude}' or include: '{args.include}' has matched {vol.name}")
+            filtered.append(vol.name)
+            continue
+        else:
+            if hasattr(vol,'space'):
+                if not hasattr(vol.space, 'used'):
+                    logger.info(f"{vol.name} has no 'used' info in space object")
                     continue
-                logger.info(f"SVM {vol.svm.name} VOLUME {vol.name}")
-                logger.debug(f"{vol}")
-                vols.append(vol)
-
-        if volumes_count == 0:
-            check.exit(Status.UNKNOWN, "no volumes found")
-
-        for vol in vols:
-            v = {
-                'name': f"{vol.svm.name}_{vol.name}",
-                'data_total': vol.space.size,
-                'space': {
-                    'max': vol.space.size,
-                    'used': vol.space.used,
-                    'usage': bytes_to_uom(vol.space.used, '%', vol.space.size),
-                    'free': vol.space.available
-                },
-                'inodes': {
-                    'max': vol.files.maximum,
-                    'used': vol.files.used,
-                    'usage': bytes_to_uom(vol.files.used, '%', vol.files.maximum),
-                    'free': vol.files.maximum - vol.files.used
-                },
-            }
-            if hasattr(vol.space, 'afs_total'):
-                v['space']['usage'] = bytes_to_uom(vol.space.used, '%', vol.space.afs_total)
-                v['space']['max'] = vol.space.afs_total
-                
-            if hasattr(vol.space.snapshot, 'reserve_size') and vol.space.snapshot.reserve_size > 0:
-                v['snapshot'] = {
-                    'max': vol.space.snapshot.reserve_size,
-                    'used': vol.space.snapshot.used,
-                    'usage': bytes_to_uom(vol.space.snapshot.used, '%' ,vol.space.snapshot.reserve_size)
-                }
-                logger.info(f"{v['name']} hast {vol.space.snapshot.reserve_size}B snapshot reserved")
-            elif hasattr(vol.space.snapshot, 'reserve_percent') and vol.space.snapshot.reserve_percent > 0:
-                reserved_size = uom_to_bytes(vol.space.snapshot.reserve_percent, '%', v['space']['max'])
-                v['snapshot'] = {
-                    'max': reserved_size,
-                    'used': vol.space.snapshot.used,
-                    'usage': bytes_to_uom(vol.space.snapshot.used, '%', reserved_size)
-                }
-                logger.info(f"{v['name']} hast {vol.space.snapshot.reserve_percent}% snapshot reserved")
-            elif hasattr(vol.space.snapshot, 'reserve_percent') and vol.space.snapshot.reserve_percent == 0:
-                v['snapshot'] = {
-                    'max': vol.space.size,
-                    'used': vol.space.snapshot.used,
-                    'usage': bytes_to_uom(vol.space.snapshot.used, '%', vol.space.size)
-                }
-                logger.info(f"{v['name']} hast 0% snapshot reserved")
             else:
-                v['snapshot'] = {
-                    'max': 0,
-                    'used': vol.space.snapshot.used,
-                    'usage': 0
-                }
-                logger.info(f"{v['name']} could'nt find snapshot settings")
-
-            # Space
-            usage = Threshold(args.warning or None, args.critical or None)
-
-            for metric in ['usage', 'used', 'free']:
-                opts = {}
-                typ, uom, *_ = (args.metric.split('_') + ['%' if 'usage' in args.metric else 'B'])
-                if metric in args.metric:
-                    threshold = {}
-                    opts['threshold'] = {}
-                    if '%' in uom:
-                        s = usage.get_status(v['space']['usage'])
-                        out = f"{v['space'][typ] :.2f}%"
-                        if args.warning:
-                            threshold['warning'] = args.warning
-                        if args.critical:
-                            threshold['critical'] = args.critical
-                    else:
-                        s = usage.get_status(bytes_to_uom(v['space'][typ],uom))
-                        if 'free' in typ:
-                            pct = 100 - v['space']['usage']
-                        else:
-                            pct = v['space']['usage']
-                        out = f"{bytes_to_uom(v['space'][typ],uom)}{uom} ({pct :.2f}%)"
-                        if args.warning:
-                            threshold['warning'] = range_in_bytes(Range(args.warning), uom)
-                        if args.critical:
-                            threshold['critical'] = range_in_bytes(Range(args.critical), uom)
+                logger.info(f"{vol.name} has no space info")
+                logger.debug(f"{vol.name}\n{vol}")
+                continue
+            logger.info(f"SVM {vol.svm.name} VOLUME {vol.name}")
+            logger.debug(f"{vol}")
+            yield vol
 
-                    opts['threshold'] = Threshold(**threshold)
-                    puom = '%' if metric == 'usage' else 'B'
-                    check.add_perfdata(label=f"{v['name']} {typ}", value=v['space'][typ], uom=puom, **opts)
+def top(args, volumes):
+    """ The first --top volumes, the fullest ones as the cluster sorted them """
+    return islice(volumes, args.top) if args.top else volumes
 
-                    if s != Status.OK:
-                        check.add_message(s, f"{args.metric} on {v['name']} is: {out}")
+def summary(args, check, volumes_count, checked, alerting=None) -> dict:
+    """ allok or short of the Result, with --top they tell how many volumes were checked """
+    volumes = f"the {checked} fullest of {volumes_count} volumes by {args.metric}" if args.top else f"{volumes_count} volumes"
+    if check.check_messages()[0] == Status.OK:
+        return {"allok": f"{volumes} are ok" if args.top else f"all {volumes} are ok"}
+    if alerting is not None:
+        return {"short": f"{alerting} of {volumes} alert"}
+    return {"short": volumes if args.top else None}
 
-                else:
-                    puom = '%' if metric == 'usage' else 'B'
-                    check.add_perfdata(label=f"{v['name']} {metric}", value=v['space'][metric], uom=puom)
+def evaluate_alerts(args, data) -> Result:
+    """ Only the volumes -w / -c alert on, the others are counted by the cluster """
+    (query, volumes) = data
+    filtered = []
+    check = Check()
+    (alerting, checked) = (0, 0)
+    for vol in top(args, select(args, volumes, filtered)):
+        c = Check()
+        check_volume(c, args, vol)
+        alerting += alerts.alerting(check, c)
+        checked += 1
+    volumes_count = count(query) - len(filtered)
+    if volumes_count == 0:
+        return Result(Status.UNKNOWN, "no volumes found")
+    return Result.of(check, separator='\n  ', **summary(args, check, volumes_count, checked, alerting))
 
-            # data_total as perdate
-            check.add_perfdata(label=f"{v['name']} total",value=v['space']['max'], uom='B')
+def evaluate(args, data) -> Result:
+    if args.alerts_only:
+        return evaluate_alerts(args, data)
+    (query, volumes) = data
+    filtered = []
+    check = Check()
+    checked = 0
+    # volumes are checked while the next ones are still read
+    for vol in top(args, select(args, volumes, filtered)):
+        check_volume(check, args, vol)
+        checked += 1
+    volumes_count = count(query) - len(filtered)
+    if volumes_count == 0:
+        return Result(Status.UNKNOWN, "no volumes found")
+    return Result.of(check, separator='\n  ', **summary(args, check, volumes_count, checked))
 
-            # Inode usage
-            if args.inode_warning or args.inode_critical:
-                inodes = Threshold(args.inode_warning or None, args.inode_critical or None)
-                opts = {}
-                opts['threshold'] = {}
-                threshold = {}
-                s = inodes.get_status(v['inodes']['usage'])
-                if args.inode_warning:
-                    threshold['warning'] = args.inode_warning
-                if args.inode_critical:
-                    threshold['critical'] = args.inode_critical
-                opts['threshold']= Threshold(**threshold)
+def evaluate_passive(args, data) -> Result:
+    """ Submit one passive result per volume, the Result tells how many """
+    (query, volumes) = data
+    filtered = []
+    results = passive.PassiveResults(args, __cmd__)
+    for vol in select(args, volumes, filtered):
+        c = Check()
+        check_volume(c, args, vol)
+        results.add(c, f"{vol.svm.name}_{vol.name}", svm=vol.svm.name, volume=vol.name)
+    if count(query) - len(filtered) == 0:
+        return Result(Status.UNKNOWN, "no volumes found")
+    return results.submit_result()
 
-                if s != Status.OK:
-                    check.add_message(s, f"Inodes usage on {v['name']} is {v['inodes']['usage']}%")
-                check.add_perfdata(label=f"{v['name']} inodes usage", value=v['inodes']['usage'], uom="%", **opts)
-            else:
-                check.add_perfdata(label=f"{v['name']} inodes usage", value=v['inodes']['usage'], uom="%")
+def run():
+    args = parse_args()
 
-            # Snapshot usage just as perfdata
-            if args.snapshot_warning or args.snapshot_critical:
-                snapshot = Threshold(args.snapshot_warning or None, args.snapshot_critical or None)
-                opts = {}
-                opts['threshold'] = {}
-                threshold = {}
-                s = snapshot.get_status(v['snapshot']['usage'])
-                if args.snapshot_warning:
-                    threshold['warning'] = args.snapshot_warning
-                if args.snapshot_critical:
-                    threshold['critical'] = args.snapshot_critical
-                opts['threshold'] = Threshold(**threshold)
-                if s != Status.OK:
-                    check.add_message(s,f"Snapshot usage on {v['name']} id {v['snapshot']['usage']}%")
-                check.add_perfdata(label=f"{v['name']} snapshot usage" ,value=v['snapshot']['usage'], uom='%', **opts)
-            else:
-                check.add_perfdata(label=f"{v['name']} snapshot usage" ,value=v['snapshot']['usage'], uom='%')
+    # Setup module logging
+    logger.disabled = True
+    if args.verbose:
+        for log_name, log_obj in logging.Logger.manager.loggerDict.items():
+            log_obj.disabled = False
+            logging.getLogger(log_name).setLevel(severity(args.verbose))
 
-        (code, message) = check.check_messages(separator='\n  ',allok=f"all {volumes_count} volumes are ok")
-        check.exit(code=code,message=f"{message}")
+    setup_connection(args.host, args.api_user, args.api_pass, args.port, args)
 
+    try:
+        result = (evaluate_passive if passive.enabled(args) else evaluate)(args, fetch(args))
     except NetAppRestError as error:
-        check.exit(Status.UNKNOWN, "Error => {}".format(error))
+        result = Result(Status.UNKNOWN, "Error => {}".format(error))
     except Exception as error:
         logger.exception(error)
+        return
+    result.exit()
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    run()
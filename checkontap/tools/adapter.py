@@ -0,0 +1,105 @@
+#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Hooks into the requests session of a netapp_ontap HostConnection.
+
+Every API call of netapp_ontap goes through the adapter the HostConnection
+mounts for its origin. Wrappers are stacked around that adapter, so they see
+every request of every resource without touching netapp_ontap itself.
+"""
+
+from urllib.parse import urlsplit, parse_qsl
+import re
+import hashlib
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+class AdapterWrapper(BaseAdapter):
+    """ Passes everything to the wrapped adapter, subclasses override send() """
+
+    def __init__(self, adapter, **settings):
+        super().__init__()
+        self.adapter = adapter
+        self.configure(**settings)
+
+    def configure(self, **settings):
+        """ (Re)apply settings, called again when a pooled connection is reused """
+        for (k, v) in settings.items():
+            setattr(self, k, v)
+
+    def send(self, request, **kwargs):
+        return self.adapter.send(request, **kwargs)
+
+    def close(self):
+        self.adapter.close()
+
+def find(connection, wrapper):
+    """ Return the mounted wrapper of the given class or None """
+    adapter = connection.session.get_adapter(connection.origin)
+    while isinstance(adapter, AdapterWrapper):
+        if type(adapter) is wrapper:
+            return adapter
+        adapter = adapter.adapter
+    return None
+
+def mount(connection, wrapper, **settings):
+    """
+    Wrap the adapter of the connection with wrapper, if it's already mounted
+    only the settings are updated. Wrappers mounted later are called first.
+    """
+    mounted = find(connection, wrapper)
+    if mounted:
+        mounted.configure(**settings)
+        return mounted
+    session = connection.session
+    mounted = wrapper(session.get_adapter(connection.origin), **settings)
+    session.mount(connection.origin, mounted)
+    return mounted
+
+def cluster_name(cluster, url):
+    """
+    Name of the state files of a cluster: the --host value it was set up with,
+    so all the addresses it resolves to share them, the host of url without
+    """
+    if cluster:
+        names = sorted(h.strip().lower() for h in cluster.split(",") if h.strip())
+        name = re.sub(r"[^\w.,:-]", "_", ",".join(names))
+        if len(name) > 100:
+            name = hashlib.sha256(name.encode()).hexdigest()[:16]
+    else:
+        name = url.hostname
+    return f"{name}_{url.port or 443}"
+
+def request_key(request):
+    """ (method, host, port, path, sorted query) of a prepared request """
+    url = urlsplit(request.url)
+    query = tuple(sorted(parse_qsl(url.query, keep_blank_values=True)))
+    return (request.method, url.hostname, url.port, url.path, query)
+
+def build_response(request, status, headers, body, url=None, reason=None):
+    """ Create a complete, already consumed requests.Response """
+    response = requests.Response()
+    response.status_code = status
+    response.reason = reason or ("OK" if status < 400 else "")
+    response.headers = CaseInsensitiveDict(headers)
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.url = url or request.url
+    response.request = request
+    response._content = body
+    response._content_consumed = True
+    return response
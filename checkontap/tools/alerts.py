@@ -0,0 +1,91 @@
+#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+-w / -c as ONTAP range query for --alerts-only.
+
+    query = alerts.query(args, {'usage': 'space.percent_used', 'used': 'space.used'})
+    # {"space.percent_used": ">=84"} for -w 85 -c 90
+    volumes = transport.get_collection(path, fields=..., **query)
+
+Thresholds alerting on one side only (85, ~:85, 0:85 alert above, 10: alerts
+below) of a metric with a field on the cluster become a range on that field.
+The range is a little wider than the thresholds, ONTAP rounds percent_used
+to whole numbers and the checks round the bytes in the unit of -m, the
+thresholds are still evaluated on the client and alerting() drops the
+objects which turn out fine. Anything else (inside ranges @a:b, both sides
+a:b, a metric without a field) fetches all objects like before and only
+the report is limited to the alerting ones.
+"""
+
+import math
+import logging
+from monplugin import Range, Status
+from .helper import uom_to_bytes
+
+logger = logging.getLogger(__name__)
+
+def bound(*thresholds):
+    """
+    ('>', lowest end) if the thresholds alert above it, ('<', highest start)
+    if they alert below it, None if they alert otherwise
+    """
+    ranges = [Range(t) for t in thresholds if t]
+    if not ranges or not all(r.outside for r in ranges):
+        return None
+    if all(r.start <= 0 and r.end != float('inf') for r in ranges):
+        return ('>', min(r.end for r in ranges))
+    if all(r.end == float('inf') and r.start != float('-inf') for r in ranges):
+        return ('<', max(r.start for r in ranges))
+    return None
+
+def query(args, fields, unsupported=None) -> dict:
+    """
+    {field: range} on the field of fields ({'usage': field, 'used': field,
+    'free': field}) for -m of args, matching at least the objects -w / -c
+    alert on. {} if the cluster can't tell them, unsupported is a reason
+    the caller knows of.
+    """
+    typ, uom, *_ = (args.metric.split('_') + ['%' if 'usage' in args.metric else 'B'])
+    if unsupported:
+        logger.info(f"--alerts-only stays client side, {unsupported}")
+        return {}
+    field = fields.get(typ)
+    if field is None:
+        logger.info(f"--alerts-only stays client side, -m {args.metric} has no field to query")
+        return {}
+    side = bound(args.warning, args.critical)
+    if side is None:
+        logger.info(f"--alerts-only stays client side, -w '{args.warning}' -c '{args.critical}' don't alert on one side only")
+        return {}
+    (op, value) = side
+    if '%' in uom:
+        # percent_used is a whole number
+        value = math.floor(value) - 1 if op == '>' else math.ceil(value) + 1
+    else:
+        # the checks round to 0.001 in the unit of -m
+        value = math.floor(uom_to_bytes(value - 0.001, uom)) if op == '>' else math.ceil(uom_to_bytes(value + 0.001, uom))
+    value = f"{op}={max(0, value)}"
+    logger.info(f"--alerts-only -w '{args.warning}' -c '{args.critical}' pushed down as {field}={value}")
+    return {field: value}
+
+def alerting(check, c) -> bool:
+    """ Add the problems and perfdata of c to check if c has problems, True if it had """
+    if not (c._messages[Status.WARNING] or c._messages[Status.CRITICAL]):
+        return False
+    for status in (Status.WARNING, Status.CRITICAL):
+        check.add_message(status, *c._messages[status])
+    check._perfdata.extend(c._perfdata)
+    return True
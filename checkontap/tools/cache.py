@@ -0,0 +1,152 @@
+#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Shared on-disk cache for GET responses of the ONTAP API.
+
+Entries are keyed by cluster, user, endpoint and query (fields included) and
+live for a TTL given per endpoint. Every entry is a single file written to a
+temp file first and renamed into place, so concurrent plugin processes never
+see partial entries. The cache size is bounded, the least recently used
+entries (by mtime, touched on every hit) are removed first.
+
+Entries hold the whole body, a streamed response (transport.stream()) is
+read completely before the caller gets its first byte.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+from fnmatch import fnmatch
+from .adapter import AdapterWrapper, request_key, build_response
+
+logger = logging.getLogger(__name__)
+
+# TTL in seconds per endpoint, first match wins
+TTL = [
+    ("/api/cluster/software", 3600),
+    ("/api/cluster/nodes*", 60),
+    ("/api/storage/volumes/*/snapshots*", 300),
+    ("/api/storage/volumes*", 60),
+    ("/api/storage/aggregates*", 60),
+    ("/api/storage/luns*", 60),
+    ("/api/storage/disks*", 120),
+    ("/api/network/*", 60),
+    ("/api/private/cli/*", 30),
+]
+DEFAULT_TTL = 30
+DEFAULT_SIZE = 100  # MB
+
+def endpoint_ttl(path, ttl=None):
+    if ttl is not None:
+        return ttl
+    for (pattern, seconds) in TTL:
+        if fnmatch(path, pattern):
+            return seconds
+    return DEFAULT_TTL
+
+class ResponseCache(AdapterWrapper):
+    """ Serves GET requests from the cache directory while they are fresh """
+    directory = None
+    ttl = None
+    size = DEFAULT_SIZE
+
+    def key(self, request, cert=None):
+        user = request.headers.get("Authorization", "") + json.dumps(cert)
+        raw = json.dumps([request_key(request), hashlib.sha256(user.encode()).hexdigest()])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def send(self, request, **kwargs):
+        if not self.directory or request.method != "GET":
+            return self.adapter.send(request, **kwargs)
+
+        path = os.path.join(self.directory, f"{self.key(request, kwargs.get('cert'))}.json")
+        entry = self.load(path)
+        if entry:
+            logger.info(f"cache hit {request.url}")
+            return self.response(request, entry)
+
+        response = self.adapter.send(request, **kwargs)
+        if response.status_code == 200:
+            ttl = endpoint_ttl(request.path_url.split("?")[0], self.ttl)
+            if ttl > 0:
+                self.store(path, response, ttl)
+        return response
+
+    def response(self, request, entry):
+        return build_response(request, entry["status"], entry["headers"],
+                              entry["body"].encode("utf-8"), url=entry["url"])
+
+    def load(self, path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("expires", 0) < time.time():
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def store(self, path, response, ttl):
+        entry = {
+            "expires": time.time() + ttl,
+            "status": response.status_code,
+            "headers": dict(response.headers),
+            "url": response.url,
+            "body": response.content.decode(response.encoding or "utf-8"),
+        }
+        try:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            (fd, tmp) = tempfile.mkstemp(dir=self.directory, prefix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"could not write cache entry {path}: {e}")
+            return
+        self.evict()
+
+    def evict(self):
+        """ Remove the least recently used entries while above the size limit """
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for e in it:
+                if not e.name.endswith(".json"):
+                    continue
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, e.path))
+                total += st.st_size
+        limit = self.size * 1024 * 1024
+        if total <= limit:
+            return
+        for (mtime, size, path) in sorted(entries):
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= limit * 0.9:
+                break
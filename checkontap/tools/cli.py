@@ -18,7 +18,7 @@ import argparse
 import getpass
 import os
 import signal
-from checkontap import CheckOntapTimeout
+from checkontap import CheckOntapTimeout, CheckOntapException
 
 __author__ = "ConSol"
 
@@ -43,6 +43,15 @@ class EnvDefault(argparse.Action):
     def __call__(self, parser, namespace, values, option_string=None):
         setattr(namespace, self.dest, values)
 
+class ArgumentParser(argparse.ArgumentParser):
+    """ Raises CheckOntapException on errors instead of exiting when raise_errors is set """
+    raise_errors = False
+
+    def error(self, message):
+        if self.raise_errors:
+            raise CheckOntapException(message)
+        super().error(message)
+
 class Parser:
     """
     Samples specific argument parser.
@@ -63,10 +72,10 @@ class Parser:
         One for the standard arguments and one for sample specific arguments.
         The standard group cannot be extended.
         """
-        self._parser = argparse.ArgumentParser(description='check_ontap',
-                                               formatter_class=argparse.RawTextHelpFormatter,
-                                               conflict_handler='resolve',
-                                               )
+        self._parser = ArgumentParser(description='check_ontap',
+                                      formatter_class=argparse.RawTextHelpFormatter,
+                                      conflict_handler='resolve',
+                                      )
         self._standard_args_group = self._parser.add_argument_group('standard arguments')
         self._specific_args_group = self._parser.add_argument_group('sample-specific arguments')
 
@@ -74,7 +83,8 @@ class Parser:
         self._standard_args_group.add_argument('-H', '--host',
                                                required=True,
                                                action='store',
-                                               help='NetApp device service address to connect to')
+                                               help='NetApp device service address to connect to, a comma separated list of\n'
+                                                    'management addresses is raced and the fastest one is used')
 
         # because we want -p for password, we use -o for port
         self._standard_args_group.add_argument('-P', '--port',
@@ -89,12 +99,26 @@ class Parser:
                                                help='API User name to use when connecting to host')
 
         self._standard_args_group.add_argument('-p', '--api_pass',
-                                               required=True,
+                                               required=False,
                                                action=EnvDefault,
                                                envvar='NETAPP_API_PASS',
                                                help='Password to use when connecting to host, '
                                                     'can also be set by env NETAPP_API_PASS')
 
+        self._standard_args_group.add_argument('--cert',
+                                               required=False,
+                                               action=EnvDefault,
+                                               envvar='NETAPP_API_CERT',
+                                               help='Client certificate (PEM) to authenticate with instead of a password,\n'
+                                                    'can also be set by env NETAPP_API_CERT')
+
+        self._standard_args_group.add_argument('--key',
+                                               required=False,
+                                               action=EnvDefault,
+                                               envvar='NETAPP_API_KEY',
+                                               help='Private key (PEM) of the client certificate, '
+                                                    'can also be set by env NETAPP_API_KEY')
+
 
         self._standard_args_group.add_argument('-nossl', '--disable-ssl-verification',
                                                required=False,
@@ -106,14 +130,101 @@ class Parser:
                                                 action='count',
                                                 help='Verbose output')
 
-    def get_args(self):
+        self._cache_args_group = self._parser.add_argument_group('cache and limit arguments')
+
+        self._cache_args_group.add_argument('--cache-dir',
+                                            required=False,
+                                            action=EnvDefault,
+                                            envvar='CHECK_ONTAP_CACHE_DIR',
+                                            help='Enable the response cache shared by all checks in this directory, collections are no longer streamed, '
+                                                 'can also be set by env CHECK_ONTAP_CACHE_DIR')
+
+        self._cache_args_group.add_argument('--cache-ttl',
+                                            required=False,
+                                            type=int,
+                                            action=EnvDefault,
+                                            envvar='CHECK_ONTAP_CACHE_TTL',
+                                            help='Seconds a cached response is used, overrides the defaults per endpoint, '
+                                                 'can also be set by env CHECK_ONTAP_CACHE_TTL')
+
+        self._cache_args_group.add_argument('--cache-size',
+                                            required=False,
+                                            type=int,
+                                            action=EnvDefault,
+                                            envvar='CHECK_ONTAP_CACHE_SIZE',
+                                            help='Maximum size of the cache directory in MB (default: 100), '
+                                                 'can also be set by env CHECK_ONTAP_CACHE_SIZE')
+
+        self._cache_args_group.add_argument('--coalesce',
+                                            required=False,
+                                            type=int,
+                                            default=0,
+                                            action=EnvDefault,
+                                            envvar='CHECK_ONTAP_COALESCE',
+                                            help='Concurrent checks doing the same request within these seconds share one request, collections are no longer streamed, '
+                                                 'can also be set by env CHECK_ONTAP_COALESCE')
+
+        self._cache_args_group.add_argument('--max-concurrent',
+                                            required=False,
+                                            type=int,
+                                            action=EnvDefault,
+                                            envvar='CHECK_ONTAP_MAX_CONCURRENT',
+                                            help='Maximum of requests running at once against a cluster by all checks on this host, '
+                                                 'can also be set by env CHECK_ONTAP_MAX_CONCURRENT')
+
+        self._cache_args_group.add_argument('--rate',
+                                            required=False,
+                                            type=float,
+                                            action=EnvDefault,
+                                            envvar='CHECK_ONTAP_RATE',
+                                            help='Maximum of requests per second against a cluster by all checks on this host, '
+                                                 'can also be set by env CHECK_ONTAP_RATE')
+
+        self._cache_args_group.add_argument('--fail-window',
+                                            required=False,
+                                            type=int,
+                                            action=EnvDefault,
+                                            envvar='CHECK_ONTAP_FAIL_WINDOW',
+                                            help='After a failed connect to a cluster all checks fail at once for these seconds, '
+                                                 'while one check every 10 seconds probes the cluster, '
+                                                 'can also be set by env CHECK_ONTAP_FAIL_WINDOW')
+
+        self._cache_args_group.add_argument('--dns-ttl',
+                                            required=False,
+                                            type=int,
+                                            action=EnvDefault,
+                                            envvar='CHECK_ONTAP_DNS_TTL',
+                                            help='Seconds resolved host names are cached for all checks, '
+                                                 'can also be set by env CHECK_ONTAP_DNS_TTL')
+
+        self._cache_args_group.add_argument('--state-dir',
+                                            required=False,
+                                            action=EnvDefault,
+                                            envvar='CHECK_ONTAP_STATE_DIR',
+                                            help='Directory for state shared between checks, it must be owned by the user with mode 0700\n'
+                                                 '(default: $XDG_RUNTIME_DIR/check_ontap or <tmp>/check_ontap-<uid>), '
+                                                 'can also be set by env CHECK_ONTAP_STATE_DIR')
+
+    def get_args(self, argv=None):
         """
         Supports the command-line arguments needed to form a connection to NetApp ONTAP.
+        argv defaults to sys.argv, if it's given errors raise CheckOntapException
+        instead of leaving the interpreter.
         """
-        args = self._parser.parse_args()
-        x = self._parser.parse_known_args()
+        self._parser.raise_errors = argv is not None
+        args = self._parser.parse_args(argv)
+        if bool(args.cert) != bool(args.key):
+            self._parser.error("--cert and --key are required together")
+        if not args.cert and args.api_pass is None:
+            self._parser.error("the following arguments are required: -p/--api_pass (or --cert and --key)")
         return args
 
+    def error(self, message):
+        """
+        Report invalid arguments found after get_args(), like get_args() does
+        """
+        self._parser.error(message)
+
     def _add_sample_specific_arguments(self, is_required: bool, *args):
         """
         Add an argument to the "sample specific arguments" group
@@ -277,4 +388,68 @@ class Argument:
             'help': 'count of whatever',
             'type': int
         }
-    }
\ No newline at end of file
+    }
+    PAGE_SIZE = {
+        'name_or_flags': ['--page-size'],
+        'options': {
+            'action': 'store',
+            'type': int,
+            'help': 'read collections in pages of this many records (max_records),\n'
+                    'the next page is requested while the current one is evaluated',
+        }
+    }
+    SUMMARY = {
+        'name_or_flags': ['--summary'],
+        'options': {
+            'action': 'store_true',
+            'help': 'only count the objects in a problem state on the cluster (return_records=false),\n'
+                    'their details are fetched only if there are any',
+        }
+    }
+    ALERTS_ONLY = {
+        'name_or_flags': ['--alerts-only'],
+        'options': {
+            'action': 'store_true',
+            'help': 'only fetch and report the objects -w / -c alert on (a range query on the metric),\n'
+                    'the others are only counted, --include / --exclude must be expressible as ONTAP query',
+        }
+    }
+    TOP = {
+        'name_or_flags': ['--top'],
+        'options': {
+            'action': 'store',
+            'type': int,
+            'help': 'only check the N fullest objects by the metric (order_by and max_records),\n'
+                    'the others are only counted, --include / --exclude must be expressible as ONTAP query',
+        }
+    }
+    PASSIVE_SPOOL = {
+        'name_or_flags': ['--passive-spool'],
+        'options': {
+            'action': 'store',
+            'help': 'write one passive result per object into this Naemon checkresults directory',
+        }
+    }
+    PASSIVE_PIPE = {
+        'name_or_flags': ['--passive-pipe'],
+        'options': {
+            'action': 'store',
+            'help': 'send one passive result per object to this Naemon command pipe',
+        }
+    }
+    PASSIVE_HOST = {
+        'name_or_flags': ['--passive-host'],
+        'options': {
+            'action': 'store',
+            'help': 'host name of the passive results, defaults to --host',
+        }
+    }
+    SERVICE_TEMPLATE = {
+        'name_or_flags': ['--service-template'],
+        'options': {
+            'action': 'store',
+            'default': '{command} {name}',
+            'help': 'service description of the passive results, can use {command}, {name} and\n'
+                    '{svm}, {volume}, {lun} or {aggregate} (default: "{command} {name}")',
+        }
+    }
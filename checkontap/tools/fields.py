@@ -0,0 +1,118 @@
+#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Fields each command requests per endpoint, exactly the fields its evaluation
+reads. ONTAP only computes and sends those, "*" makes it serialise expensive
+fields nobody looks at.
+
+FIELDS[command][mode][endpoint] = "field,field,..."
+mode is None for commands without --mode or whose modes read the same
+fields. Endpoints may contain * for path keys like the volume uuid, it
+matches one path segment (matches()).
+`make check-fields` runs every command in every mode with
+CHECK_ONTAP_STRICT_FIELDS set, it fails if a command requests other fields
+than these or reads a field it didn't request.
+"""
+
+import re
+
+SOFTWARE = {"/api/cluster/software": "version"}
+
+FIELDS = {
+    "about": {None: {
+        **SOFTWARE,
+    }},
+    "aggregate-usage": {None: {
+        "/api/private/cli/storage/aggregate": "uuid",
+        "/api/storage/aggregates/*": "name,uuid,space.block_storage.size,space.block_storage.used",
+        "/api/storage/aggregates/*/plexes": "name,raid_groups.name,raid_groups.reconstruct.active",
+    }},
+    "cluster-health": {
+        "health": {
+            "/api/cluster/metrocluster": "local,remote",
+            "/api/cluster/metrocluster/nodes": "node.name,cluster.name,dr_operation_state",
+            "/api/cluster/nodes": "name,state,membership,ha.giveback.state,ha.takeover.state",
+            "/api/cluster": "metric.status",
+        },
+        "connect": {
+            "/api/cluster/metrocluster": "local.configuration_state",
+            "/api/cluster/nodes": "name,cluster_interfaces.uuid",
+            "/api/network/ip/interfaces/*": "name,state,location.is_home,location.node.name,location.home_node.name,location.port.name",
+        },
+    },
+    "disk-health": {
+        "diskhealth": {
+            **SOFTWARE,
+            "/api/storage/disks": "name,bay,type,container_type,state,outage,node.name,home_node.name",
+        },
+        "multipath": {
+            **SOFTWARE,
+            "/api/storage/disks": "name,bay,node.name,paths",
+        },
+    },
+    "hardware-health": {None: {
+        "/api/cluster/nodes": "name,controller.over_temperature,controller.failed_fan.count,controller.failed_fan.message.message,"
+                              "controller.failed_power_supply.count,controller.failed_power_supply.message.message,"
+                              "controller.frus.id,controller.frus.state,nvram.battery_state",
+        "/api/private/cli/system/node/environment/sensors": "node,fru,state,name,type,value,units,discrete-state",
+    }},
+    "interface-health": {None: {
+        "/api/svm/svms": "name,state,ip_interfaces,fc_interfaces",
+        "/api/network/ip/interfaces": "name,enabled,state,svm.name,location,ip.address,ip.netmask",
+        "/api/network/fc/interfaces": "name,enabled,state,svm.name,location",
+    }},
+    "lun-usage": {None: {
+        "/api/storage/luns": "name,svm.name,space.size,space.used",
+    }},
+    "port-health": {None: {
+        "/api/network/fc/ports": "name,physical_protocol,enabled,state,node.name",
+        "/api/network/ethernet/ports": "name,enabled,type,state,node.name,lag.active_ports.name,lag.member_ports.name",
+    }},
+    "snapmirror-health": {None: {
+        **SOFTWARE,
+        "/api/snapmirror/relationships": "state,healthy,lag_time,source.path,unhealthy_reason",
+    }},
+    "snapshot-health": {None: {
+        **SOFTWARE,
+        "/api/storage/volumes": "name,uuid,snapshot_count",
+        "/api/storage/volumes/*/snapshots": "name,create_time",
+    }},
+    "volume-health": {None: {
+        "/api/storage/volumes": "name,state,style,comment",
+    }},
+    "volume-usage": {None: {
+        "/api/storage/volumes": "name,svm.name,files.maximum,files.used,space.size,space.used,space.available,"
+                                "space.afs_total,space.snapshot.used,space.snapshot.reserve_size,space.snapshot.reserve_percent",
+    }},
+}
+
+def fields(command, endpoint, mode=None) -> str:
+    """ Fields of endpoint requested by command in mode """
+    modes = FIELDS[command]
+    return (modes.get(mode) or modes[None])[endpoint]
+
+def matches(endpoint, path) -> bool:
+    """ True if path is endpoint with a single path segment for every * """
+    return re.fullmatch(re.escape(endpoint).replace(r"\*", "[^/]+"), path) is not None
+
+def union(commands) -> dict:
+    """ {endpoint: set of fields} all modes of the commands request together """
+    result = {}
+    for command in commands:
+        for endpoints in FIELDS.get(command, {}).values():
+            for (endpoint, f) in endpoints.items():
+                result.setdefault(endpoint, set()).update(f.split(","))
+    return result
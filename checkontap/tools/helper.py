@@ -13,16 +13,99 @@
 #    You should have received a copy of the GNU Affero General Public License
 #    along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-from netapp_ontap import config, HostConnection
+from netapp_ontap import config, utils, HostConnection
 from monplugin import Range
 import re
+import os
+import stat
+import logging
+import tempfile
+from . import adapter, parallel, ratelimit, resolve
+from .cache import ResponseCache, DEFAULT_SIZE
+from .singleflight import SingleFlight
+from .hostfailure import HostFailure
+from .memo import Memo
+
+# Connections by (host, user, port, cert, key), a long running process (daemon)
+# reuses them and with them the keep-alive session of the HostConnection
+_connections = {}
+
+logger = logging.getLogger(__name__)
+
+def private_dir(path) -> bool:
+    """
+    Create path with mode 0700 if it's missing and return True if it's
+    a directory of this user nobody else can access. Another user could
+    have created a predictable path in a shared directory like /tmp first.
+    """
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        st = os.lstat(path)
+    except OSError as e:
+        logger.warning(f"state directory {path} not usable: {e}")
+        return False
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        logger.warning(f"state directory {path} ignored, it must be a directory owned by uid {os.getuid()} with mode 0700")
+        return False
+    return True
+
+# Directory for state shared by all checks of this user, None if it can't be trusted
+def state_dir(options, name) -> str:
+    base = getattr(options, 'state_dir', None)
+    if not base:
+        if os.environ.get("XDG_RUNTIME_DIR"):
+            base = os.path.join(os.environ["XDG_RUNTIME_DIR"], "check_ontap")
+        else:
+            base = os.path.join(tempfile.gettempdir(), f"check_ontap-{os.getuid()}")
+    if not private_dir(base):
+        return None
+    return os.path.join(base, name)
 
 # Connect to Host
-def setup_connection(cluster: str, api_user: str, api_pass: str, port: int) -> None:
-    """Configure the default connection for the application"""
-    config.CONNECTION = HostConnection(
-        cluster, username=api_user, password=api_pass, verify=False, port=port,
-    )
+def setup_connection(cluster: str, api_user: str, api_pass: str, port: int, options=None) -> None:
+    """Configure the default connection for the application
+    options are the parsed standard arguments like the cache settings"""
+    # netapp_ontap logs a call by reading the whole response, only do it for -v
+    utils.LOG_ALL_API_CALLS = 1 if getattr(options, 'verbose', None) else 0
+    hosts = state_dir(options, 'hosts')
+    host = resolve.pick_address(cluster, port, hosts, getattr(options, 'dns_ttl', None) or 0)
+    cert = getattr(options, 'cert', None)
+    certkey = getattr(options, 'key', None)
+    key = (host, api_user, port, cert, certkey)
+    connection = _connections.get(key)
+    if connection is None or connection.password != (None if cert else api_pass):
+        if cert:
+            # client certificate auth, the cluster doesn't verify a password on every request
+            connection = HostConnection(
+                host, cert=cert, key=certkey, verify=False, port=port,
+            )
+        else:
+            connection = HostConnection(
+                host, username=api_user, password=api_pass, verify=False, port=port,
+            )
+        # before the first request, sizing the pool later drops its connections
+        parallel.size_pool(connection)
+        _connections[key] = connection
+    ratelimit.start()
+    adapter.mount(connection, ratelimit.RateLimit,
+                  directory=state_dir(options, 'limit'),
+                  max_concurrent=getattr(options, 'max_concurrent', None) or 0,
+                  rate=getattr(options, 'rate', None) or 0,
+                  cluster=cluster)
+    adapter.mount(connection, HostFailure,
+                  directory=state_dir(options, 'down'),
+                  window=getattr(options, 'fail_window', None) or 0,
+                  cluster=cluster,
+                  winner=resolve.winner_path(cluster, port, hosts))
+    adapter.mount(connection, SingleFlight,
+                  directory=state_dir(options, 'flight'),
+                  window=getattr(options, 'coalesce', None) or 0)
+    adapter.mount(connection, ResponseCache,
+                  directory=getattr(options, 'cache_dir', None),
+                  ttl=getattr(options, 'cache_ttl', None),
+                  size=getattr(options, 'cache_size', None) or DEFAULT_SIZE)
+    adapter.mount(connection, Memo)
+    config.CONNECTION = connection
     
 # Include & Exclude filter
 def item_filter(args,item=None) -> None:
@@ -0,0 +1,151 @@
+#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Fast-fail for unreachable clusters.
+
+A failed connect (connection refused, connect timeout, TLS handshake) writes
+a failure record for the cluster. For window seconds every request to that
+cluster fails at once with the recorded reason instead of waiting for the
+timeout. One request per PROBE_INTERVAL goes through as a probe to detect
+the recovery, the process which claims the probe_after time of the record
+sends it. A successful probe removes the record.
+
+A connect failure also makes the resolver forget the address that won the
+last connect race (winner), with or without a window.
+"""
+
+import os
+import json
+import time
+import fcntl
+import logging
+import tempfile
+import requests
+from urllib3.exceptions import NewConnectionError, MaxRetryError, ConnectTimeoutError
+from urllib.parse import urlsplit
+from .adapter import AdapterWrapper, cluster_name
+from . import resolve
+
+logger = logging.getLogger(__name__)
+
+# seconds between two probes of an unreachable cluster
+PROBE_INTERVAL = 10
+
+class HostDown(requests.exceptions.ConnectionError):
+    """ The request wasn't sent, the cluster is known to be unreachable """
+
+def connect_failure(error):
+    """ True if error means the cluster couldn't be connected at all """
+    if isinstance(error, (requests.exceptions.ConnectTimeout, requests.exceptions.SSLError)):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError):
+        reason = error.args[0] if error.args else None
+        if isinstance(reason, MaxRetryError):
+            reason = reason.reason
+        return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+    return False
+
+class HostFailure(AdapterWrapper):
+    """ Remembers connect failures per cluster and fails fast on them """
+    directory = None
+    window = 0
+    # the --host value, one record for all of its addresses
+    cluster = None
+    # file of the winner of the connect race (resolve.winner_path())
+    winner = None
+
+    def send(self, request, **kwargs):
+        if not self.window or not self.directory:
+            return self.forward(request, None, **kwargs)
+
+        url = urlsplit(request.url)
+        name = cluster_name(self.cluster, url)
+        path = os.path.join(self.directory, f"{name}.json")
+        record = self.load(path)
+        if not record:
+            return self.forward(request, path, **kwargs)
+
+        if not self.claim_probe(path, os.path.join(self.directory, f"{name}.probe")):
+            since = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record["since"]))
+            raise HostDown(
+                f"{url.hostname} unreachable since {since}: {record['reason']}", request=request)
+        logger.info(f"probing {url.hostname}, unreachable since {record['since']}")
+        return self.forward(request, path, **kwargs)
+
+    def interval(self):
+        return min(PROBE_INTERVAL, self.window)
+
+    def claim_probe(self, path, lockpath):
+        """ True if this process may send the next probe, it's moved to the next interval """
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        with open(lockpath, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                record = self.load(path)
+                if not record:
+                    # removed by a successful probe meanwhile
+                    return True
+                if record.get("probe_after", 0) > time.time():
+                    return False
+                record["probe_after"] = time.time() + self.interval()
+                return self.write(path, record)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def forward(self, request, path, **kwargs):
+        try:
+            response = self.adapter.send(request, **kwargs)
+        except requests.exceptions.RequestException as e:
+            if connect_failure(e):
+                resolve.forget(self.winner)
+                if path:
+                    self.store(path, e)
+            raise
+        if path and os.path.exists(path):
+            logger.info(f"{urlsplit(request.url).hostname} is reachable again")
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        return response
+
+    def load(self, path):
+        try:
+            with open(path) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if record.get("until", 0) < time.time():
+            return None
+        return record
+
+    def store(self, path, error):
+        record = self.load(path) or {"since": time.time(), "probe_after": time.time() + self.interval()}
+        record["until"] = time.time() + self.window
+        record["reason"] = str(error)
+        self.write(path, record)
+
+    def write(self, path, record):
+        try:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            (fd, tmp) = tempfile.mkstemp(dir=self.directory, prefix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(record, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"could not write failure record {path}: {e}")
+            return False
+        return True
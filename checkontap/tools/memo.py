@@ -0,0 +1,140 @@
+#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+In-memory memoisation of GET responses within a scope (a batch run or a
+single check).
+
+Identical GETs inside a scope are answered from memory. A scope can widen
+the fields of collection endpoints to the union several commands need, so
+every command asking for a subset of them gets the same single response.
+
+Collections read completely by the transport leave their number of records
+in the scope, a count of the same collection (return_records=false with the
+same filters) is answered from it without asking the cluster.
+
+A check which isn't part of a batch gets a scope of its own (run_scope()).
+It leaves streamed responses alone, holding them would undo reading large
+collections page by page.
+"""
+
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from .adapter import AdapterWrapper, request_key, build_response
+from .fields import matches
+
+logger = logging.getLogger(__name__)
+
+# query parameters which don't change the number of records of a collection
+NOT_FILTERS = ("fields", "max_records", "return_records", "return_timeout", "order_by")
+
+def count_key(host, port, path, query):
+    """ (host, port, path, filters) the number of records of a collection depends on """
+    return (host, port, path, tuple(sorted((k, str(v)) for (k, v) in query if k not in NOT_FILTERS)))
+
+class Scope:
+    def __init__(self, widen=None, streams=True):
+        # {endpoint pattern: set of fields}
+        self.widen = widen or {}
+        # memoise streamed responses too
+        self.streams = streams
+        self.responses = {}
+        # {count_key: number of records}
+        self.counts = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+
+    def counted(self, url, query, num_records):
+        """ The collection at url with query was read completely, it has num_records records """
+        url = urlsplit(url)
+        with self.lock:
+            self.counts[count_key(url.hostname, url.port, url.path, query)] = num_records
+
+    def widened(self, path, fields):
+        for (pattern, union) in self.widen.items():
+            if matches(pattern, path):
+                if "*" in union or "*" in fields:
+                    return {"*"}
+                return union | fields
+        return fields
+
+current = None
+
+@contextmanager
+def scope(widen=None, streams=True):
+    """ Memoise all GET requests made within the block """
+    global current
+    previous = current
+    current = Scope(widen, streams)
+    try:
+        yield current
+    finally:
+        current = previous
+
+@contextmanager
+def run_scope():
+    """ Scope of one check, the one of the batch around it if there is one """
+    if current is not None:
+        yield current
+        return
+    with scope(streams=False) as s:
+        yield s
+        if s.hits:
+            logger.info(f"{s.hits} requests answered from memory")
+
+def widen_request(request, scope):
+    """ Replace the fields query parameter by the widened set """
+    (method, host, port, path, query) = request_key(request)
+    params = dict(query)
+    if "fields" not in params:
+        return
+    fields = set(params["fields"].split(","))
+    union = scope.widened(path, fields)
+    if union != fields:
+        params["fields"] = ",".join(sorted(union))
+        request.prepare_url(request.url.split("?")[0], params)
+
+class Memo(AdapterWrapper):
+    """ Answers identical GET requests within a scope from memory """
+
+    def send(self, request, **kwargs):
+        scope = current
+        if scope is None or request.method != "GET":
+            return self.adapter.send(request, **kwargs)
+
+        widen_request(request, scope)
+        key = request_key(request)
+        (method, host, port, path, query) = key
+        with scope.lock:
+            entry = scope.responses.get(key)
+            if entry is None and ("return_records", "false") in query:
+                num_records = scope.counts.get(count_key(host, port, path, query))
+                if num_records is not None:
+                    entry = (200, {"Content-Type": "application/json"}, json.dumps({"num_records": num_records}).encode())
+        if entry:
+            scope.hits += 1
+            logger.info(f"memoised {request.url}")
+            return build_response(request, *entry)
+
+        if kwargs.get("stream") and not scope.streams:
+            return self.adapter.send(request, **kwargs)
+        response = self.adapter.send(request, **kwargs)
+        if response.status_code == 200:
+            with scope.lock:
+                scope.responses[key] = (response.status_code, dict(response.headers), response.content, response.url)
+        return response
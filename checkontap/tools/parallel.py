@@ -0,0 +1,105 @@
+#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Concurrent fetches of independent endpoints within one command.
+
+    data = parallel.fetch_all({
+        'svms': partial(list, Svm.get_collection(fields="name,state")),
+        'nodes': partial(list, Node.get_collection(fields="name")),
+    })
+
+A check then takes as long as its slowest endpoint instead of the sum of
+all. The fetches run on at most MAX_WORKERS daemon threads, a check timing
+out by SIGALRM doesn't wait for them. setup_connection() sizes the pool of a
+new connection with size_pool(), so no request waits for a free connection.
+"""
+
+import time
+import queue
+import logging
+import threading
+from itertools import chain
+from requests.adapters import HTTPAdapter
+from .adapter import AdapterWrapper
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = 4
+
+# a fetch thread and the thread prefetching its next page
+POOL_SIZE = 2 * MAX_WORKERS
+
+def size_pool(connection, size=POOL_SIZE):
+    """
+    Let the connection keep at least size connections to the cluster, only
+    before its first request: the pool and its warm connections are replaced
+    """
+    adapter = connection.session.get_adapter(connection.origin)
+    while isinstance(adapter, AdapterWrapper):
+        adapter = adapter.adapter
+    if isinstance(adapter, HTTPAdapter) and adapter._pool_maxsize < size:
+        adapter.init_poolmanager(adapter._pool_connections, size, block=adapter._pool_block)
+
+def started(iterable):
+    """
+    Start iterable (its first request is sent and the first item read) on
+    the fetch thread, the rest is read where it's consumed. For collections
+    evaluated while they are read.
+    """
+    iterator = iter(iterable)
+    for first in iterator:
+        return chain([first], iterator)
+    return iter(())
+
+def fetch_all(fetches, workers=MAX_WORKERS) -> dict:
+    """
+    Call the independent fetches {name: function} at the same time on at most
+    workers threads, {name: result}. If fetches failed, the error of the
+    first one is raised once all of them are done.
+    """
+    workers = max(1, min(workers, len(fetches)))
+
+    pending = queue.SimpleQueue()
+    for item in fetches.items():
+        pending.put(item)
+    results = {}
+    errors = {}
+
+    def work():
+        while True:
+            try:
+                (name, function) = pending.get_nowait()
+            except queue.Empty:
+                return
+            begin = time.perf_counter()
+            try:
+                results[name] = function()
+            except BaseException as error:
+                errors[name] = error
+            logger.info(f"fetched {name} in {time.perf_counter() - begin:.3f}s")
+
+    begin = time.perf_counter()
+    threads = [threading.Thread(target=work, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    logger.info(f"fetched {', '.join(fetches)} on {workers} threads in {time.perf_counter() - begin:.3f}s")
+
+    for name in fetches:
+        if name in errors:
+            raise errors[name]
+    return {name: results[name] for name in fetches}
@@ -0,0 +1,124 @@
+#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Passive check results, one per object (volume, lun, aggregate), for Naemon.
+
+Results are written either as one file into the checkresults spool directory
+(plus the .ok file Naemon waits for) or as PROCESS_SERVICE_CHECK_RESULT
+external commands into the command pipe.
+"""
+
+import os
+import time
+import random
+import string
+from monplugin import Status
+from .result import Result
+
+# Naemon only reads check result files named c plus 6 characters
+RESULT_FILE_CHARS = string.ascii_letters + string.digits
+
+def create_result_file(directory):
+    """ (fd, path) of a new, empty check result file in directory """
+    while True:
+        path = os.path.join(directory, "c" + "".join(random.choices(RESULT_FILE_CHARS, k=6)))
+        try:
+            return (os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644), path)
+        except FileExistsError:
+            continue
+
+def enabled(args) -> bool:
+    return bool(getattr(args, 'passive_spool', None) or getattr(args, 'passive_pipe', None))
+
+def escape(text) -> str:
+    return text.strip().replace("\\", "\\\\").replace("\n", "\\n")
+
+class PassiveResults:
+    def __init__(self, args, command):
+        self.args = args
+        self.command = command
+        self.host = args.passive_host or args.host
+        self.results = []
+
+    def add(self, check, name, **values):
+        """ Take status, message and perfdata of check as the result of object name """
+        (code, message) = check.check_messages(separator=' ', allok=f"{name} is ok")
+        # the run time of the plugin doesn't belong to a single object
+        perfdata = " ".join(l for l in check.get_perfdata().splitlines() if l and "monplugin_time" not in l)
+        service = self.args.service_template.format(command=self.command, name=name, **values)
+        output = f"{code.name}: {message}"
+        if perfdata:
+            output += f" {perfdata}"
+        self.results.append((service, code, escape(output)))
+
+    def submit(self):
+        if self.args.passive_spool:
+            self.write_spool(self.args.passive_spool)
+        else:
+            self.write_pipe(self.args.passive_pipe)
+
+    def write_spool(self, directory):
+        now = time.time()
+        lines = ["### Active Check Result File ###", f"file_time={int(now)}", ""]
+        for (service, code, output) in self.results:
+            lines += [
+                "### Nagios Service Check Result ###",
+                f"# Time: {time.ctime(now)}",
+                f"host_name={self.host}",
+                f"service_description={service}",
+                "check_type=1",
+                "check_options=0",
+                "scheduled_check=0",
+                "reschedule_check=0",
+                "latency=0",
+                f"start_time={now:.6f}",
+                f"finish_time={now:.6f}",
+                "early_timeout=0",
+                "exited_ok=1",
+                f"return_code={code.value}",
+                f"output={output}",
+                "",
+            ]
+        (fd, path) = create_result_file(directory)
+        with os.fdopen(fd, "w") as f:
+            f.write("\n".join(lines))
+        os.chmod(path, 0o644)
+        # naemon only reads result files which have an .ok file
+        open(f"{path}.ok", "w").close()
+
+    def write_pipe(self, pipe):
+        now = int(time.time())
+        with open(pipe, "a") as f:
+            for (service, code, output) in self.results:
+                # one write per command, the pipe keeps writes up to PIPE_BUF atomic
+                f.write(f"[{now}] PROCESS_SERVICE_CHECK_RESULT;{self.host};{service};{code.value};{output}\n")
+                f.flush()
+
+    def summary(self):
+        counts = {s: 0 for s in Status}
+        for (_, code, _) in self.results:
+            counts[code] += 1
+        target = self.args.passive_spool or self.args.passive_pipe
+        return (Status.OK, f"submitted {len(self.results)} passive results to {target} "
+                           f"({counts[Status.CRITICAL]} critical, {counts[Status.WARNING]} warning, {counts[Status.OK]} ok)")
+
+    def submit_result(self) -> Result:
+        """ Submit the results, the returned Result is what the check itself reports """
+        try:
+            self.submit()
+        except OSError as error:
+            return Result(Status.UNKNOWN, f"could not submit passive results: {error}")
+        return Result(*self.summary())
@@ -0,0 +1,106 @@
+#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+--include / --exclude as ONTAP query parameters.
+
+    query = pushdown.query(args)                # {"name": "*tmp*"} for --include tmp
+    volumes = transport.get_collection(path, fields=..., **query)
+
+Regexes made of literal names, .* and top level | alternatives translate to
+the query syntax of ONTAP (* wildcards, | alternatives, ! negation), so the
+cluster only sends the matching records. Anything else (character classes,
+groups, a bare . ...) stays on the client. item_filter is applied to the
+records the cluster sent as before, the query only saves transferring and
+decoding what it would throw away. An exclude with alternatives isn't
+pushed down, ONTAP ors the alternatives of a field, !a|!b matches all.
+
+order_by() sorts for --top, the fullest objects by the metric of -m first.
+"""
+
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# characters which match themselves in a regex and in an ONTAP query
+LITERAL = re.compile(r"[\w\-:/]")
+# escaped characters which stand for themselves
+ESCAPED = ".-_/:"
+
+def translate(regex):
+    """ ONTAP query value matching what re.search(regex) finds, None if there is none """
+    values = []
+    for alternative in regex.split("|"):
+        start = alternative.startswith("^")
+        end = alternative.endswith("$") and not alternative.endswith("\\$")
+        body = alternative[1 if start else 0:len(alternative) - 1 if end else len(alternative)]
+        value = ""
+        i = 0
+        while i < len(body):
+            if body.startswith(".*", i):
+                value += "*"
+                i += 2
+            elif body[i] == "\\" and i + 1 < len(body) and body[i + 1] in ESCAPED:
+                value += body[i + 1]
+                i += 2
+            elif LITERAL.match(body[i]):
+                value += body[i]
+                i += 1
+            else:
+                return None
+        # matching everything or a range (a..b) of ONTAP
+        if not value.strip("*") or ".." in value:
+            return None
+        value = ("" if start else "*") + value + ("" if end else "*")
+        values.append(re.sub(r"\*+", "*", value))
+    return "|".join(values)
+
+def query(args, field="name", **query) -> dict:
+    """
+    query with --include / --exclude of args on field added as far as ONTAP
+    can express them, a field the query has already is left alone
+    """
+    (option, regex) = ("exclude", args.exclude) if args.exclude else ("include", args.include)
+    if not regex:
+        return query
+    if field in query:
+        logger.info(f"--{option} '{regex}' stays client side, the query has {field}={query[field]} already")
+        return query
+    value = translate(regex)
+    if value is None:
+        logger.info(f"--{option} '{regex}' stays client side, it isn't expressible as ONTAP query")
+        return query
+    if option == "exclude":
+        if "|" in value:
+            logger.info(f"--exclude '{regex}' stays client side, ONTAP can't exclude alternatives")
+            return query
+        value = f"!{value}"
+    logger.info(f"--{option} '{regex}' pushed down as {field}={value}")
+    return {**query, field: value}
+
+def order_by(args, fields):
+    """
+    order_by for --top of args on the field of -m in fields ({'usage': field,
+    'used': field, 'free': field}), the fullest first, None if it has none
+    """
+    typ = args.metric.split("_")[0]
+    field = fields.get(typ)
+    if field is None:
+        logger.info(f"--top {args.top} is sorted client side, -m {args.metric} has no field to order by")
+        return None
+    value = f"{field} {'asc' if typ == 'free' else 'desc'}"
+    logger.info(f"--top {args.top} pushed down as order_by={value}&max_records={args.top}")
+    return value
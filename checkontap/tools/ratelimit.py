@@ -0,0 +1,134 @@
+#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Host-wide limiter for the requests to a cluster.
+
+All plugin processes of the host share per cluster
+ - a semaphore of max_concurrent lock files, one is held per running request
+ - a token bucket refilled with rate tokens per second, one token per request
+The time the requests of a check had to wait is summed up in this process
+and added to the check result as the ratelimit_wait perfdata.
+"""
+
+import os
+import json
+import time
+import fcntl
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from .adapter import AdapterWrapper, cluster_name
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# seconds the requests of the running check waited, None while none was limited
+_waited = None
+
+def start():
+    """ Start summing up the waits for a new check """
+    global _waited
+    _waited = None
+
+def perfdata(check):
+    """ Add the time requests waited since start() to check if a limit applied """
+    if _waited is not None:
+        check.add_perfdata(label="ratelimit_wait", value=round(_waited, 6), uom="s")
+
+def record(wait):
+    global _waited
+    with _lock:
+        _waited = (_waited or 0.0) + wait
+
+class RateLimit(AdapterWrapper):
+    """ Caps concurrent requests and request rate per cluster """
+    directory = None
+    max_concurrent = 0
+    rate = 0
+    # the --host value, the limits apply to all of its addresses together
+    cluster = None
+
+    def send(self, request, **kwargs):
+        if not self.directory or not (self.max_concurrent or self.rate):
+            return self.adapter.send(request, **kwargs)
+
+        url = urlsplit(request.url)
+        cluster = cluster_name(self.cluster, url)
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        start = time.monotonic()
+        if self.rate:
+            time.sleep(self.take_token(cluster))
+        with self.slot(cluster):
+            wait = time.monotonic() - start
+            record(wait)
+            if wait > 0.001:
+                logger.info(f"waited {wait:.3f}s for a request slot on {url.hostname}")
+            return self.adapter.send(request, **kwargs)
+
+    @contextmanager
+    def locked(self, name):
+        with open(os.path.join(self.directory, name), "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield f
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def take_token(self, cluster):
+        """ Take a token from the bucket and return the seconds to wait for it """
+        burst = max(1.0, float(self.rate))
+        with self.locked(f"{cluster}.bucket") as f:
+            f.seek(0)
+            try:
+                state = json.loads(f.read())
+            except ValueError:
+                state = {"tokens": burst, "updated": time.time()}
+            now = time.time()
+            tokens = min(burst, state["tokens"] + (now - state["updated"]) * self.rate)
+            # reserve the token even if it isn't there yet, so waiting
+            # processes queue up instead of racing for the next one
+            tokens -= 1
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps({"tokens": tokens, "updated": now}))
+        return 0 if tokens >= 0 else -tokens / self.rate
+
+    @contextmanager
+    def slot(self, cluster):
+        """ Hold one of max_concurrent slot locks of the cluster """
+        if not self.max_concurrent:
+            yield
+            return
+        slots = list(range(self.max_concurrent))
+        while True:
+            random.shuffle(slots)
+            for i in slots:
+                f = open(os.path.join(self.directory, f"{cluster}.slot{i}"), "a")
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    f.close()
+                    continue
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                    f.close()
+                return
+            time.sleep(0.02)
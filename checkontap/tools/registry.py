@@ -0,0 +1,89 @@
+#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Generate checkontap/commands.py, the static map of command names to modules.
+
+The command line looks commands up there instead of importing every module
+under checkontap.ontapcmd. Run after adding or renaming a command:
+
+    python -m checkontap.tools.registry      (or: make registry)
+
+With --check nothing is written, the exit code is 1 if the file is stale.
+"""
+
+import os
+import sys
+import pkgutil
+import importlib
+
+HEADER = '''#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# generated by checkontap.tools.registry, do not edit
+'''
+
+def module_name(command) -> str:
+    """ Module of command from the registry, unknown names are tried as module name """
+    from checkontap.commands import COMMANDS
+    return COMMANDS.get(command) or f"checkontap.ontapcmd.{''.join(c for c in command if c.isalnum())}"
+
+def scan() -> dict:
+    """ {__cmd__: module name} of all command modules """
+    import checkontap.ontapcmd
+
+    commands = {}
+    for (_, name, is_pkg) in pkgutil.iter_modules(checkontap.ontapcmd.__path__):
+        if is_pkg:
+            continue
+        module = importlib.import_module(f"checkontap.ontapcmd.{name}")
+        if getattr(module, '__cmd__', None):
+            commands[module.__cmd__] = module.__name__
+    return commands
+
+def render(commands) -> str:
+    lines = [HEADER, "COMMANDS = {"]
+    lines += [f"    {name!r}: {module!r}," for (name, module) in sorted(commands.items())]
+    lines += ["}", ""]
+    return "\n".join(lines)
+
+def main():
+    import checkontap
+    path = os.path.join(os.path.dirname(checkontap.__file__), "commands.py")
+    content = render(scan())
+    if "--check" in sys.argv[1:]:
+        with open(path) as f:
+            if f.read() != content:
+                print(f"{path} is stale, run: python -m checkontap.tools.registry", file=sys.stderr)
+                sys.exit(1)
+        return
+    with open(path, "w") as f:
+        f.write(content)
+    print(f"wrote {path}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
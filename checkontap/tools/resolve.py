@@ -0,0 +1,176 @@
+#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Pick the address to talk to from a list of cluster management addresses.
+
+All addresses are raced happy-eyeballs style: connect and TLS handshake are
+started one after another with a short delay, the first one to complete wins.
+The winner is remembered for some time, so following runs use it directly
+as long as the names still resolve to it and no connect to it failed.
+Resolved names are cached in a file with a TTL shared by all checks.
+"""
+
+import os
+import ssl
+import json
+import time
+import socket
+import hashlib
+import logging
+import tempfile
+import threading
+import queue
+
+logger = logging.getLogger(__name__)
+
+# delay between starting two connection attempts
+STAGGER = 0.25
+CONNECT_TIMEOUT = 6
+WINNER_TTL = 60
+
+def read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def write_json(path, data):
+    try:
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        (fd, tmp) = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning(f"could not write {path}: {e}")
+
+def resolve(name, port, directory, ttl):
+    """ Addresses of name, from the DNS cache while it's fresh """
+    try:
+        socket.inet_pton(socket.AF_INET6 if ":" in name else socket.AF_INET, name.strip("[]"))
+        return [name.strip("[]")]
+    except OSError:
+        pass
+    path = directory and os.path.join(directory, "dns.json")
+    if ttl and path:
+        entry = read_json(path).get(name)
+        if entry and entry["until"] > time.time():
+            return entry["addresses"]
+    try:
+        infos = socket.getaddrinfo(name, port, type=socket.SOCK_STREAM)
+    except OSError as e:
+        logger.info(f"could not resolve {name}: {e}")
+        return []
+    addresses = list(dict.fromkeys(info[4][0] for info in infos))
+    if ttl and path:
+        cache = read_json(path)
+        now = time.time()
+        cache = {k: v for (k, v) in cache.items() if v["until"] > now}
+        cache[name] = {"addresses": addresses, "until": now + ttl}
+        write_json(path, cache)
+    return addresses
+
+def handshake(address, port, timeout):
+    """ Connect and do a TLS handshake, raise OSError on failure """
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    with socket.create_connection((address, port), timeout=timeout) as sock:
+        with context.wrap_socket(sock):
+            pass
+
+def race(addresses, port, timeout=CONNECT_TIMEOUT):
+    """ Return the first address completing a handshake or None """
+    results = queue.Queue()
+
+    def attempt(address):
+        started = time.monotonic()
+        try:
+            handshake(address, port, timeout)
+            results.put((address, None, time.monotonic() - started))
+        except OSError as e:
+            results.put((address, e, time.monotonic() - started))
+
+    pending = list(addresses)
+    running = 0
+    while pending or running:
+        if pending:
+            threading.Thread(target=attempt, args=(pending.pop(0),), daemon=True).start()
+            running += 1
+        try:
+            (address, error, took) = results.get(timeout=STAGGER if pending else 2 * timeout)
+        except queue.Empty:
+            if not pending:
+                return None
+            continue
+        running -= 1
+        if error is None:
+            logger.info(f"{address} won the connect race after {took:.3f}s")
+            return address
+        logger.info(f"connect to {address} failed: {error}")
+    return None
+
+def winner_path(hosts, port, directory):
+    """ File remembering the winner of the race between hosts, None without a directory """
+    if not directory:
+        return None
+    names = [h.strip() for h in hosts.split(",") if h.strip()]
+    key = hashlib.sha256(f"{','.join(names)}:{port}".encode()).hexdigest()[:16]
+    return os.path.join(directory, f"winner-{key}.json")
+
+def forget(path):
+    """ Drop a remembered winner, the next run races again """
+    if not path:
+        return
+    try:
+        os.unlink(path)
+        logger.info(f"forgot the winner of the connect race {path}")
+    except OSError:
+        pass
+
+def pick_address(hosts, port, directory, dns_ttl=0):
+    """
+    hosts is a comma separated list of names or addresses, a single host
+    is returned unchanged unless DNS caching is enabled
+    """
+    names = [h.strip() for h in hosts.split(",") if h.strip()]
+    if len(names) == 1 and not dns_ttl:
+        return names[0]
+
+    addresses = []
+    for name in names:
+        addresses.extend(a for a in resolve(name, port, directory, dns_ttl) if a not in addresses)
+    if len(addresses) == 1:
+        return addresses[0]
+    if not addresses:
+        return names[0]
+
+    # a remembered winner is only used while the names still resolve to it
+    path = winner_path(hosts, port, directory)
+    winner = read_json(path) if path else {}
+    if winner.get("address") in addresses:
+        if winner.get("until", 0) > time.time():
+            return winner["address"]
+        # the last winner starts first
+        addresses.remove(winner["address"])
+        addresses.insert(0, winner["address"])
+    address = race(addresses, port)
+    if address is None:
+        return addresses[0]
+    if path:
+        write_json(path, {"address": address, "until": time.time() + WINNER_TTL})
+    return address
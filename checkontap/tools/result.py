@@ -0,0 +1,59 @@
+#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Outcome of a check as data instead of plugin output and exit code.
+
+The evaluate() function of every command returns a Result, the command line
+wrapper prints it with exit(), an in-process caller reads its attributes.
+"""
+
+from monplugin import Check, Status
+from . import ratelimit
+
+class Result:
+    def __init__(self, status: Status, message: str, check: Check = None):
+        self.status = status
+        self.message = message
+        # the check holding the perfdata
+        self.check = check or Check()
+
+    @classmethod
+    def of(cls, check, separator='\n', allok=None, short=None):
+        """ Result of the messages of check like check.check_messages() """
+        (code, message) = check.check_messages(separator=separator, allok=allok)
+        if short is not None:
+            message = f"{short}\n{message}"
+        return cls(code, message, check)
+
+    @property
+    def code(self) -> int:
+        return self.status.value
+
+    @property
+    def perfdata(self) -> list:
+        """ The perfdata labels like 'name'=value;warn;crit;min;max """
+        return [str(p) for p in self.check._perfdata]
+
+    def as_dict(self) -> dict:
+        return {"status": self.status.name, "code": self.code, "message": self.message, "perfdata": self.perfdata}
+
+    def exit(self):
+        """ Print the plugin output and leave with the plugin exit code """
+        ratelimit.perfdata(self.check)
+        self.check.exit(code=self.status, message=self.message)
+
+    def __repr__(self):
+        return f"Result({self.status.name}, {self.message!r})"
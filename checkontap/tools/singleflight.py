@@ -0,0 +1,80 @@
+#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Cross-process single-flight for identical GET requests.
+
+The first process asking for a (cluster, endpoint, query) key takes a file
+lock and does the request, processes asking for the same key meanwhile wait
+for the lock and reuse the response it left behind. A response is only
+reused within a short window, so this coalesces bursts and doesn't cache.
+Lock files not taken for LOCK_AGE seconds are removed with the responses.
+Like the cache it reads streamed responses completely.
+"""
+
+import os
+import time
+import fcntl
+import logging
+from .cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+# longer than a check may run, so a lock in use is never removed
+LOCK_AGE = 120
+
+class SingleFlight(ResponseCache):
+    """ Coalesces identical concurrent GET requests of all plugin processes """
+    window = 0
+    size = 20
+
+    def send(self, request, **kwargs):
+        if not self.window or not self.directory or request.method != "GET":
+            return self.adapter.send(request, **kwargs)
+
+        key = self.key(request, kwargs.get('cert'))
+        path = os.path.join(self.directory, f"{key}.json")
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        with open(os.path.join(self.directory, f"{key}.lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            os.utime(lock.fileno())
+            try:
+                entry = self.load(path)
+                if entry:
+                    logger.info(f"reuse response of concurrent request {request.url}")
+                    return self.response(request, entry)
+                response = self.adapter.send(request, **kwargs)
+                if response.status_code == 200:
+                    self.store(path, response, self.window)
+                return response
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def evict(self):
+        """ Remove old responses and the lock files nobody took for LOCK_AGE """
+        super().evict()
+        old = time.time() - max(LOCK_AGE, self.window)
+        with os.scandir(self.directory) as it:
+            for e in it:
+                if not e.name.endswith(".lock"):
+                    continue
+                try:
+                    if e.stat().st_mtime > old:
+                        continue
+                    with open(e.path, "a") as lock:
+                        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        os.unlink(e.path)
+                except OSError:
+                    continue
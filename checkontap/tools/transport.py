@@ -0,0 +1,452 @@
+#    Copyright (C) 2023  ConSol Consulting & Solutions Software GmbH
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Raw REST transport for large collections.
+
+netapp_ontap builds every record of a collection through its marshmallow
+schemas into a Resource, which is most of the time and memory a check of a
+few thousand volumes needs. get_collection() sends the same queries over the
+session of the connection set up by helper.setup_connection (with all its
+adapters) and yields compact records instead: one class with __slots__ per
+shape of record, attributes only for the fields the cluster returned plus
+the requested ones, no _links.
+
+Records behave like the Resources for reading: attributes, nested records,
+lists, and hasattr() is False for fields the cluster left out. With STRICT
+(env CHECK_ONTAP_STRICT_FIELDS=1) reading a field the query didn't request
+raises FieldNotProjected, which hasattr() doesn't hide.
+
+Pages are decoded while they are read (stream_records): the body of a page
+is never held as a whole, every record is handed out as soon as its closing
+brace arrived. Adapters which keep whole responses (cache, memo) still read
+the body first, the records are then decoded from there. A collection read
+to its end leaves its number of records in the memo scope, so counting it
+afterwards costs no request.
+
+With a page size (max_records) the pages are read by Prefetch on a
+background thread, one page ahead of the records handed out: the cluster
+works on page N+1 while page N is evaluated. ONTAP sends the next link
+after the records, so a page is read completely before the next one is
+requested, memory is bounded by two pages.
+
+A page failing with a transient error (connection reset, read timeout,
+429, 502, 503, 504) is requested again from the same link, pages read before
+aren't. Records of the page already handed out are skipped. The retries
+back off exponentially with full jitter and are given up early when the
+wait would not leave RESERVE seconds of the SIGALRM budget of the check.
+"""
+
+import os
+import json
+import time
+import queue
+import random
+import signal
+import codecs
+import keyword
+import logging
+import threading
+import requests
+from netapp_ontap import config
+from netapp_ontap.error import NetAppRestError
+from checkontap import CheckOntapException
+from . import memo
+from .hostfailure import HostDown, connect_failure
+
+logger = logging.getLogger(__name__)
+
+# set CHECK_ONTAP_STRICT_FIELDS=1 to fail on reading fields the query didn't request
+STRICT = os.environ.get("CHECK_ONTAP_STRICT_FIELDS", "") not in ("", "0")
+
+class FieldNotProjected(CheckOntapException):
+    """ A field was read which wasn't in the fields of the query (STRICT only) """
+
+class Record:
+    __slots__ = ()
+    # attributes the fields of the query asked for, None for all
+    _projection = None
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+    def __repr__(self):
+        values = []
+        for name in self.__slots__:
+            try:
+                values.append(f"{name}={object.__getattribute__(self, name)!r}")
+            except AttributeError:
+                pass
+        return f"Record({', '.join(values)})"
+
+class StrictRecord(Record):
+    __slots__ = ()
+
+    def __getattribute__(self, name):
+        if name[0] != "_" and name != "get":
+            projection = type(self)._projection
+            if projection is not None and name not in projection:
+                raise FieldNotProjected(f"field {name} is read but not requested, only {', '.join(sorted(projection))}")
+        return object.__getattribute__(self, name)
+
+# {(keys of the record, frozen projection): (record class, [(attribute, key)])}
+_shapes = {}
+
+def attribute(key) -> str:
+    """ Attribute name of a json key, keywords like class get a trailing _ """
+    name = "".join(c if c.isalnum() or c == "_" else "_" for c in key)
+    if not name.isidentifier() or keyword.iskeyword(name):
+        name += "_"
+    return name
+
+def projection(fields):
+    """
+    {attribute: projection of its value} of fields like "name,svm.name,space",
+    None stands for all fields, so does "*"
+    """
+    if not fields:
+        return None
+    tree = {}
+    for field in fields.split(","):
+        if field == "*":
+            return None
+        node = tree
+        (*parents, last) = [attribute(p) for p in field.split(".")]
+        for parent in parents:
+            if node.get(parent, {}) is None:
+                # the parent is requested as a whole
+                break
+            node = node.setdefault(parent, {})
+        else:
+            node[last] = None
+    return tree
+
+def frozen(tree):
+    if tree is None:
+        return None
+    return tuple(sorted((k, frozen(v)) for (k, v) in tree.items()))
+
+def shape(keys, tree=None):
+    key = (keys, frozen(tree))
+    found = _shapes.get(key)
+    if found is None:
+        names = [(attribute(k), k) for k in keys if k != "_links"]
+        # requested fields get a slot even if the cluster left them out
+        slots = tuple(dict.fromkeys([n for (n, _) in names] + list(tree or ())))
+        base = StrictRecord if STRICT else Record
+        cls = type("Record", (base,), {"__slots__": slots, "_projection": None if tree is None else frozenset(tree)})
+        found = (cls, names)
+        _shapes[key] = found
+    return found
+
+def to_record(value, tree=None):
+    """
+    Records of json objects, lists element by element, everything else as is.
+    tree is the projection() of the fields the query asked for.
+    """
+    if isinstance(value, dict):
+        (cls, names) = shape(tuple(value), tree)
+        record = cls()
+        for (name, key) in names:
+            setattr(record, name, to_record(value[key], None if tree is None else tree.get(name)))
+        return record
+    if isinstance(value, list):
+        return [to_record(v, tree) for v in value]
+    return value
+
+def get(path, params=None) -> dict:
+    """ Decoded body of GET path (like /api/storage/volumes) on the current connection """
+    connection = config.CONNECTION
+    if connection is None:
+        raise NetAppRestError("no connection set up")
+    url = path if path.startswith("http") else f"{connection.origin}{path}"
+    try:
+        response = connection.session.get(url, params=params)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as error:
+        raise NetAppRestError(cause=error) from None
+    return response.json()
+
+RETRIES = 4
+# seconds of the first backoff, doubled on every retry
+BACKOFF = 0.5
+# seconds of the check timeout left for evaluating after a retry
+RESERVE = 2
+TRANSIENT_STATUS = (429, 502, 503, 504)
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = " \t\n\r"
+
+class IncrementalBody:
+    """ Decodes the top level object of a body read chunk by chunk """
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.text = codecs.getincrementaldecoder("utf-8")()
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def more(self):
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+            self.buffer = self.buffer[self.pos:] + self.text.decode(b"", final=True)
+        else:
+            self.buffer = self.buffer[self.pos:] + self.text.decode(chunk)
+        self.pos = 0
+
+    def peek(self) -> str:
+        """ Next character which isn't whitespace """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.eof:
+                raise json.JSONDecodeError("unexpected end of body", self.buffer, self.pos)
+            self.more()
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"expected {char!r}", self.buffer, self.pos)
+        self.pos += 1
+
+    def value(self):
+        """ The next complete json value """
+        self.peek()
+        while True:
+            try:
+                (value, end) = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self.more()
+                continue
+            # a number at the end of the buffer may go on in the next chunk
+            if end == len(self.buffer) and not self.eof:
+                self.more()
+                continue
+            self.pos = end
+            return value
+
+    def items(self):
+        """ (key, value) of the top level object, the value of "records" is an iterator of the records """
+        self.expect("{")
+        while self.peek() != "}":
+            if self.peek() == ",":
+                self.pos += 1
+            key = self.value()
+            self.expect(":")
+            if key == "records" and self.peek() == "[":
+                yield (key, self.elements())
+            else:
+                yield (key, self.value())
+        self.pos += 1
+
+    def elements(self):
+        self.expect("[")
+        while self.peek() != "]":
+            if self.peek() == ",":
+                self.pos += 1
+            yield self.value()
+        self.pos += 1
+
+def stream_records(response, body):
+    """
+    Yield the records of a collection response while it's read, the other
+    top level keys (num_records, _links) are put into body
+    """
+    try:
+        for (key, value) in IncrementalBody(response.iter_content(CHUNK_SIZE)).items():
+            if key == "records":
+                yield from value
+            else:
+                body[key] = value
+    except ValueError as error:
+        raise NetAppRestError(f"invalid response from {response.url}: {error}") from None
+    finally:
+        response.close()
+
+def stream(path, params=None, body=None):
+    """ Records of GET path as json objects, decoded while the response is read """
+    connection = config.CONNECTION
+    if connection is None:
+        raise NetAppRestError("no connection set up")
+    url = path if path.startswith("http") else f"{connection.origin}{path}"
+    response = connection.session.get(url, params=params, stream=True)
+    response.raise_for_status()
+    yield from stream_records(response, {} if body is None else body)
+
+def transient(error) -> bool:
+    # failing fast on a cluster that's down is on purpose, and connects are
+    # retried by urllib3 already
+    if isinstance(error, HostDown) or connect_failure(error):
+        return False
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is not None and error.response.status_code in TRANSIENT_STATUS
+    return isinstance(error, (requests.exceptions.ConnectionError,
+                              requests.exceptions.Timeout,
+                              requests.exceptions.ChunkedEncodingError))
+
+def budget():
+    """ Seconds left until the SIGALRM timeout, None without a timeout """
+    return signal.getitimer(signal.ITIMER_REAL)[0] or None
+
+def backoff(attempt):
+    """ Seconds to wait before retry number attempt, None to give up """
+    if attempt > RETRIES:
+        return None
+    delay = random.uniform(0, BACKOFF * 2 ** (attempt - 1))
+    left = budget()
+    if left is not None and delay + RESERVE > left:
+        return None
+    return delay
+
+def page(path, params=None, body=None):
+    """ Records of one page like stream(), transient errors are retried from the same link """
+    body = {} if body is None else body
+    done = 0
+    attempt = 0
+    while True:
+        try:
+            for (i, record) in enumerate(stream(path, params, body)):
+                if i >= done:
+                    done += 1
+                    yield record
+            return
+        except requests.exceptions.RequestException as error:
+            attempt += 1
+            delay = backoff(attempt) if transient(error) else None
+            if delay is None:
+                raise NetAppRestError(cause=error) from None
+            logger.info(f"retry {attempt} of {path} in {delay:.2f}s after {error}, skipping the {done} records read already")
+            body.clear()
+            time.sleep(delay)
+
+def counted(path, query, num_records):
+    """ Leave the number of records of a collection read completely in the memo scope """
+    if memo.current is not None and config.CONNECTION is not None:
+        memo.current.counted(f"{config.CONNECTION.origin}{path}", query.items(), num_records)
+
+def records(path, **query):
+    """ json objects of the collection at path, following the next links """
+    (first, params) = (path, query)
+    num_records = 0
+    while path:
+        body = {}
+        yield from page(path, params, body)
+        num_records += body.get("num_records", 0)
+        path = body.get("_links", {}).get("next", {}).get("href")
+        # the next link carries the query
+        params = None
+    counted(first, query, num_records)
+
+class Prefetch:
+    """
+    Records of a paged collection, the pages are read on a background thread
+    one page ahead. Afterwards network tells the seconds spent reading pages
+    and waited the seconds the consumer had to wait for them, the rest was
+    hidden behind evaluating.
+    """
+
+    def __init__(self, path, params):
+        self.path = path
+        self.pages = queue.Queue(maxsize=1)
+        self.stop = threading.Event()
+        self.count = 0
+        self.network = 0.0
+        self.waited = 0.0
+        self.thread = threading.Thread(target=self.read, args=(path, params), daemon=True)
+        self.thread.start()
+
+    def read(self, path, params):
+        (first, query) = (path, params)
+        num_records = 0
+        try:
+            while path and not self.stop.is_set():
+                started = time.perf_counter()
+                body = {}
+                records = list(page(path, params, body))
+                self.network += time.perf_counter() - started
+                num_records += body.get("num_records", 0)
+                self.put(records)
+                path = body.get("_links", {}).get("next", {}).get("href")
+                params = None
+        except Exception as error:
+            self.put(error)
+            return
+        if not path:
+            counted(first, query, num_records)
+        self.put(None)
+
+    def put(self, item):
+        while not self.stop.is_set():
+            try:
+                self.pages.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def hidden(self) -> float:
+        return max(0.0, self.network - self.waited)
+
+    def __iter__(self):
+        try:
+            while True:
+                started = time.perf_counter()
+                records = self.pages.get()
+                self.waited += time.perf_counter() - started
+                if records is None:
+                    break
+                if isinstance(records, Exception):
+                    raise records
+                self.count += 1
+                yield from records
+        finally:
+            self.stop.set()
+            logger.info(f"prefetched {self.count} pages of {self.path}: {self.network:.3f}s reading, "
+                        f"{self.waited:.3f}s waited, {self.hidden():.3f}s hidden")
+
+def get_collection(path, fields=None, page_size=None, **query):
+    """
+    Records of the collection at path, following the next links. With
+    page_size the pages have that many records and are prefetched.
+    """
+    if fields:
+        query["fields"] = fields
+    tree = projection(fields)
+    if page_size:
+        query["max_records"] = page_size
+        found = Prefetch(path, query)
+    else:
+        found = records(path, **query)
+    for record in found:
+        yield to_record(record, tree)
+
+def get_record(path, fields=None, **query):
+    """ Record of GET path, like a single aggregate """
+    if fields:
+        query["fields"] = fields
+    return to_record(get(path, query), projection(fields))
+
+def count_collection(path, **query) -> int:
+    """ Number of records of the collection at path matching query """
+    query["return_records"] = "false"
+    return get(path, query).get("num_records", -1)